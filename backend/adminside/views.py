@@ -21,9 +21,9 @@ from django.db.models import Q
 from doctor.models import SubscriptionPlan
 from .serializers import SubscriptionPlanSerializer
 
-from doctor.models import DoctorReview
+from doctor.models import DoctorReview, DoctorRatingSummary
 from patients.serializers import DoctorReviewSerializer, AdminReviewModerationSerializer
-from django.db.models import Avg
+from django.db.models import Sum
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -35,6 +35,7 @@ from django.utils import timezone
 # Project-specific serializers and models
 from adminside.serializers import AdminLoginSerializer
 from patients.serializers import UserProfileSerializer, UserStatusSerializer,AppointmentSerializer
+from doctor.sparse_fields import requested_fields
 from doctor.models import User,Appointment  # Custom User model
 from doctor.serializers import DoctorProfileSerializer,doctorStatusSerializer, DoctorApplicationListSerializer,DoctorApplicationDetailSerializer,DoctorApprovalActionSerializer
 from django.db.models import Q, Count
@@ -45,7 +46,13 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+import csv
+import itertools
+import json
 import logging
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from doctor.pagination import keyset_page, page_size_from, InvalidCursor
 logger = logging.getLogger(__name__)
 
 class AdminLoginView(TokenObtainPairView):
@@ -583,8 +590,34 @@ class AdminAppointmentListView(APIView):
     """ Admin appointment list view - GET method for listing all appointments """
     permission_classes = [IsAuthenticated]
 
+    # Newest bookings first; id breaks created_at ties so the keyset ordering is total
+    KEYS = [('created_at', True), ('id', True)]
+
+    def filter_queryset(self, request, queryset):
+        status_filter = request.query_params.get('status')
+        doctor_filter = request.query_params.get('doctor')
+        patient_filter = request.query_params.get('patient')
+        date_from = request.query_params.get('date_from')
+        date_to = request.query_params.get('date_to')
+
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        
+        if doctor_filter:
+            queryset = queryset.filter(doctor_id=doctor_filter)
+        
+        if patient_filter:
+            queryset = queryset.filter(patient_id=patient_filter)
+        
+        if date_from:
+            queryset = queryset.filter(appointment_date__gte=date_from)
+        
+        if date_to:
+            queryset = queryset.filter(appointment_date__lte=date_to)
+        return queryset
+
     def get(self, request):
-        """Get list of all appointments with filtering"""
+        """One keyset page of appointments (cursor, page_size) with filtering"""
         # Verify user is staff/admin
         if not request.user.is_staff:
             return Response({
@@ -593,52 +626,39 @@ class AdminAppointmentListView(APIView):
             }, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            # Base queryset with optimized queries
-            queryset = Appointment.objects.select_related(
-                'patient__user', 
-                'doctor__user', 
-                'service', 
-                'schedule'
-            ).order_by('-created_at')
-
-            # Filtering
-            status_filter = request.query_params.get('status')
-            doctor_filter = request.query_params.get('doctor')
-            patient_filter = request.query_params.get('patient')
-            date_from = request.query_params.get('date_from')
-            date_to = request.query_params.get('date_to')
-
-            if status_filter:
-                queryset = queryset.filter(status=status_filter)
-            
-            if doctor_filter:
-                queryset = queryset.filter(doctor_id=doctor_filter)
-            
-            if patient_filter:
-                queryset = queryset.filter(patient_id=patient_filter)
-            
-            if date_from:
-                queryset = queryset.filter(appointment_date__gte=date_from)
-            
-            if date_to:
-                queryset = queryset.filter(appointment_date__lte=date_to)
-
-            # Serialize data
-            serializer = AppointmentSerializer(queryset, many=True)
+            queryset = self.filter_queryset(request, Appointment.objects.all())
+
+            # Join only what the requested fields (?fields=) read
+            fields = requested_fields(request)
+            page, next_cursor = keyset_page(
+                AppointmentSerializer.with_related(queryset, fields),
+                self.KEYS,
+                cursor=request.query_params.get('cursor'),
+                page_size=page_size_from(request, default=50, maximum=200),
+                ordering_key='admin-appointments'
+            )
+            serializer = AppointmentSerializer(page, many=True, context={'fields': fields})
 
-            # Get summary statistics
-            total_appointments = queryset.count()
-            status_counts = queryset.values('status').annotate(count=Count('status'))
+            # Summary over the whole filtered set from one grouped query
+            status_counts = list(queryset.order_by().values('status').annotate(count=Count('id')))
 
             return Response({
                 'success': True,
                 'data': serializer.data,
+                'next_cursor': next_cursor,
                 'summary': {
-                    'total_appointments': total_appointments,
-                    'status_breakdown': list(status_counts)
+                    'total_appointments': sum(row['count'] for row in status_counts),
+                    'status_breakdown': status_counts
                 }
             }, status=status.HTTP_200_OK)
 
+        except InvalidCursor as e:
+            return Response({
+                'success': False,
+                'message': 'Invalid cursor',
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         except Exception as e:
             logger.error(f"Error getting appointments list: {str(e)}")
             return Response({
@@ -646,6 +666,71 @@ class AdminAppointmentListView(APIView):
                 'message': 'Failed to retrieve appointments'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer in a generator"""
+
+    def write(self, value):
+        return value
+
+
+class AdminAppointmentExportView(AdminAppointmentListView):
+    """Stream every filtered appointment as CSV (default) or NDJSON (?export=ndjson)"""
+
+    EXPORT_COLUMNS = [
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('appointment_date', 'appointment_date'),
+        ('slot_time', 'slot_time'),
+        ('status', 'status'),
+        ('mode', 'mode'),
+        ('total_fee', 'total_fee'),
+        ('is_paid', 'is_paid'),
+        ('doctor_id', 'doctor__user_id'),
+        ('doctor_email', 'doctor__user__email'),
+        ('doctor_first_name', 'doctor__user__first_name'),
+        ('doctor_last_name', 'doctor__user__last_name'),
+        ('patient_id', 'patient_id'),
+        ('patient_email', 'patient__user__email'),
+        ('patient_first_name', 'patient__user__first_name'),
+        ('patient_last_name', 'patient__user__last_name'),
+        ('service_name', 'service__service_name'),
+    ]
+    CHUNK_SIZE = 2000
+
+    def get(self, request):
+        if not request.user.is_staff:
+            return Response({
+                'success': False,
+                'message': 'Admin access required'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        export = request.query_params.get('export', 'csv')
+        if export not in ('csv', 'ndjson'):
+            return Response({
+                'success': False,
+                'message': 'export must be csv or ndjson'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Plain tuples through a server-side cursor: memory stays flat however many rows match
+        rows = self.filter_queryset(request, Appointment.objects.all()).order_by(
+            *[f"-{field}" for field, _ in self.KEYS]
+        ).values_list(*[lookup for _, lookup in self.EXPORT_COLUMNS]).iterator(chunk_size=self.CHUNK_SIZE)
+        headers = [name for name, _ in self.EXPORT_COLUMNS]
+
+        if export == 'ndjson':
+            lines = (json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n' for row in rows)
+            content_type = 'application/x-ndjson'
+        else:
+            writer = csv.writer(_Echo())
+            lines = itertools.chain([writer.writerow(headers)], (writer.writerow(row) for row in rows))
+            content_type = 'text/csv'
+
+        filename = f"appointments-{timezone.localdate().isoformat()}.{export}"
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
 class AdminAppointmentDetailView(APIView):
     """
     Admin appointment detail view - only GET method for viewing appointment details
@@ -744,16 +829,20 @@ class AdminReviewListView(APIView):
             
             serializer = DoctorReviewSerializer(queryset, many=True)
             
-            # Get summary statistics
-            total_reviews = queryset.count()
-            pending_count = queryset.filter(status='pending').count()
-            approved_count = queryset.filter(status='approved').count()
-            rejected_count = queryset.filter(status='rejected').count()
+            # Summary statistics from the per-doctor rating summaries (one row per doctor)
+            totals = DoctorRatingSummary.objects.aggregate(
+                pending=Sum('pending_count'),
+                approved=Sum('approved_count'),
+                rejected=Sum('rejected_count'),
+                rating_total=Sum('rating_total')
+            )
+            pending_count = totals['pending'] or 0
+            approved_count = totals['approved'] or 0
+            rejected_count = totals['rejected'] or 0
+            total_reviews = pending_count + approved_count + rejected_count
             
-            # Calculate average rating for approved reviews only
-            avg_rating = queryset.filter(status='approved').aggregate(
-                avg_rating=Avg('rating')
-            )['avg_rating'] or 0
+            # Average rating for approved reviews only
+            avg_rating = (totals['rating_total'] or 0) / approved_count if approved_count else 0
             
             return Response({
                 'success': True,
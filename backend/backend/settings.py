@@ -51,12 +51,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.gis',
+    'django.contrib.postgres',
 
 
     # Third party apps
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
+    'rest_framework_gis',
 
     'channels',
 
@@ -118,7 +121,7 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'django.contrib.gis.db.backends.postgis',
         'NAME': 'docdata',
         'USER': 'postgres',
         'PASSWORD': 'afsal',
@@ -339,6 +342,26 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Checkout hold (doctor.slot_holds): how long a patient filling in the booking
+# form keeps a place in Redis away from other patients
+SLOT_HOLD_TTL = 600
+# Pending request window (doctor.booking): how long a new request keeps its place
+# while unconfirmed and unpaid before release_expired_bookings gives it back
+PENDING_REQUEST_HOLD_SECONDS = 600
+
+CELERY_BEAT_SCHEDULE = {
+    # Next-available slots go stale as time passes, not only on writes
+    'refresh-stale-next-slots': {
+        'task': 'doctor.tasks.refresh_stale_next_slots',
+        'schedule': 300.0,
+    },
+    # Pending requests give their place back once their slot hold runs out
+    'release-expired-bookings': {
+        'task': 'doctor.tasks.release_expired_bookings',
+        'schedule': 60.0,
+    },
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
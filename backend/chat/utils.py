@@ -123,4 +123,57 @@ def create_and_send_notification(user_id, message, notification_type='message',
         return None
     except Exception as e:
         logger.error(f"Failed to create notification: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def create_and_send_notifications(notifications, notification_type='message', sender_id=None):
+    """
+    Batched create_and_send_notification: one bulk INSERT, then one WebSocket push per recipient
+
+    Args:
+        notifications: iterable of (user_id, message, related_object_id)
+        notification_type: Type of notification ('message', 'appointment', etc.)
+        sender_id: ID of sender user (optional), shared by every notification
+
+    Returns:
+        list of created notifications (empty if failed)
+    """
+    try:
+        sender = User.objects.filter(id=sender_id).first() if sender_id else None
+        created = Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                message=message,
+                type=notification_type,
+                related_object_id=related_object_id,
+                sender=sender
+            )
+            for user_id, message, related_object_id in notifications
+        ])
+
+        channel_layer = get_channel_layer()
+        if channel_layer:
+            sender_data = {"id": str(sender.id), "username": sender.username} if sender else None
+            for notification in created:
+                async_to_sync(channel_layer.group_send)(
+                    f"user_{notification.user_id}",
+                    {
+                        "type": "notification",
+                        "data": {
+                            "id": str(notification.id),
+                            "type": notification.type,
+                            "message": notification.message,
+                            "related_object_id": notification.related_object_id,
+                            "created_at": notification.created_at.isoformat(),
+                            "is_read": notification.is_read,
+                            "read_at": None,
+                            "sender": sender_data
+                        }
+                    }
+                )
+
+        logger.info(f"{len(created)} notifications created and sent")
+        return created
+
+    except Exception as e:
+        logger.error(f"Failed to create notifications: {str(e)}")
+        return []
@@ -0,0 +1,141 @@
+"""Per-doctor "next available slot" maintenance."""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from doctor.models import Appointment, Doctor, DoctorNextSlot, Schedules
+from doctor.slot_grid import schedule_slot_times
+from doctor.slot_holds import held_count, held_slot_counts
+
+logger = logging.getLogger(__name__)
+
+# How far ahead to look for a free slot
+HORIZON_DAYS = 60
+BOOKED_STATUSES = ['pending', 'confirmed', 'completed']
+
+
+def slot_starts(schedule):
+    """Iterate the start time of every bookable slot in a schedule, skipping the break"""
+    return iter(schedule_slot_times(schedule))
+
+
+def booked_slot_counts(doctor_id, start_date, end_date=None):
+    """Active bookings per (schedule_id, slot_time) for a doctor, from one grouped query.
+
+    Keyed by schedule, not date: an online and an offline schedule can share a
+    date and slot time without sharing capacity.
+    """
+    return Counter({
+        (row['schedule_id'], row['slot_time']): row['count']
+        for row in Appointment.objects.filter(
+            doctor_id=doctor_id,
+            appointment_date__gte=start_date,
+            appointment_date__lte=end_date or start_date,
+            status__in=BOOKED_STATUSES,
+            is_slot_booked=True
+        ).values('schedule_id', 'slot_time').annotate(count=Count('id'))
+    })
+
+
+def find_next_slot(doctor_id, now=None):
+    """Return (schedule, date, time) of the earliest slot with spare capacity, or None.
+
+    Live checkout holds count as taken, as they do when booking.
+    """
+    now = now or timezone.localtime()
+    today = now.date()
+    horizon = today + timedelta(days=HORIZON_DAYS)
+
+    schedules = list(Schedules.objects.filter(
+        doctor_id=doctor_id,
+        is_active=True,
+        date__gte=today,
+        date__lte=horizon
+    ).order_by('date', 'start_time'))
+    if not schedules:
+        return None
+
+    booked = booked_slot_counts(doctor_id, today, horizon)
+    holds = held_slot_counts([schedule.id for schedule in schedules])
+
+    best = None
+    for schedule in schedules:
+        # Schedules are date-ordered, so a hit on an earlier date can't be beaten
+        if best and schedule.date > best[1]:
+            break
+        for slot_time in slot_starts(schedule):
+            if schedule.date == today and slot_time <= now.time():
+                continue
+            taken = booked[(schedule.id, slot_time)] + held_count(holds, schedule.id, slot_time)
+            if taken < schedule.max_patients_per_slot:
+                if best is None or (schedule.date, slot_time) < (best[1], best[2]):
+                    best = (schedule, schedule.date, slot_time)
+                break
+    return best
+
+
+def recompute_next_slot(doctor_id):
+    """Recalculate and store the doctor's next free slot"""
+    found = find_next_slot(doctor_id)
+    if found:
+        schedule, slot_date, slot_time = found
+        defaults = {'schedule': schedule, 'slot_date': slot_date, 'slot_time': slot_time, 'mode': schedule.mode}
+    else:
+        defaults = {'schedule': None, 'slot_date': None, 'slot_time': None, 'mode': ''}
+    DoctorNextSlot.objects.update_or_create(doctor_id=doctor_id, defaults=defaults)
+    return found
+
+
+def schedule_next_slot_refresh(doctor_id, countdown=None):
+    """Queue a recompute once the current transaction commits, so bookings are visible.
+
+    countdown delays it, e.g. until a checkout hold expires.
+    """
+    if doctor_id:
+        transaction.on_commit(lambda: _queue_recompute(doctor_id, countdown))
+
+
+def _queue_recompute(doctor_id, countdown=None):
+    from doctor.tasks import refresh_next_slot
+
+    try:
+        refresh_next_slot.apply_async((doctor_id,), countdown=countdown)
+    except Exception as e:
+        logger.warning(f"Could not queue next-slot refresh for doctor {doctor_id}: {str(e)}")
+        if countdown is None:
+            # No broker: do it inline rather than leave the stored slot wrong
+            _safe_recompute(doctor_id)
+
+
+def _safe_recompute(doctor_id):
+    try:
+        recompute_next_slot(doctor_id)
+    except Exception as e:
+        logger.error(f"Failed to refresh next slot for doctor {doctor_id}: {str(e)}")
+
+
+def stale_next_slots(now=None):
+    """Rows whose stored slot has already started and need recomputing"""
+    now = now or timezone.localtime()
+    return DoctorNextSlot.objects.filter(
+        Q(slot_date__lt=now.date()) |
+        Q(slot_date=now.date(), slot_time__lte=now.time())
+    )
+
+
+def doctors_missing_next_slot():
+    """Doctors with no DoctorNextSlot row yet (the directory's next_available order needs one each)"""
+    return Doctor.objects.filter(next_slot__isnull=True)
+
+
+def upcoming_slot_filter(prefix='', now=None):
+    """Q for rows whose next slot is still in the future (stale rows are treated as unknown)"""
+    now = now or timezone.localtime()
+    return (
+        Q(**{f'{prefix}slot_date__gt': now.date()}) |
+        Q(**{f'{prefix}slot_date': now.date(), f'{prefix}slot_time__gt': now.time()})
+    )
@@ -0,0 +1,205 @@
+"""Booking engine: check-and-insert for appointments under the slot's row lock.
+
+A new request is 'pending' until the doctor confirms it, and payment can only
+start after that. So the pending row keeps its place for
+PENDING_REQUEST_HOLD_SECONDS (slot_held_until), tuned separately from the
+Redis checkout hold's SLOT_HOLD_TTL. release_expired_bookings, run by Celery beat, gives back
+the places of requests still unconfirmed and unpaid by then; it is the only
+place a hold expires. The request itself stays pending, and confirming it
+later takes a place again if one is free. Confirming or paying clears
+slot_held_until, and payment first re-takes a lapsed place (hold_place_for_payment).
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from doctor.availability import schedule_next_slot_refresh
+from doctor.models import Appointment, ScheduleSlot, Schedules, SlotUnavailable
+from doctor.slot_holds import held_count, held_slot_counts, release_hold
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PENDING_REQUEST_HOLD = 600
+
+
+def pending_request_hold_seconds():
+    """How long a new, unconfirmed request keeps its place (independent of the Redis checkout hold)"""
+    return getattr(settings, 'PENDING_REQUEST_HOLD_SECONDS', DEFAULT_PENDING_REQUEST_HOLD)
+
+
+def lock_slot(schedule, slot_time):
+    """The ScheduleSlot containing slot_time, locked FOR UPDATE until the transaction ends"""
+    slot = ScheduleSlot.containing(schedule.id, slot_time).select_for_update().first()
+    if slot is None and not ScheduleSlot.objects.filter(schedule=schedule).exists():
+        # Schedule saved before slots were materialized
+        ScheduleSlot.materialize(schedule)
+        slot = ScheduleSlot.containing(schedule.id, slot_time).select_for_update().first()
+    return slot
+
+
+def book_appointment(data):
+    """Create an appointment from validated serializer data without overbooking.
+
+    Concurrent bookings for the same slot queue on its row lock, so the
+    capacity and duplicate checks below always see every committed booking.
+    Live checkout holds of other patients (doctor.slot_holds) count as taken.
+    A pending booking holds its place until slot_held_until.
+    """
+    schedule = data.get('schedule')
+    slot_time = data.get('slot_time')
+    if not (schedule and slot_time):
+        return Appointment.objects.create(**data)
+
+    with transaction.atomic():
+        slot = lock_slot(schedule, slot_time)
+        if slot is None:
+            raise SlotUnavailable({'slot_time': 'Selected time is not a bookable slot.'})
+        if slot.booked >= slot.capacity:
+            raise SlotUnavailable({
+                'slot_time': f'This time slot is fully booked. Maximum {slot.capacity} patients allowed per slot.'
+            })
+
+        # Places held by other patients mid-checkout are not available either
+        patient = data.get('patient')
+        holds = held_slot_counts([schedule.id], exclude_patient=patient.id if patient else None)
+        if slot.booked + held_count(holds, schedule.id, slot.start_time) >= slot.capacity:
+            raise SlotUnavailable({
+                'slot_time': 'This time slot is currently held by other patients. Please try again shortly.'
+            })
+
+        # Pending requests whose hold lapsed still count as the patient's booking
+        if patient and Appointment.objects.filter(
+            Q(is_slot_booked=True) | Q(status='pending'),
+            patient=patient,
+            schedule=schedule,
+            slot_time=slot_time
+        ).exists():
+            raise SlotUnavailable({'slot_time': 'You already have a booking in this slot.'})
+
+        if data.get('status', 'pending') == 'pending':
+            data.setdefault('slot_held_until', timezone.now() + timedelta(seconds=pending_request_hold_seconds()))
+        # Appointment.save() takes the place on the locked row
+        appointment = Appointment.objects.create(**data)
+        if patient:
+            # The booking now occupies the place the hold was keeping
+            transaction.on_commit(lambda: release_hold(schedule.id, slot.start_time, patient.id))
+    logger.debug(f"Booked appointment {appointment.id} in slot {slot.id}")
+    return appointment
+
+
+def hold_place_for_payment(appointment):
+    """Make sure the appointment occupies its slot before the patient is charged.
+
+    A request whose hold lapsed takes its place again under the slot lock, and
+    a still-pending request's window is pushed forward so release_expired_bookings
+    cannot free it mid-payment. Raises SlotUnavailable if the place has gone.
+    """
+    with transaction.atomic():
+        appointment = Appointment.objects.select_for_update().get(pk=appointment.pk)
+        changed = False
+        if not appointment.is_slot_booked:
+            slot = lock_slot(appointment.schedule, appointment.slot_time)
+            if slot is None:
+                raise SlotUnavailable({'slot_time': 'Selected time is not a bookable slot.'})
+            holds = held_slot_counts([appointment.schedule_id], exclude_patient=appointment.patient_id)
+            if slot.booked + held_count(holds, appointment.schedule_id, slot.start_time) >= slot.capacity:
+                raise SlotUnavailable({'slot_time': 'This time slot has been booked by another patient.'})
+            # Appointment.save() takes the place on the locked row
+            appointment.is_slot_booked = True
+            changed = True
+        if appointment.status == 'pending':
+            appointment.slot_held_until = timezone.now() + timedelta(seconds=pending_request_hold_seconds())
+            changed = True
+        if changed:
+            appointment.save()
+    return appointment
+
+
+def reschedule_appointment(appointment, new_date, new_time, note=''):
+    """Move an appointment to the doctor's schedule covering new_date/new_time.
+
+    Checks the target slot under the same locks as book_appointment, so a move
+    cannot overbook it. Raises SlotUnavailable if no active schedule of the
+    appointment's mode covers the time or the slot has no room.
+    """
+    with transaction.atomic():
+        appointment = Appointment.objects.select_for_update().get(pk=appointment.pk)
+        schedule = Schedules.objects.select_for_update().filter(
+            doctor_id=appointment.doctor_id,
+            mode=appointment.mode,
+            date=new_date,
+            start_time__lte=new_time,
+            end_time__gt=new_time,
+            is_active=True
+        ).order_by('start_time').first()
+        if schedule is None:
+            raise SlotUnavailable({'slot_time': 'No active schedule covers the selected date and time.'})
+        slot = lock_slot(schedule, new_time)
+        if slot is None:
+            raise SlotUnavailable({'slot_time': 'Selected time is not a bookable slot.'})
+
+        # Moving within the place it already occupies takes nothing new
+        current = appointment.slot_hold()
+        if current is None or current[0] != schedule.id or not slot.start_time <= current[1] < slot.end_time:
+            holds = held_slot_counts([schedule.id], exclude_patient=appointment.patient_id)
+            if slot.booked + held_count(holds, schedule.id, slot.start_time) >= slot.capacity:
+                raise SlotUnavailable({
+                    'slot_time': f'This time slot is fully booked. Maximum {slot.capacity} patients allowed per slot.'
+                })
+
+        if Appointment.objects.filter(
+            Q(is_slot_booked=True) | Q(status='pending'),
+            patient_id=appointment.patient_id,
+            schedule=schedule,
+            slot_time=new_time
+        ).exclude(pk=appointment.pk).exists():
+            raise SlotUnavailable({'slot_time': 'The patient already has a booking in this slot.'})
+
+        appointment.schedule = schedule
+        appointment.appointment_date = new_date
+        appointment.slot_time = new_time
+        # The doctor placed it, so it takes the place and no longer waits on a checkout hold
+        appointment.is_slot_booked = appointment.status != 'cancelled'
+        appointment.slot_held_until = None
+        if note:
+            appointment.notes = f"{appointment.notes}\n{note}" if appointment.notes else note
+        # Appointment.save() releases the old place and takes the locked one
+        appointment.save()
+    logger.debug(f"Rescheduled appointment {appointment.id} into slot {slot.id}")
+    return appointment
+
+
+def release_expired_bookings(now=None, batch_size=500):
+    """Give back the places of pending requests whose slot hold has run out.
+
+    Rows are claimed with SKIP LOCKED so a booking or confirmation in progress
+    is left alone. Returns the number of appointments released.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(Appointment.objects.select_for_update(skip_locked=True).filter(
+            status='pending',
+            is_paid=False,
+            is_slot_booked=True,
+            slot_held_until__lte=now
+        ).only('id', 'doctor_id', 'schedule_id', 'slot_time')[:batch_size])
+        if not expired:
+            return 0
+
+        # update() skips Appointment.save(), so the slot counters are released here
+        Appointment.objects.filter(id__in=[appointment.id for appointment in expired]).update(
+            is_slot_booked=False, updated_at=now
+        )
+        ScheduleSlot.release_many((appointment.schedule_id, appointment.slot_time) for appointment in expired)
+        per_schedule = Counter(appointment.schedule_id for appointment in expired)
+        Schedules.adjust_booked_slots_many({schedule_id: -count for schedule_id, count in per_schedule.items()})
+        for doctor_id in {appointment.doctor_id for appointment in expired}:
+            schedule_next_slot_refresh(doctor_id)
+
+    logger.info(f"Released the slots of {len(expired)} unconfirmed appointment requests")
+    return len(expired)
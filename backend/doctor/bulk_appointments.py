@@ -0,0 +1,176 @@
+"""Apply one status transition to many of a doctor's appointments at once.
+
+The rows are locked, checked against ALLOWED_TRANSITIONS and moved with a
+single UPDATE. Because update() bypasses Appointment.save(), the slot
+counters it would have kept in step are adjusted here in bulk: cancelling
+frees the ScheduleSlot places and Schedules.booked_slots (one UPDATE each).
+Confirming runs the same same-slot conflict check as a single approval, in
+one query for the whole batch, and re-reserves the place of any request
+whose hold expired.
+Patients are notified in one batch once the transaction commits.
+"""
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Q, TextField, Value, When
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from chat.utils import create_and_send_notifications
+from doctor.availability import schedule_next_slot_refresh
+from doctor.models import Appointment, ScheduleSlot, Schedules, SlotUnavailable
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_APPOINTMENTS = 200
+
+ALLOWED_TRANSITIONS = {
+    'pending': ['confirmed', 'cancelled'],
+    'confirmed': ['completed', 'cancelled'],
+    'cancelled': [],  # Cannot change from cancelled
+    'completed': []   # Cannot change from completed
+}
+
+STATUS_MESSAGES = {
+    'confirmed': "Your appointment with Dr. {doctor} on {date} at {time} has been confirmed.",
+    'completed': "Your appointment with Dr. {doctor} on {date} at {time} has been marked as completed.",
+    'cancelled': "Your appointment with Dr. {doctor} on {date} at {time} has been cancelled by the doctor.",
+}
+
+
+def _appended_note(note):
+    """Expression appending a line to Appointment.notes inside the UPDATE"""
+    return Case(
+        When(Q(notes__isnull=True) | Q(notes=''), then=Value(note)),
+        default=Concat('notes', Value(f"\n{note}")),
+        output_field=TextField()
+    )
+
+
+def _confirmable(doctor, appointments, results):
+    """(confirmable, reserved) appointments; the rest are marked 'conflict' in results.
+
+    Like HandleAppointmentRequestView, a slot that already has a confirmed
+    appointment conflicts, and so does a second request for one slot within
+    the batch. Requests that gave their place back get it again here and
+    are returned as reserved.
+    """
+    slots = {(appointment.appointment_date, appointment.slot_time) for appointment in appointments}
+    taken = {}
+    for appointment_id, appointment_date, slot_time in Appointment.objects.filter(
+        doctor=doctor,
+        status='confirmed',
+        appointment_date__in={appointment_date for appointment_date, _ in slots},
+        slot_time__in={slot_time for _, slot_time in slots}
+    ).order_by('id').values_list('id', 'appointment_date', 'slot_time'):
+        taken.setdefault((appointment_date, slot_time), appointment_id)
+
+    confirmable, reserved = [], []
+    for appointment in appointments:
+        slot = (appointment.appointment_date, appointment.slot_time)
+        conflicting = taken.get(slot)
+        if conflicting is None and not appointment.is_slot_booked:
+            try:
+                appointment._reserve_slot((appointment.schedule_id, appointment.slot_time))
+                reserved.append(appointment)
+            except SlotUnavailable:
+                conflicting = 'full'
+        if conflicting is not None:
+            results[str(appointment.id)] = {
+                'id': appointment.id,
+                'result': 'conflict',
+                'previous_status': appointment.status,
+                'conflicting_appointment': None if conflicting == 'full' else conflicting
+            }
+            continue
+        taken[slot] = appointment.id
+        confirmable.append(appointment)
+    return confirmable, reserved
+
+
+def bulk_update_status(doctor, appointment_ids, new_status, note=''):
+    """Move the doctor's appointments to new_status; returns one result dict per requested id"""
+    timestamp = timezone.now()
+    results = {}
+    with transaction.atomic():
+        appointments = {
+            str(appointment.id): appointment
+            for appointment in Appointment.objects.select_for_update(of=('self',)).filter(
+                doctor=doctor, id__in=appointment_ids
+            ).select_related('patient__user')
+        }
+
+        eligible = []
+        for appointment_id in appointment_ids:
+            appointment = appointments.get(str(appointment_id))
+            if appointment is None:
+                results[str(appointment_id)] = {'id': appointment_id, 'result': 'not_found'}
+            elif new_status not in ALLOWED_TRANSITIONS.get(appointment.status, []):
+                results[str(appointment_id)] = {
+                    'id': appointment.id,
+                    'result': 'invalid_transition',
+                    'previous_status': appointment.status,
+                    'allowed_transitions': ALLOWED_TRANSITIONS.get(appointment.status, [])
+                }
+            elif str(appointment.id) not in results:
+                eligible.append(appointment)
+                results[str(appointment_id)] = {
+                    'id': appointment.id,
+                    'result': 'updated',
+                    'previous_status': appointment.status,
+                    'status': new_status
+                }
+
+        reserved = []
+        if new_status == 'confirmed' and eligible:
+            eligible, reserved = _confirmable(doctor, eligible, results)
+
+        if not eligible:
+            return list(results.values())
+
+        changes = {'status': new_status, 'updated_at': timestamp}
+        if new_status == 'cancelled':
+            # Mirrors Appointment.save(): cancelled bookings stop occupying their slot
+            changes['is_slot_booked'] = False
+        elif new_status == 'confirmed':
+            # Mirrors Appointment.save(): confirmed bookings occupy their slot and no longer wait on a hold
+            changes['is_slot_booked'] = True
+            changes['slot_held_until'] = None
+        if note:
+            changes['notes'] = _appended_note(f"[{timestamp.strftime('%Y-%m-%d %H:%M')}] {note}")
+        Appointment.objects.filter(id__in=[appointment.id for appointment in eligible]).update(**changes)
+
+        if new_status == 'cancelled':
+            released = [
+                appointment for appointment in eligible
+                if appointment.is_slot_booked and appointment.schedule_id and appointment.slot_time
+            ]
+            ScheduleSlot.release_many((appointment.schedule_id, appointment.slot_time) for appointment in released)
+            per_schedule = Counter(appointment.schedule_id for appointment in released)
+            Schedules.adjust_booked_slots_many({schedule_id: -count for schedule_id, count in per_schedule.items()})
+            # update() skips the post_save signal that normally does this
+            schedule_next_slot_refresh(doctor.id)
+        elif reserved:
+            Schedules.adjust_booked_slots_many(Counter(appointment.schedule_id for appointment in reserved))
+            schedule_next_slot_refresh(doctor.id)
+
+        doctor_name = doctor.user.get_full_name() if doctor.user else ''
+        notifications = [
+            (
+                appointment.patient.user_id,
+                STATUS_MESSAGES[new_status].format(
+                    doctor=doctor_name,
+                    date=appointment.appointment_date.strftime('%B %d, %Y'),
+                    time=appointment.slot_time.strftime('%I:%M %p')
+                ),
+                str(appointment.id)
+            )
+            for appointment in eligible if appointment.patient.user_id
+        ]
+        transaction.on_commit(lambda: create_and_send_notifications(
+            notifications, notification_type='appointment', sender_id=doctor.user_id
+        ))
+
+    logger.info(f"Doctor {doctor.id} moved {len(eligible)} appointments to {new_status}")
+    return list(results.values())
@@ -0,0 +1,71 @@
+"""Full-text + trigram search for the patient-facing doctor directory."""
+import logging
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+)
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+
+from doctor.models import Doctor
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = 'english'
+# Fields read by _search_parts; saves touching none of them leave the document alone
+SEARCH_DOCTOR_FIELDS = {'specialization', 'clinic_name', 'location', 'user'}
+SEARCH_USER_FIELDS = {'first_name', 'last_name'}
+
+
+def _search_parts(doctor):
+    user = doctor.user
+    name = f"{user.first_name or ''} {user.last_name or ''}".strip() if user else ''
+    specialization = doctor.get_specialization_display() if doctor.specialization else ''
+    return name, doctor.clinic_name or '', specialization, doctor.location or ''
+
+
+def refresh_search_document(doctor):
+    """Rewrite the doctor's tsvector and trigram text in one UPDATE"""
+    name, clinic, specialization, location = _search_parts(doctor)
+    document = (
+        SearchVector(Value(name), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(specialization), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(clinic), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Value(location), weight='C', config=SEARCH_CONFIG)
+    )
+    search_text = ' '.join(part for part in (name, specialization, clinic, location) if part).lower()
+    Doctor.objects.filter(pk=doctor.pk).update(search_document=document, search_text=search_text)
+    logger.debug(f"Refreshed search document for doctor {doctor.pk}")
+
+
+def _refresh_matching(lookup):
+    try:
+        for doctor in Doctor.objects.select_related('user').filter(**lookup):
+            refresh_search_document(doctor)
+    except Exception as e:
+        logger.error(f"Failed to refresh search document for doctor {lookup}: {str(e)}")
+
+
+def schedule_search_refresh(**lookup):
+    """Rewrite the matching doctor's document from the committed rows once the transaction commits"""
+    transaction.on_commit(lambda: _refresh_matching(lookup))
+
+
+def search_doctor_users(queryset, term):
+    """Filter a User queryset of doctors by `term`, best matches first.
+
+    Matches either the full-text document (GIN) or a trigram word similarity on
+    the flattened text (GIN gin_trgm_ops, `%>` with pg_trgm's default 0.6
+    threshold), and ranks by the better of the two.
+    """
+    query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.annotate(
+        text_rank=SearchRank(F('doctor_profile__search_document'), query),
+        typo_rank=TrigramWordSimilarity(term.lower(), 'doctor_profile__search_text'),
+    ).annotate(
+        search_rank=Greatest('text_rank', 'typo_rank')
+    ).filter(
+        Q(doctor_profile__search_document=query) |
+        Q(doctor_profile__search_text__trigram_word_similar=term.lower())
+    )
@@ -0,0 +1,74 @@
+"""Batch haversine distances.
+
+Uses NumPy when it is installed and falls back to a plain-Python loop with
+the same signatures otherwise, so callers never need to check. Both paths
+return a plain list of floats.
+"""
+import logging
+from math import radians, cos, sin, asin, sqrt
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+HAS_NUMPY = np is not None
+
+
+def _to_float_list(values):
+    return [float(v) for v in values]
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distance in km between two points (scalar convenience wrapper)"""
+    # Single pairs are cheaper in plain math than through NumPy's array setup
+    return _pairwise_python([lat1], [lng1], [lat2], [lng2])[0]
+
+
+def haversine_from_origin_km(lat, lng, lats, lngs):
+    """Distances in km from one origin to every (lats[i], lngs[i])"""
+    if not len(lats):
+        return []
+    if HAS_NUMPY:
+        lats = np.radians(np.asarray(lats, dtype=np.float64))
+        lngs = np.radians(np.asarray(lngs, dtype=np.float64))
+        lat0, lng0 = np.radians(float(lat)), np.radians(float(lng))
+        a = np.sin((lats - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lats) * np.sin((lngs - lng0) / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).tolist()
+
+    lat0, lng0 = radians(float(lat)), radians(float(lng))
+    cos_lat0 = cos(lat0)
+    distances = []
+    for lat2, lng2 in zip(_to_float_list(lats), _to_float_list(lngs)):
+        lat2, lng2 = radians(lat2), radians(lng2)
+        a = sin((lat2 - lat0) / 2) ** 2 + cos_lat0 * cos(lat2) * sin((lng2 - lng0) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0))))
+    return distances
+
+
+def pairwise_haversine_km(lats1, lngs1, lats2, lngs2):
+    """Element-wise distances in km between (lats1[i], lngs1[i]) and (lats2[i], lngs2[i])"""
+    if not len(lats1):
+        return []
+    if HAS_NUMPY:
+        lat1 = np.radians(np.asarray(lats1, dtype=np.float64))
+        lng1 = np.radians(np.asarray(lngs1, dtype=np.float64))
+        lat2 = np.radians(np.asarray(lats2, dtype=np.float64))
+        lng2 = np.radians(np.asarray(lngs2, dtype=np.float64))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).tolist()
+
+    return _pairwise_python(lats1, lngs1, lats2, lngs2)
+
+
+def _pairwise_python(lats1, lngs1, lats2, lngs2):
+    distances = []
+    for lat1, lng1, lat2, lng2 in zip(_to_float_list(lats1), _to_float_list(lngs1),
+                                      _to_float_list(lats2), _to_float_list(lngs2)):
+        lat1, lng1, lat2, lng2 = map(radians, (lat1, lng1, lat2, lng2))
+        a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lng2 - lng1) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0))))
+    return distances
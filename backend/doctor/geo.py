@@ -0,0 +1,165 @@
+"""Spatial helpers for doctor location search."""
+import logging
+from math import radians, cos, degrees
+
+from django.conf import settings
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.db.models import F, Q, FloatField, Max, Value, Window, ExpressionWrapper
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from doctor.distance import EARTH_RADIUS_KM, haversine_from_origin_km
+from doctor.models import DoctorLocation
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of each component of the nearby-search rank score (0..1 each)
+DEFAULT_RANK_WEIGHTS = {'distance': 0.5, 'rating': 0.3, 'fee': 0.2}
+
+
+def make_point(lat, lng):
+    """Build a WGS84 point; GEOS expects (x=lng, y=lat)"""
+    return Point(float(lng), float(lat), srid=4326)
+
+
+def nearby_locations(lat, lng, radius_km):
+    """Active doctor locations within radius_km, nearest first, in one query.
+
+    ST_DWithin on the geography column is served by the GiST index and the
+    annotated distance (metres) is computed by PostGIS, so no row outside the
+    radius ever reaches Python.
+    """
+    origin = make_point(lat, lng)
+    return (
+        DoctorLocation.objects
+        .filter(
+            is_active=True,
+            doctor__user__is_active=True,
+            point__dwithin=(origin, D(km=radius_km)),
+        )
+        .annotate(distance_m=Distance('point', origin))
+        .select_related('doctor', 'doctor__user', 'doctor__rating_summary', 'doctor__next_slot')
+        .order_by('distance_m')
+    )
+
+
+def k_nearest_locations(lat, lng, k, max_radius_km=None):
+    """The k closest active doctor locations, nearest first, straight from PostGIS.
+
+    Fallback for the in-memory KD-tree while a worker's first snapshot is
+    still loading.
+    """
+    origin = make_point(lat, lng)
+    queryset = DoctorLocation.objects.filter(is_active=True, doctor__user__is_active=True)
+    if max_radius_km is not None:
+        queryset = queryset.filter(point__dwithin=(origin, D(km=max_radius_km)))
+    return (
+        queryset
+        .annotate(distance_m=Distance('point', origin))
+        .select_related('doctor', 'doctor__user', 'doctor__rating_summary', 'doctor__next_slot')
+        .order_by('distance_m')[:k]
+    )
+
+
+def _as_float(expression):
+    return Cast(expression, FloatField())
+
+
+def rank_weights():
+    weights = dict(DEFAULT_RANK_WEIGHTS)
+    weights.update(getattr(settings, 'NEARBY_RANK_WEIGHTS', {}))
+    return weights
+
+
+def ranked_nearby_locations(lat, lng, radius_km, conditions=None, weights=None):
+    """Nearby locations matching the `conditions` Q, best rank_score first, in one query.
+
+    Each component is normalised to 0..1 inside Postgres:
+      distance - 1 at the patient's location, 0 at the edge of the radius
+      rating   - approved average from DoctorRatingSummary / 5 (0 if unrated)
+      fee      - 1 for the cheapest possible fee, 0 for the most expensive
+                 doctor in the filtered result set (window MAX)
+    Slice the queryset to get a bounded page.
+    """
+    weights = weights or rank_weights()
+    origin = make_point(lat, lng)
+    radius_m = float(radius_km) * 1000
+
+    distance_m = _as_float(Distance('point', origin))
+    distance_score = Value(1.0) - distance_m / Value(radius_m)
+    rating_score = Coalesce(
+        _as_float('doctor__rating_summary__rating_total')
+        / NullIf(_as_float('doctor__rating_summary__approved_count'), Value(0.0))
+        / Value(5.0),
+        Value(0.0)
+    )
+    fee = Coalesce(_as_float('doctor__consultation_fee'), Value(0.0))
+    fee_score = Coalesce(
+        Value(1.0) - fee / NullIf(Window(expression=Max(fee)), Value(0.0)),
+        Value(1.0)
+    )
+
+    return (
+        DoctorLocation.objects
+        .filter(
+            conditions or Q(),
+            is_active=True,
+            doctor__user__is_active=True,
+            point__dwithin=(origin, D(km=radius_km)),
+        )
+        .annotate(
+            distance_m=distance_m,
+            rank_score=ExpressionWrapper(
+                Value(float(weights['distance'])) * distance_score
+                + Value(float(weights['rating'])) * rating_score
+                + Value(float(weights['fee'])) * fee_score,
+                output_field=FloatField()
+            )
+        )
+        .select_related('doctor', 'doctor__user', 'doctor__rating_summary', 'doctor__next_slot')
+        .order_by(F('rank_score').desc(), 'distance_m', 'id')
+    )
+
+
+def bounding_box(lat, lng, radius_km):
+    """Calculate bounding box coordinates for initial filtering"""
+    delta_lat = radius_km / EARTH_RADIUS_KM
+    delta_lng = radius_km / (EARTH_RADIUS_KM * cos(radians(lat)))
+    return {
+        'min_lat': lat - degrees(delta_lat),
+        'max_lat': lat + degrees(delta_lat),
+        'min_lng': lng - degrees(delta_lng),
+        'max_lng': lng + degrees(delta_lng)
+    }
+
+
+def bounding_box_search(lat, lng, radius_km):
+    """Legacy search: Decimal bounding box in SQL, batch haversine in Python.
+
+    Kept for the nearby-search benchmark so the spatial query can be compared
+    against what the endpoint used to do.
+    """
+    box = bounding_box(lat, lng, radius_km)
+    candidates = DoctorLocation.objects.filter(
+        doctor__user__is_active=True,
+        latitude__gte=box['min_lat'],
+        latitude__lte=box['max_lat'],
+        longitude__gte=box['min_lng'],
+        longitude__lte=box['max_lng']
+    ).select_related('doctor', 'doctor__user')
+
+    candidates = list(candidates)
+    distances = haversine_from_origin_km(
+        lat, lng,
+        [location.latitude for location in candidates],
+        [location.longitude for location in candidates]
+    )
+
+    results = []
+    for location, distance in zip(candidates, distances):
+        if distance <= radius_km:
+            location.distance = round(float(distance), 2)
+            results.append(location)
+    results.sort(key=lambda x: x.distance)
+    return results
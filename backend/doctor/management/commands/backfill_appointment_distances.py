@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from doctor.distance import pairwise_haversine_km
+from doctor.models import Appointment
+
+
+class Command(BaseCommand):
+    help = 'Fill Appointment.distance_km for offline appointments that have both patient and doctor coordinates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--all', action='store_true', help='Recompute rows that already have a distance')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        appointments = Appointment.objects.filter(
+            doctor_location__isnull=False,
+            patient_latitude__isnull=False,
+            patient_longitude__isnull=False
+        )
+        if not options['all']:
+            appointments = appointments.filter(distance_km__isnull=True)
+
+        rows = appointments.values_list(
+            'id', 'patient_latitude', 'patient_longitude',
+            'doctor_location__latitude', 'doctor_location__longitude'
+        )
+
+        updated = 0
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                updated += self._write_batch(batch)
+                batch = []
+        if batch:
+            updated += self._write_batch(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Updated distance for {updated} appointments"))
+
+    def _write_batch(self, batch):
+        """One kernel call and one bulk UPDATE per batch"""
+        ids, patient_lats, patient_lngs, doctor_lats, doctor_lngs = zip(*batch)
+        distances = pairwise_haversine_km(patient_lats, patient_lngs, doctor_lats, doctor_lngs)
+        appointments = [
+            Appointment(id=appointment_id, distance_km=round(float(distance), 2))
+            for appointment_id, distance in zip(ids, distances)
+        ]
+        Appointment.objects.bulk_update(appointments, ['distance_km'])
+        return len(appointments)
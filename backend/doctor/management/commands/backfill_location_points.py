@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from doctor.geo import make_point
+from doctor.models import DoctorLocation
+
+
+class Command(BaseCommand):
+    help = 'Populate DoctorLocation.point from latitude/longitude for rows saved before the column existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = DoctorLocation.objects.filter(point__isnull=True).only('id', 'latitude', 'longitude')
+
+        batch = []
+        updated = 0
+        for location in pending.iterator(chunk_size=batch_size):
+            location.point = make_point(location.latitude, location.longitude)
+            batch.append(location)
+            if len(batch) >= batch_size:
+                DoctorLocation.objects.bulk_update(batch, ['point'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            DoctorLocation.objects.bulk_update(batch, ['point'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} doctor location points"))
@@ -0,0 +1,125 @@
+import random
+import time
+import uuid
+from datetime import date, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from doctor.models import Appointment, Doctor, Patient, Schedules, Service, User
+from doctor.views import DoctorAppointmentDashboardView
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_overview_counts(doctor, today):
+    """The previous dashboard: one count() per counter"""
+    all_appointments = Appointment.objects.filter(doctor=doctor)
+    today_appointments = all_appointments.filter(appointment_date=today)
+    return {
+        'total_appointments': all_appointments.count(),
+        'pending': all_appointments.filter(status='pending').count(),
+        'confirmed': all_appointments.filter(status='confirmed').count(),
+        'completed': all_appointments.filter(status='completed').count(),
+        'cancelled': all_appointments.filter(status='cancelled').count(),
+        'online_appointments': all_appointments.filter(mode='online').count(),
+        'offline_appointments': all_appointments.filter(mode='offline').count(),
+        'today_total': today_appointments.count(),
+        'today_pending': today_appointments.filter(status='pending').count(),
+        'today_confirmed': today_appointments.filter(status='confirmed').count(),
+        'today_completed': today_appointments.filter(status='completed').count(),
+        'upcoming': all_appointments.filter(
+            appointment_date__gte=today + timedelta(days=1), status__in=['pending', 'confirmed']
+        ).count(),
+        'this_week': all_appointments.filter(
+            appointment_date__gte=today, appointment_date__lt=today + timedelta(days=7)
+        ).count(),
+        'last_week': all_appointments.filter(
+            appointment_date__gte=today - timedelta(days=7), appointment_date__lt=today
+        ).count(),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the doctor appointment dashboard (per-counter count() vs one aggregate) on synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=50000)
+        parser.add_argument('--patients', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Everything is created inside a transaction that is rolled back at the end
+        try:
+            with transaction.atomic():
+                doctor = self._setup(options)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ANALYZE {Appointment._meta.db_table}')
+                self._compare(doctor, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _setup(self, options):
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create(email=f'dashboard-{tag}@example.invalid', role='doctor', is_active=True)
+        doctor = Doctor.objects.create(user=user, verification_status='approved', consultation_fee=0)
+        service = Service.objects.create(
+            doctor=doctor, service_name='basic', service_mode='online',
+            service_fee=100, description='benchmark_doctor_dashboard'
+        )
+        today = date.today()
+        schedule = Schedules(
+            doctor=doctor, service=service, mode='online', date=today + timedelta(days=1),
+            start_time=dt_time(9, 0), end_time=dt_time(17, 0), slot_duration=timedelta(minutes=15),
+        )
+        schedule.save()
+        patients = Patient.objects.bulk_create([Patient() for _ in range(options['patients'])])
+
+        rng = random.Random(42)
+        statuses = ['pending', 'confirmed', 'completed', 'cancelled']
+        # bulk_create skips Appointment.save(), so no slot counters are touched;
+        # is_slot_booked=False keeps the per-patient slot constraint out of the way
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=rng.choice(patients),
+                doctor=doctor,
+                schedule=schedule,
+                service=service,
+                appointment_date=today + timedelta(days=rng.randint(-365, 60)),
+                slot_time=dt_time(rng.randint(9, 16), rng.choice([0, 15, 30, 45])),
+                mode=rng.choice(['online', 'offline']),
+                status=rng.choice(statuses),
+                is_slot_booked=False,
+            )
+            for _ in range(options['appointments'])
+        ], batch_size=5000)
+        self.stdout.write(f"Created {options['appointments']} appointments for one doctor")
+        return doctor
+
+    def _compare(self, doctor, repeat):
+        today = date.today()
+        results = {}
+        for name, compute in (
+            ('count() per counter', legacy_overview_counts),
+            ('single aggregate', DoctorAppointmentDashboardView.overview_counts),
+        ):
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    results[name] = compute(doctor, today)
+                    timings.append(time.perf_counter() - started)
+            timings.sort()
+            self.stdout.write(
+                f"{name:<22} median {timings[len(timings) // 2] * 1000:8.1f} ms, "
+                f"best {timings[0] * 1000:8.1f} ms, {len(queries)} queries"
+            )
+
+        legacy, aggregated = results.values()
+        if legacy != aggregated:
+            raise CommandError(f"Counters differ:\n{legacy}\n{aggregated}")
+        self.stdout.write(self.style.SUCCESS('Both implementations return identical counters'))
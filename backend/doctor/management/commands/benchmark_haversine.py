@@ -0,0 +1,49 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from doctor.distance import HAS_NUMPY, haversine_km, haversine_from_origin_km
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark the batch haversine kernel against the per-row scalar loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        origin_lat, origin_lng = 9.9312, 76.2673
+        self.stdout.write(f"Kernel backend: {'numpy' if HAS_NUMPY else 'python fallback'}")
+        self.stdout.write(f"{'rows':>8} {'scalar ns/row':>14} {'batch ns/row':>13} {'speedup':>8}")
+
+        for size in options['sizes']:
+            rng = random.Random(size)
+            # Decimal inputs, exactly as the ORM hands them over
+            lats = [Decimal(f"{origin_lat + rng.uniform(-0.5, 0.5):.8f}") for _ in range(size)]
+            lngs = [Decimal(f"{origin_lng + rng.uniform(-0.5, 0.5):.8f}") for _ in range(size)]
+
+            scalar = self._median(
+                lambda: [haversine_km(origin_lat, origin_lng, lat, lng) for lat, lng in zip(lats, lngs)],
+                repeat
+            )
+            batch = self._median(
+                lambda: haversine_from_origin_km(origin_lat, origin_lng, lats, lngs),
+                repeat
+            )
+            scalar_ns = scalar / size * 1e9
+            batch_ns = batch / size * 1e9
+            speedup = scalar / batch if batch else 0
+            self.stdout.write(f"{size:>8} {scalar_ns:>14.0f} {batch_ns:>13.0f} {speedup:>7.1f}x")
+
+    def _median(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return timings[len(timings) // 2]
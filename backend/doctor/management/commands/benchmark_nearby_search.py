@@ -0,0 +1,87 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from doctor.geo import bounding_box_search, nearby_locations, make_point
+from doctor.models import User, Doctor, DoctorLocation
+
+
+# Kochi city centre; seeded points are scattered roughly 50km around it
+CENTRE_LAT, CENTRE_LNG = 9.9312, 76.2673
+SPREAD_DEG = 0.45
+
+
+class _Rollback(Exception):
+    pass
+
+
+def seed_locations(count, doctors=200):
+    """Bulk insert `count` active locations spread over `doctors` doctors"""
+    users = User.objects.bulk_create([
+        User(email=f'bench-{uuid.uuid4().hex}@example.com', role='doctor', is_active=True)
+        for _ in range(doctors)
+    ])
+    doctor_rows = Doctor.objects.bulk_create([Doctor(user=user) for user in users])
+
+    rng = random.Random(count)
+    rows = []
+    for i in range(count):
+        lat = CENTRE_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+        lng = CENTRE_LNG + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+        rows.append(DoctorLocation(
+            doctor=doctor_rows[i % doctors],
+            name=f'Bench {i}',
+            latitude=round(lat, 8),
+            longitude=round(lng, 8),
+            point=make_point(lat, lng),
+        ))
+    DoctorLocation.objects.bulk_create(rows, batch_size=5000)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark PostGIS nearby search against the bounding-box + haversine loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--radius', type=float, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        radius = options['radius']
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'rows':>8} {'loop ms':>10} {'postgis ms':>11} {'hits':>6} {'speedup':>8}")
+        for size in options['sizes']:
+            try:
+                # Everything seeded here is rolled back once the size is measured
+                with transaction.atomic():
+                    seed_locations(size)
+                    loop_ms, loop_hits = self._time(
+                        lambda: bounding_box_search(CENTRE_LAT, CENTRE_LNG, radius), repeat
+                    )
+                    gis_ms, gis_hits = self._time(
+                        lambda: list(nearby_locations(CENTRE_LAT, CENTRE_LNG, radius)), repeat
+                    )
+                    if loop_hits != gis_hits:
+                        self.stderr.write(f"Result mismatch at {size}: loop={loop_hits} postgis={gis_hits}")
+                    speedup = loop_ms / gis_ms if gis_ms else 0
+                    self.stdout.write(
+                        f"{size:>8} {loop_ms:>10.1f} {gis_ms:>11.1f} {gis_hits:>6} {speedup:>7.1f}x"
+                    )
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+    def _time(self, search, repeat):
+        """Median wall time in ms and the hit count of the last run"""
+        timings = []
+        hits = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            hits = len(search())
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2], hits
@@ -0,0 +1,119 @@
+import random
+import time
+from collections import Counter
+from datetime import date, datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from doctor.availability import booked_slot_counts
+from doctor.models import Appointment, Doctor, Schedules
+from patients.serializers import ScheduleDetailSerializer
+
+
+def legacy_time_slots(schedule, booked_times):
+    """The previous per-schedule loop: set of booked times, list scan per slot"""
+    slots = []
+    current = datetime.combine(schedule.date, schedule.start_time)
+    end = datetime.combine(schedule.date, schedule.end_time)
+    while current < end:
+        slot_end = current + schedule.slot_duration
+        if slot_end > end:
+            break
+        slot_time = current.time()
+        booked_count = len([t for t in booked_times if t == slot_time])
+        slots.append(max(0, schedule.max_patients_per_slot - booked_count))
+        current = slot_end
+    return slots
+
+
+class Command(BaseCommand):
+    help = 'Benchmark slot availability for a doctor with many schedules per day (legacy loop vs batched Counter)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedules', type=int, default=24, help='Synthetic schedules per day')
+        parser.add_argument('--bookings', type=int, default=400, help='Synthetic bookings on that day')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--doctor', help='Doctor user id; measure queries against real data instead')
+        parser.add_argument('--date', help='YYYY-MM-DD for --doctor (default today)')
+
+    def handle(self, *args, **options):
+        if options['doctor']:
+            self._benchmark_database(options)
+        else:
+            self._benchmark_synthetic(options)
+
+    def _benchmark_synthetic(self, options):
+        rng = random.Random(42)
+        day = date.today()
+        schedules = []
+        for i in range(options['schedules']):
+            start = datetime.combine(day, dt_time(6, 0)) + timedelta(minutes=30 * i)
+            schedules.append(Schedules(
+                id=i + 1,
+                date=day,
+                start_time=start.time(),
+                end_time=(start + timedelta(hours=4)).time(),
+                slot_duration=timedelta(minutes=5),
+                max_patients_per_slot=3,
+                is_active=True,
+            ))
+
+        all_times = sorted({
+            (datetime.combine(day, s.start_time) + timedelta(minutes=5 * n)).time()
+            for s in schedules for n in range(48)
+        })
+        booked = [rng.choice(all_times) for _ in range(options['bookings'])]
+        counts = Counter((day, t) for t in booked)
+        serializer = ScheduleDetailSerializer(context={'booked_counts': counts})
+
+        legacy = self._median(
+            lambda: [legacy_time_slots(s, set(booked)) for s in schedules], options['repeat']
+        )
+        batched = self._median(
+            lambda: [serializer.get_time_slots(s) for s in schedules], options['repeat']
+        )
+        slots = sum(len(serializer.get_time_slots(s)) for s in schedules)
+        self.stdout.write(f"{len(schedules)} schedules, {slots} slots, {len(booked)} bookings")
+        self.stdout.write(f"legacy:  {legacy * 1000:8.2f} ms  ({len(schedules)} appointment queries)")
+        self.stdout.write(f"batched: {batched * 1000:8.2f} ms  (1 appointment query)")
+
+    def _benchmark_database(self, options):
+        try:
+            doctor = Doctor.objects.get(user__id=options['doctor'])
+        except (Doctor.DoesNotExist, ValueError):
+            raise CommandError(f"Doctor {options['doctor']} not found")
+        day = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else date.today()
+        schedules = list(Schedules.objects.filter(doctor=doctor, date=day, is_active=True).select_related('service'))
+
+        def legacy():
+            for schedule in schedules:
+                booked_times = set(Appointment.objects.filter(
+                    doctor=doctor,
+                    appointment_date=day,
+                    status__in=['pending', 'confirmed', 'completed'],
+                    is_slot_booked=True
+                ).values_list('slot_time', flat=True))
+                legacy_time_slots(schedule, booked_times)
+
+        def batched():
+            counts = booked_slot_counts(doctor.id, day)
+            serializer = ScheduleDetailSerializer(context={'booked_counts': counts})
+            for schedule in schedules:
+                serializer.get_time_slots(schedule)
+
+        for label, func in (('legacy', legacy), ('batched', batched)):
+            with CaptureQueriesContext(connection) as queries:
+                func()
+            elapsed = self._median(func, options['repeat'])
+            self.stdout.write(f"{label:8} {elapsed * 1000:8.2f} ms  {len(queries)} queries")
+
+    def _median(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return timings[len(timings) // 2]
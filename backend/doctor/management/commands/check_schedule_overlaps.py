@@ -0,0 +1,38 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from doctor.models import Schedules
+from doctor.schedule_overlap import DayIntervals
+
+
+class Command(BaseCommand):
+    help = 'Report overlapping active schedules per doctor and day'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', help='Only this doctor id')
+        parser.add_argument('--include-past', action='store_true', help='Also check schedules before today')
+
+    def handle(self, *args, **options):
+        schedules = Schedules.objects.filter(is_active=True)
+        if not options['include_past']:
+            schedules = schedules.filter(date__gte=timezone.localdate())
+        if options['doctor']:
+            schedules = schedules.filter(doctor_id=options['doctor'])
+
+        days = defaultdict(DayIntervals)
+        overlaps = 0
+        rows = schedules.order_by('doctor_id', 'date', 'start_time').values_list(
+            'doctor_id', 'date', 'start_time', 'end_time', 'id'
+        )
+        for doctor_id, day, start, end, schedule_id in rows.iterator(chunk_size=5000):
+            conflicts = days[(doctor_id, day)].add(start, end, schedule_id, merge=True)
+            for _, _, other_id in conflicts:
+                overlaps += 1
+                self.stdout.write(f"doctor {doctor_id} {day}: schedule {schedule_id} overlaps {other_id}")
+
+        if overlaps:
+            self.stdout.write(self.style.WARNING(f"{overlaps} overlapping schedule pairs"))
+        else:
+            self.stdout.write(self.style.SUCCESS('No overlapping schedules'))
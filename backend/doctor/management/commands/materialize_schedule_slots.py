@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from doctor.models import Schedules, ScheduleSlot
+
+
+class Command(BaseCommand):
+    help = 'Create or refresh ScheduleSlot rows for schedules (backfill after deploying slot materialization)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', help='Only this doctor id')
+        parser.add_argument('--include-past', action='store_true', help='Also materialize schedules before today')
+
+    def handle(self, *args, **options):
+        schedules = Schedules.objects.all()
+        if not options['include_past']:
+            schedules = schedules.filter(date__gte=timezone.localdate())
+        if options['doctor']:
+            schedules = schedules.filter(doctor_id=options['doctor'])
+
+        done = 0
+        for schedule in schedules.iterator(chunk_size=500):
+            with transaction.atomic():
+                ScheduleSlot.materialize(schedule)
+            done += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Materialized slots for {done} schedules"))
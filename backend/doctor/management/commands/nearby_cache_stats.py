@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from doctor.search_cache import nearby_search_cache_stats, reset_nearby_search_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss rates of the nearby-doctor search cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = nearby_search_cache_stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']:.2%}"
+        )
+        if options['reset']:
+            reset_nearby_search_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from doctor.directory_search import refresh_search_document
+from doctor.models import Doctor
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the directory search document (tsvector + trigram text) for every doctor'
+
+    def handle(self, *args, **options):
+        updated = 0
+        for doctor in Doctor.objects.select_related('user').iterator(chunk_size=500):
+            refresh_search_document(doctor)
+            updated += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search documents for {updated} doctors"))
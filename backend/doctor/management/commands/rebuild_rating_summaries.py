@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from doctor.models import Doctor, DoctorRatingSummary
+
+
+class Command(BaseCommand):
+    help = 'Recount DoctorRatingSummary rows from DoctorReview (backfill or repair drift)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', help='Only rebuild this doctor id')
+
+    def handle(self, *args, **options):
+        doctors = Doctor.objects.all()
+        if options['doctor']:
+            doctors = doctors.filter(id=options['doctor'])
+
+        rebuilt = 0
+        for doctor_id in doctors.values_list('id', flat=True).iterator():
+            with transaction.atomic():
+                DoctorRatingSummary.rebuild_for(doctor_id)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {rebuilt} doctors"))
@@ -0,0 +1,94 @@
+from bisect import bisect_right
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from doctor.models import Appointment, Schedules, ScheduleSlot
+
+ACTIVE = Q(status__in=['pending', 'confirmed', 'completed'], is_slot_booked=True)
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in Schedules.booked_slots and ScheduleSlot.booked against the appointments table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', help='Only this doctor id')
+        parser.add_argument('--include-past', action='store_true', help='Also reconcile schedules before today')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        schedules = Schedules.objects.all()
+        if not options['include_past']:
+            schedules = schedules.filter(date__gte=timezone.localdate())
+        if options['doctor']:
+            schedules = schedules.filter(doctor_id=options['doctor'])
+
+        with transaction.atomic():
+            schedule_fixes = self._reconcile_schedules(schedules, options['dry_run'])
+            slot_fixes = self._reconcile_slots(schedules, options['dry_run'])
+
+        verb = 'Would fix' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} booked_slots on {schedule_fixes} schedules and booked on {slot_fixes} slots"
+        ))
+
+    def _reconcile_schedules(self, schedules, dry_run):
+        """One annotated query finds every drifted counter; one bulk UPDATE fixes them"""
+        actual = (
+            Appointment.objects.filter(ACTIVE, schedule=OuterRef('pk'))
+            .order_by().values('schedule').annotate(count=Count('id')).values('count')
+        )
+        drifted = list(
+            schedules.select_for_update()
+            .annotate(actual=Coalesce(Subquery(actual, output_field=IntegerField()), Value(0)))
+            .exclude(booked_slots=F('actual'))
+            .only('id', 'booked_slots')
+        )
+        for schedule in drifted:
+            self.stdout.write(f"schedule {schedule.id}: booked_slots {schedule.booked_slots} -> {schedule.actual}")
+            schedule.booked_slots = schedule.actual
+        if drifted and not dry_run:
+            Schedules.objects.bulk_update(drifted, ['booked_slots'], batch_size=500)
+        return len(drifted)
+
+    def _reconcile_slots(self, schedules, dry_run):
+        """Recount slot rows by mapping each active appointment into the slot containing it"""
+        slots = list(
+            ScheduleSlot.objects.select_for_update()
+            .filter(schedule__in=schedules.values('id'))
+            .order_by('schedule_id', 'start_time')
+        )
+        if not slots:
+            return 0
+
+        by_schedule = {}
+        for slot in slots:
+            by_schedule.setdefault(slot.schedule_id, []).append(slot)
+        starts = {schedule_id: [slot.start_time for slot in rows] for schedule_id, rows in by_schedule.items()}
+
+        counts = Counter()
+        appointments = Appointment.objects.filter(ACTIVE, schedule_id__in=by_schedule.keys()).values_list(
+            'schedule_id', 'slot_time'
+        )
+        for schedule_id, slot_time in appointments.iterator(chunk_size=5000):
+            position = bisect_right(starts[schedule_id], slot_time) - 1
+            if position >= 0:
+                slot = by_schedule[schedule_id][position]
+                if slot_time < slot.end_time:
+                    counts[slot.id] += 1
+
+        drifted = []
+        for slot in slots:
+            booked = counts[slot.id]
+            if slot.booked != booked:
+                self.stdout.write(f"slot {slot.id}: booked {slot.booked} -> {booked}")
+                slot.booked = booked
+                slot.capacity = max(slot.capacity, booked)
+                drifted.append(slot)
+        if drifted and not dry_run:
+            ScheduleSlot.objects.bulk_update(drifted, ['booked', 'capacity'], batch_size=500)
+        return len(drifted)
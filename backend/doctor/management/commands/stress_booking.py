@@ -0,0 +1,121 @@
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from doctor.booking import book_appointment
+from doctor.models import Appointment, Doctor, Patient, Schedules, ScheduleSlot, Service, SlotUnavailable, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire hundreds of concurrent bookings at one slot, check capacity is never exceeded and report '
+        'bookings/s. Runs against a throwaway doctor and schedule that are removed afterwards; the CI check '
+        'is doctor.tests.ConcurrentBookingTests'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=300, help='Booking attempts, one patient each')
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--capacity', type=int, default=5, help='max_patients_per_slot of the target slot')
+        parser.add_argument('--keep', action='store_true', help='Leave the generated doctor/patients in place')
+
+    def handle(self, *args, **options):
+        if options['attempts'] < 1 or options['threads'] < 1:
+            raise CommandError('--attempts and --threads must be positive')
+        self.created_users, self.created_patients = [], []
+        try:
+            doctor, schedule, patients = self._setup(options)
+            slot_time = schedule.start_time
+            outcomes, elapsed = self._run(doctor, schedule, patients, slot_time, options['threads'])
+            self._report(schedule, slot_time, options, outcomes, elapsed)
+        finally:
+            if not options['keep']:
+                # Appointments, schedules and slots go with the doctor and patients
+                Patient.objects.filter(id__in=self.created_patients).delete()
+                User.objects.filter(id__in=self.created_users).delete()
+
+    def _setup(self, options):
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create(email=f'stress-{tag}@example.invalid', role='doctor', is_active=True)
+        self.created_users.append(user.id)
+        doctor = Doctor.objects.create(user=user, verification_status='approved', consultation_fee=0)
+        service = Service.objects.create(
+            doctor=doctor, service_name='basic', service_mode='online',
+            service_fee=100, description='stress_booking'
+        )
+        schedule = Schedules(
+            doctor=doctor,
+            service=service,
+            mode='online',
+            date=timezone.localdate() + timedelta(days=1),
+            start_time=dt_time(9, 0),
+            end_time=dt_time(10, 0),
+            slot_duration=timedelta(minutes=15),
+            max_patients_per_slot=options['capacity'],
+        )
+        schedule.save()
+        patients = Patient.objects.bulk_create([Patient() for _ in range(options['attempts'])])
+        self.created_patients = [patient.id for patient in patients]
+        return doctor, schedule, patients
+
+    def _run(self, doctor, schedule, patients, slot_time, thread_count):
+        outcomes = Counter()
+        lock = threading.Lock()
+        start = threading.Barrier(thread_count)
+        chunks = [patients[i::thread_count] for i in range(thread_count)]
+
+        def worker(chunk):
+            local = Counter()
+            try:
+                start.wait()
+                for patient in chunk:
+                    try:
+                        book_appointment({
+                            'patient': patient,
+                            'doctor': doctor,
+                            'schedule': schedule,
+                            'service': schedule.service,
+                            'appointment_date': schedule.date,
+                            'slot_time': slot_time,
+                            'mode': 'online',
+                        })
+                        local['booked'] += 1
+                    except SlotUnavailable:
+                        local['rejected'] += 1
+                    except Exception as e:
+                        local[f'error: {type(e).__name__}'] += 1
+            finally:
+                connection.close()
+                with lock:
+                    outcomes.update(local)
+
+        threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes, time.perf_counter() - started
+
+    def _report(self, schedule, slot_time, options, outcomes, elapsed):
+        slot = ScheduleSlot.containing(schedule.id, slot_time).get()
+        active = Appointment.objects.filter(schedule=schedule, slot_time=slot_time, is_slot_booked=True).count()
+        attempts = sum(outcomes.values())
+
+        self.stdout.write(f"{attempts} attempts on {options['threads']} threads, capacity {slot.capacity}")
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"  {outcome:<24} {count}")
+        self.stdout.write(f"throughput: {attempts / elapsed:.0f} bookings/s attempted ({elapsed:.2f}s)")
+        self.stdout.write(f"slot counter {slot.booked}, active appointments {active}")
+
+        if outcomes['booked'] > slot.capacity or active > slot.capacity or slot.booked != active:
+            raise CommandError('Capacity violated or slot counter out of sync')
+        if active != min(slot.capacity, attempts):
+            raise CommandError('Slot was not filled to capacity')
+        self.stdout.write(self.style.SUCCESS('Capacity held under concurrency'))
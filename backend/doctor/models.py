@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Case, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 import uuid
 from django.utils import timezone
@@ -6,14 +8,22 @@ from cloudinary.models import CloudinaryField
 from django.utils import timezone
 from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 from django.utils import timezone
-from datetime import datetime, timedelta
+from bisect import bisect_right
+from collections import Counter
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.contrib.gis.db import models as gis_models
+from django.contrib.gis.geos import Point
 from django.core.exceptions import ValidationError
-from math import radians, cos, sin, asin, sqrt
 import razorpay
 from django.conf import settings
 
+from doctor.distance import haversine_km
+from doctor.slot_grid import schedule_template, slot_template
+
 import logging
 
 logger = logging.getLogger(__name__)
@@ -79,6 +89,15 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = UserManager()
 
+    class Meta:
+        indexes = [
+            # Keyset order of the patient doctor directory (ordering=name)
+            models.Index(
+                Coalesce('first_name', Value('')), Coalesce('last_name', Value('')), 'id',
+                name='user_doctor_directory_name', condition=Q(role='doctor', is_active=True)
+            ),
+        ]
+
     def __str__(self):
         return f"{self.email} - {self.role}"
 
@@ -181,7 +200,21 @@ class Doctor(models.Model):
     consultation_fee = models.DecimalField(max_digits=10, decimal_places=2,null=True, blank=True, default=0.00)
     is_available = models.BooleanField(default=True)
     
+    # Directory search: weighted tsvector for ranking, flat lowercase text for trigram typo matching.
+    # Both are written by doctor.directory_search.refresh_search_document()
+    search_document = SearchVectorField(null=True, blank=True, editable=False)
+    search_text = models.TextField(blank=True, default='', editable=False)
     
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_document'], name='doctor_search_document_gin'),
+            GinIndex(fields=['search_text'], name='doctor_search_text_trgm', opclasses=['gin_trgm_ops']),
+            # Keyset order of the patient doctor directory (ordering=experience / -experience)
+            models.Index(
+                Coalesce('experience', Value(0)), 'user',
+                name='doctor_directory_experience', condition=Q(verification_status='approved')
+            ),
+        ]
     
     @property
     
@@ -189,6 +222,26 @@ class Doctor(models.Model):
         if self.user:
             return self.user.get_full_name()
         return ""
+    
+    @property
+    def next_available_slot(self):
+        """{date, time, mode, schedule_id} of the earliest free slot, or None"""
+        try:
+            return self.next_slot.as_dict()
+        except DoctorNextSlot.DoesNotExist:
+            return None
+    
+    @property
+    def rating_stats(self):
+        """Average/count/histogram from the denormalized summary, zeros if never reviewed"""
+        try:
+            return self.rating_summary.as_dict()
+        except DoctorRatingSummary.DoesNotExist:
+            return {
+                'average_rating': 0,
+                'total_reviews': 0,
+                'rating_distribution': {star: 0 for star in range(1, 6)},
+            }
         
     
     def check_verification_completion(self):
@@ -581,6 +634,18 @@ class Service(models.Model):
     def __str__(self):
         return self.service_name
 
+# Schedule fields that change the materialized slot rows
+SLOT_GRID_FIELDS = {
+    'date', 'start_time', 'end_time', 'slot_duration',
+    'break_start_time', 'break_end_time', 'max_patients_per_slot',
+}
+
+
+class SlotUnavailable(ValidationError):
+    """Raised when a booking would exceed a slot's capacity"""
+    pass
+
+
 class Schedules(models.Model):
     doctor = models.ForeignKey('Doctor', on_delete=models.CASCADE,related_name='schedules')
     service = models.ForeignKey(Service, on_delete=models.CASCADE,related_name='schedules')
@@ -647,8 +712,8 @@ class Schedules(models.Model):
         if self.slot_duration and self.slot_duration <= timedelta(0):
             errors['slot_duration'] = "Slot duration must be positive."
         
-        # Validate booked slots don't exceed total slots
-        if self.booked_slots > self.total_slots:
+        # booked_slots counts bookings, and each slot takes up to max_patients_per_slot
+        if self.booked_slots > self.total_slots * max(self.max_patients_per_slot, 1):
             errors['booked_slots'] = "Booked slots cannot exceed total slots."
         
         
@@ -668,32 +733,17 @@ class Schedules(models.Model):
         if not self.total_slots and self.start_time and self.end_time and self.slot_duration:
             self.total_slots = self.calculate_total_slots()
         
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or SLOT_GRID_FIELDS.intersection(update_fields):
+                ScheduleSlot.materialize(self)
 
     def calculate_total_slots(self):
-        """Calculate total available slots considering breaks"""
+        """Number of bookable slots in the grid, breaks excluded"""
         if not all([self.start_time, self.end_time, self.slot_duration]):
             return 0
-        
-        # Convert to datetime for calculation
-        start_dt = datetime.combine(self.date, self.start_time)
-        end_dt = datetime.combine(self.date, self.end_time)
-        
-        # Calculate total working time
-        total_working_time = end_dt - start_dt
-        
-        # Subtract break time if exists
-        if self.break_start_time and self.break_end_time:
-            break_start_dt = datetime.combine(self.date, self.break_start_time)
-            break_end_dt = datetime.combine(self.date, self.break_end_time)
-            break_duration = break_end_dt - break_start_dt
-            total_working_time -= break_duration
-        
-        # Calculate number of slots
-        if total_working_time.total_seconds() <= 0:
-            return 0
-        
-        return int(total_working_time.total_seconds() / self.slot_duration.total_seconds())
+        return len(schedule_template(self).slots)
 
     def get_available_slots(self):
         """Get number of available slots"""
@@ -719,14 +769,7 @@ class Schedules(models.Model):
         """Get total working hours excluding breaks"""
         if not all([self.start_time, self.end_time]):
             return 0
-        
-        start_dt = datetime.combine(self.date, self.start_time)
-        end_dt = datetime.combine(self.date, self.end_time)
-        total_time = (end_dt - start_dt).total_seconds() / 3600  # Convert to hours
-        
-        # Subtract break time
-        break_hours = self.get_break_duration() / 60
-        return max(0, total_time - break_hours)
+        return schedule_template(self).working_seconds / 3600
 
     def validate_booking_time(self, booking_time):
         """Validate if a booking time is valid (not during break)"""
@@ -738,16 +781,38 @@ class Schedules(models.Model):
     def get_booked_appointments_count(self):
         """Get actual count of booked appointments for this schedule"""
         return Appointment.objects.filter(
-            doctor=self.doctor,
-            appointment_date=self.date,
+            schedule=self,
             status__in=['pending', 'confirmed', 'completed'],
             is_slot_booked=True
         ).count()
     
     def update_booked_slots(self):
-        """Update booked_slots field with actual count"""
+        """Recount booked_slots from appointments (repair only; bookings adjust it with F())"""
         self.booked_slots = self.get_booked_appointments_count()
-        self.save(update_fields=['booked_slots'])
+        Schedules.objects.filter(pk=self.pk).update(booked_slots=self.booked_slots)
+    
+    @staticmethod
+    def adjust_booked_slots(schedule_id, delta):
+        """Atomically move a schedule's booked_slots by delta without loading or validating it"""
+        if delta > 0:
+            Schedules.objects.filter(pk=schedule_id).update(booked_slots=F('booked_slots') + delta)
+        elif delta < 0:
+            Schedules.objects.filter(pk=schedule_id, booked_slots__gte=-delta).update(
+                booked_slots=F('booked_slots') + delta
+            )
+    
+    @staticmethod
+    def adjust_booked_slots_many(deltas):
+        """adjust_booked_slots for several schedules ({schedule_id: delta}) in one UPDATE"""
+        deltas = {schedule_id: delta for schedule_id, delta in deltas.items() if delta}
+        if deltas:
+            Schedules.objects.filter(pk__in=deltas).update(booked_slots=Greatest(
+                F('booked_slots') + Case(
+                    *[When(pk=schedule_id, then=Value(delta)) for schedule_id, delta in deltas.items()],
+                    output_field=models.IntegerField()
+                ),
+                Value(0)
+            ))
     
     def get_available_slots_by_time(self, slot_time):
         """Get available slots for a specific time"""
@@ -762,6 +827,230 @@ class Schedules(models.Model):
         return max(0, self.max_patients_per_slot - booked_count)
     
 
+class ScheduleSlot(models.Model):
+    """One concrete bookable slot of a schedule with its live booking counter.
+    
+    Rows are written by Schedules.save(); booked is only ever changed with a
+    conditional UPDATE (see reserve/release) so it can never pass capacity.
+    """
+    schedule = models.ForeignKey(Schedules, on_delete=models.CASCADE, related_name='slots')
+    doctor = models.ForeignKey('Doctor', on_delete=models.CASCADE, related_name='slots')
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    capacity = models.PositiveIntegerField(default=1)
+    booked = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['date', 'start_time']
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'start_time'], name='schedule_slot_unique_start'),
+            models.CheckConstraint(condition=models.Q(booked__lte=F('capacity')), name='schedule_slot_within_capacity'),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'date', 'start_time'], name='schedule_slot_lookup'),
+        ]
+    
+    def __str__(self):
+        return f"{self.schedule_id} {self.date} {self.start_time} ({self.booked}/{self.capacity})"
+    
+    @property
+    def remaining(self):
+        return max(0, self.capacity - self.booked)
+    
+    @classmethod
+    def materialize(cls, schedule):
+        """Bring the schedule's slot rows in line with its current grid.
+        
+        New grid slots are created with their existing bookings counted, slots
+        that left the grid are dropped unless someone is booked on them, and
+        capacity follows max_patients_per_slot but never drops below booked.
+        """
+        ends = {slot.start: slot.end for slot in schedule_template(schedule).slots}
+        # Row locks keep concurrent reserve() calls from moving booked past the new capacity
+        rows = list(cls.objects.select_for_update().filter(schedule=schedule))
+        
+        stale = {row.id for row in rows if row.start_time not in ends and row.booked == 0}
+        if stale:
+            cls.objects.filter(id__in=stale).delete()
+        
+        changed = []
+        for row in rows:
+            if row.id in stale:
+                continue
+            capacity = max(schedule.max_patients_per_slot, row.booked)
+            end_time = ends.get(row.start_time, row.end_time)
+            if (row.date, row.end_time, row.capacity) != (schedule.date, end_time, capacity):
+                row.date, row.end_time, row.capacity = schedule.date, end_time, capacity
+                changed.append(row)
+        if changed:
+            cls.objects.bulk_update(changed, ['date', 'end_time', 'capacity'])
+        
+        existing = {row.start_time for row in rows}
+        missing = [start for start in ends if start not in existing]
+        if not missing:
+            return
+        starts = sorted(ends)
+        booked = Counter()
+        for slot_time in Appointment.objects.filter(
+            schedule=schedule,
+            status__in=['pending', 'confirmed', 'completed'],
+            is_slot_booked=True
+        ).values_list('slot_time', flat=True):
+            position = bisect_right(starts, slot_time) - 1
+            if position >= 0 and slot_time < ends[starts[position]]:
+                booked[starts[position]] += 1
+        cls.objects.bulk_create([
+            cls(
+                schedule=schedule,
+                doctor_id=schedule.doctor_id,
+                date=schedule.date,
+                start_time=start,
+                end_time=ends[start],
+                capacity=max(schedule.max_patients_per_slot, booked[start]),
+                booked=booked[start]
+            )
+            for start in missing
+        ], ignore_conflicts=True)
+    
+    @classmethod
+    def containing(cls, schedule_id, slot_time):
+        """Rows whose [start, end) contains slot_time (bookings may fall inside a slot)"""
+        return cls.objects.filter(
+            schedule_id=schedule_id,
+            start_time__lte=slot_time,
+            end_time__gt=slot_time
+        )
+    
+    @classmethod
+    def reserve(cls, schedule_id, slot_time):
+        """Take one place in the slot; False if it is full or does not exist.
+        
+        The capacity check and the increment are one UPDATE, so concurrent
+        bookings serialize on the row lock and cannot overbook.
+        """
+        return cls.containing(schedule_id, slot_time).filter(
+            booked__lt=F('capacity')
+        ).update(booked=F('booked') + 1) > 0
+    
+    @classmethod
+    def release(cls, schedule_id, slot_time):
+        cls.containing(schedule_id, slot_time).filter(booked__gt=0).update(booked=F('booked') - 1)
+    
+    @classmethod
+    def release_many(cls, holds):
+        """release() for many (schedule_id, slot_time) holds: one read of the slot rows, one UPDATE"""
+        holds = list(holds)
+        if not holds:
+            return
+        by_schedule = {}
+        for row in cls.objects.filter(schedule_id__in={schedule_id for schedule_id, _ in holds}).order_by(
+            'schedule_id', 'start_time'
+        ).values_list('id', 'schedule_id', 'start_time', 'end_time'):
+            by_schedule.setdefault(row[1], []).append(row)
+        
+        starts = {schedule_id: [row[2] for row in rows] for schedule_id, rows in by_schedule.items()}
+        
+        released = Counter()
+        for schedule_id, slot_time in holds:
+            rows = by_schedule.get(schedule_id, [])
+            position = bisect_right(starts.get(schedule_id, []), slot_time) - 1
+            if position >= 0 and slot_time < rows[position][3]:
+                released[rows[position][0]] += 1
+        if released:
+            cls.objects.filter(id__in=released).update(booked=Greatest(
+                F('booked') - Case(
+                    *[When(id=slot_id, then=Value(count)) for slot_id, count in released.items()],
+                    output_field=models.IntegerField()
+                ),
+                Value(0)
+            ))
+
+
+class ScheduleTemplate(models.Model):
+    """Weekly recurring schedule shape that expands into Schedules rows for a date range"""
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'),
+        (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday'),
+    ]
+    
+    doctor = models.ForeignKey('Doctor', on_delete=models.CASCADE, related_name='schedule_templates')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='schedule_templates')
+    mode = models.CharField(max_length=20, choices=[('online', 'Online'), ('offline', 'Offline')])
+    weekdays = ArrayField(models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES), help_text="0=Monday ... 6=Sunday")
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_duration = models.DurationField()
+    break_start_time = models.TimeField(null=True, blank=True)
+    break_end_time = models.TimeField(null=True, blank=True)
+    max_patients_per_slot = models.PositiveIntegerField(default=1)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['doctor', 'start_time']
+    
+    def __str__(self):
+        days = ', '.join(dict(self.WEEKDAY_CHOICES)[day][:3] for day in sorted(self.weekdays or []))
+        return f"{self.doctor} - {days} {self.start_time}-{self.end_time}"
+    
+    def template(self):
+        return slot_template(
+            self.start_time, self.end_time, self.slot_duration,
+            self.break_start_time, self.break_end_time
+        )
+    
+    def dates_between(self, start_date, end_date):
+        """Dates in [start_date, end_date] that fall on one of the template's weekdays"""
+        weekdays = set(self.weekdays or [])
+        day = start_date
+        dates = []
+        while day <= end_date:
+            if day.weekday() in weekdays:
+                dates.append(day)
+            day += timedelta(days=1)
+        return dates
+
+
+# Directory sort keys for doctors without a free slot, so they sort last
+NO_NEXT_SLOT_DATE = date(9999, 12, 31)
+NO_NEXT_SLOT_TIME = time(23, 59, 59)
+
+
+class DoctorNextSlot(models.Model):
+    """Earliest bookable slot per doctor, maintained by doctor.availability"""
+    doctor = models.OneToOneField('Doctor', on_delete=models.CASCADE, primary_key=True, related_name='next_slot')
+    schedule = models.ForeignKey('Schedules', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    slot_date = models.DateField(null=True, blank=True)
+    slot_time = models.TimeField(null=True, blank=True)
+    mode = models.CharField(max_length=20, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['slot_date', 'slot_time']),
+            # Keyset order of the patient doctor directory (ordering=next_available)
+            models.Index(
+                Coalesce('slot_date', Value(NO_NEXT_SLOT_DATE)), Coalesce('slot_time', Value(NO_NEXT_SLOT_TIME)), 'doctor',
+                name='next_slot_directory_order'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.doctor_id} - {self.slot_date} {self.slot_time} ({self.mode})"
+    
+    def as_dict(self):
+        if not self.slot_date:
+            return None
+        return {
+            'date': self.slot_date.strftime('%Y-%m-%d'),
+            'time': self.slot_time.strftime('%H:%M'),
+            'mode': self.mode,
+            'schedule_id': self.schedule_id,
+        }
+    
+
 class DoctorLocation(models.Model):
     doctor = models.ForeignKey('Doctor', on_delete=models.CASCADE)
     name = models.CharField(max_length=100)  # "Main Clinic", "Home Office"
@@ -772,6 +1061,8 @@ class DoctorLocation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_current = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
+    # Geography mirror of latitude/longitude, GiST-indexed for radius search
+    point = gis_models.PointField(geography=True, srid=4326, null=True, blank=True, spatial_index=True)
     
     class Meta:
         ordering = ['name']
@@ -779,15 +1070,17 @@ class DoctorLocation(models.Model):
     def __str__(self):
         return f"{self.doctor.user.username} - {self.name}"
     
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.point = Point(float(self.longitude), float(self.latitude), srid=4326)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'point' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['point']
+        super().save(*args, **kwargs)
+    
     def calculate_distance_to(self, lat, lng):
         """Calculate distance to given coordinates in km"""
-        lat1, lng1, lat2, lng2 = map(radians, [float(self.latitude), float(self.longitude), lat, lng])
-        dlng = lng2 - lng1
-        dlat = lat2 - lat1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlng/2)**2
-        c = 2 * asin(sqrt(a))
-        r = 6371  # Earth's radius in km
-        return c * r
+        return haversine_km(self.latitude, self.longitude, lat, lng)
     
     
 class PatientLocation(models.Model):
@@ -836,6 +1129,10 @@ class Appointment(models.Model):
     slot_time = models.TimeField()  
     mode = models.CharField(max_length=20, choices=[('online', 'Online'), ('offline', 'Offline')])
     is_slot_booked = models.BooleanField(default=True, help_text="Whether this appointment occupies a slot")
+    slot_held_until = models.DateTimeField(
+        null=True, blank=True,
+        help_text="A pending request gives its place back after this time unless confirmed"
+    )
     address = models.ForeignKey('Address', on_delete=models.SET_NULL, null=True, blank=True, related_name='appointments')
 
     STATUS_CHOICES = [
@@ -861,8 +1158,38 @@ class Appointment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        unique_together = [['doctor', 'appointment_date', 'slot_time', 'status']]
-        
+        constraints = [
+            # Capacity is enforced by ScheduleSlot; this only stops a patient double-booking a slot
+            models.UniqueConstraint(
+                fields=['patient', 'schedule', 'slot_time'],
+                condition=models.Q(is_slot_booked=True),
+                name='appointment_one_active_booking_per_patient_slot'
+            ),
+        ]
+    
+    # Columns that decide whether and where the appointment occupies a slot
+    SLOT_STATE_FIELDS = ('status', 'appointment_date', 'slot_time', 'schedule_id', 'is_slot_booked')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_slot_state = instance._slot_state()
+        return instance
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_slot_state = self._slot_state()
+    
+    def _slot_state(self):
+        # __dict__ so deferred fields are reported missing instead of fetched
+        return {field: self.__dict__[field] for field in self.SLOT_STATE_FIELDS if field in self.__dict__}
+    
+    def slot_state_changed(self):
+        """Whether a slot-related column differs from what was loaded (True if unknown)"""
+        loaded = getattr(self, '_loaded_slot_state', None)
+        if loaded is None or len(loaded) < len(self.SLOT_STATE_FIELDS):
+            return True
+        return loaded != self._slot_state()
 
     def save(self, *args, **kwargs):
         # Auto-calculate total_fee
@@ -877,29 +1204,80 @@ class Appointment(models.Model):
         
         if self.status in ['cancelled']:
             self.is_slot_booked = False
-        elif self.status in ['pending', 'confirmed', 'completed']:
+        elif self.status in ['confirmed', 'completed'] or self._state.adding:
             self.is_slot_booked = True
-            
-        super().save(*args, **kwargs)
+        # A stored pending request keeps whatever place it has: only
+        # doctor.booking.release_expired_bookings gives an expired hold's place back
+        
+        if self.status != 'pending' or self.is_paid:
+            # Confirmed or paid requests no longer wait on their hold
+            self.slot_held_until = None
+        
+        with transaction.atomic():
+            previous = None if self._state.adding else self._stored_slot_hold()
+            current = self.slot_hold()
+            if previous != current:
+                if previous:
+                    ScheduleSlot.release(*previous)
+                    Schedules.adjust_booked_slots(previous[0], -1)
+                if current:
+                    self._reserve_slot(current)
+                    Schedules.adjust_booked_slots(current[0], 1)
+            super().save(*args, **kwargs)
+        self._loaded_slot_state = self._slot_state()
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = self._stored_slot_hold()
+            result = super().delete(*args, **kwargs)
+            if previous:
+                ScheduleSlot.release(*previous)
+                Schedules.adjust_booked_slots(previous[0], -1)
+        return result
+    
+    def slot_hold(self):
+        """(schedule_id, slot_time) whose ScheduleSlot counter this appointment occupies"""
+        if self.is_slot_booked and self.schedule_id and self.slot_time:
+            return self.schedule_id, self.slot_time
+        return None
+    
+    def _stored_slot_hold(self):
+        """The slot the stored row occupies, from the values loaded with this instance.
+
+        Only instances built by hand, or loaded with slot columns deferred, fall
+        back to reading the row.
+        """
+        row = getattr(self, '_loaded_slot_state', None)
+        if row is None or len(row) < len(self.SLOT_STATE_FIELDS):
+            row = Appointment.objects.filter(pk=self.pk).values('schedule_id', 'slot_time', 'is_slot_booked').first()
+        if row and row['is_slot_booked'] and row['schedule_id'] and row['slot_time']:
+            return row['schedule_id'], row['slot_time']
+        return None
+    
+    def _reserve_slot(self, hold):
+        if ScheduleSlot.reserve(*hold):
+            return
+        # Schedules saved before slots were materialized get their rows on first booking
+        if not ScheduleSlot.objects.filter(schedule_id=hold[0]).exists():
+            ScheduleSlot.materialize(self.schedule)
+            if ScheduleSlot.reserve(*hold):
+                return
+        raise SlotUnavailable({'slot_time': 'This time slot is fully booked or not bookable.'})
         
         
     def update_patient_location(self):
         """Update patient location from their current location"""
-        current_location = PatientLocation.objects.filter(
-            patient=self.patient, 
-            is_current=True
-        ).first()
+        current_location = PatientLocation.objects.filter(patient=self.patient).first()
         
         if current_location:
             self.patient_latitude = current_location.latitude
             self.patient_longitude = current_location.longitude
-            self.patient_address = current_location.address
             
             # Calculate distance if doctor location is set
             if self.doctor_location:
                 self.distance_km = self.doctor_location.calculate_distance_to(
-                    float(self.patient_latitude), 
-                    float(self.patient_longitude)
+                    self.patient_latitude,
+                    self.patient_longitude
                 )
             self.save()
 
@@ -1200,12 +1578,105 @@ class DoctorReview(models.Model):
         return f"{self.patient.user.get_full_name()} - {self.doctor.user.get_full_name()} ({self.rating}★)"
     
     def save(self, *args, **kwargs):
-        # Set reviewed_at when status changes from pending
-        if self.pk:
-            old_instance = DoctorReview.objects.get(pk=self.pk)
-            if old_instance.status == 'pending' and self.status != 'pending':
+        with transaction.atomic():
+            # Locked so concurrent moderations of this review move it between buckets once each
+            previous = self._locked_stored_state() if self.pk else None
+            # Set reviewed_at when status changes from pending
+            if previous and previous[0] == 'pending' and self.status != 'pending':
                 self.reviewed_at = timezone.now()
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
+            DoctorRatingSummary.apply_review_change(self.doctor_id, previous, (self.status, self.rating))
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = self._locked_stored_state()
+            result = super().delete(*args, **kwargs)
+            DoctorRatingSummary.apply_review_change(self.doctor_id, previous, None)
+        return result
+    
+    def _locked_stored_state(self):
+        """(status, rating) of the stored row, locked until the transaction ends; None if missing"""
+        return DoctorReview.objects.select_for_update().filter(pk=self.pk).values_list('status', 'rating').first()
+
+
+class DoctorRatingSummary(models.Model):
+    """Running review totals per doctor, kept in step by DoctorReview.save/delete"""
+    doctor = models.OneToOneField('Doctor', on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    approved_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    pending_count = models.PositiveIntegerField(default=0)
+    rejected_count = models.PositiveIntegerField(default=0)
+    star_1 = models.PositiveIntegerField(default=0)
+    star_2 = models.PositiveIntegerField(default=0)
+    star_3 = models.PositiveIntegerField(default=0)
+    star_4 = models.PositiveIntegerField(default=0)
+    star_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.doctor_id} - {self.average}★ ({self.approved_count})"
+    
+    @property
+    def average(self):
+        if not self.approved_count:
+            return 0
+        return round(self.rating_total / self.approved_count, 2)
+    
+    @property
+    def histogram(self):
+        return {star: getattr(self, f'star_{star}') for star in range(1, 6)}
+    
+    def as_dict(self):
+        return {
+            'average_rating': self.average,
+            'total_reviews': self.approved_count,
+            'rating_distribution': self.histogram,
+        }
+    
+    @staticmethod
+    def _deltas(status, rating, sign):
+        if status == 'approved':
+            deltas = {'approved_count': sign, 'rating_total': sign * rating}
+            if 1 <= rating <= 5:
+                deltas[f'star_{rating}'] = sign
+            return deltas
+        if status in ('pending', 'rejected'):
+            return {f'{status}_count': sign}
+        return {}
+    
+    @classmethod
+    def apply_review_change(cls, doctor_id, previous, current):
+        """Move one review between buckets; previous/current are (status, rating) or None"""
+        if previous == current:
+            return
+        deltas = {}
+        for state, sign in ((previous, -1), (current, 1)):
+            if state is None:
+                continue
+            for field, delta in cls._deltas(state[0], state[1], sign).items():
+                deltas[field] = deltas.get(field, 0) + delta
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        updates = {field: F(field) + delta for field, delta in deltas.items()}
+        if not cls.objects.filter(doctor_id=doctor_id).update(**updates):
+            # No summary yet: a delta on fresh zeros would undercount (or go negative)
+            # for reviews written before it existed, so recount the rows (this change included)
+            cls.rebuild_for(doctor_id)
+    
+    @classmethod
+    def rebuild_for(cls, doctor_id):
+        """Recount a doctor's summary from scratch (first review change, and the backfill command)"""
+        summary, _ = cls.objects.select_for_update().get_or_create(doctor_id=doctor_id)
+        for field in ['approved_count', 'rating_total', 'pending_count', 'rejected_count',
+                      'star_1', 'star_2', 'star_3', 'star_4', 'star_5']:
+            setattr(summary, field, 0)
+        for status, rating in DoctorReview.objects.filter(doctor_id=doctor_id).values_list('status', 'rating'):
+            for field, delta in cls._deltas(status, rating, 1).items():
+                setattr(summary, field, getattr(summary, field) + delta)
+        summary.save()
+        return summary
         
         
 class DoctorWallet(models.Model):
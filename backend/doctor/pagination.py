@@ -0,0 +1,91 @@
+"""Keyset (cursor) pagination helpers shared by list endpoints."""
+import base64
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder cuts datetimes and times to milliseconds; a cursor needs the exact key"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(ordering_key, values):
+    payload = json.dumps({'o': ordering_key, 'v': values}, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, ordering_key):
+    """Return the key values stored in `token`; the cursor must belong to the same ordering"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values = payload['v']
+        if payload['o'] != ordering_key or not isinstance(values, list):
+            raise InvalidCursor('Cursor does not match the requested ordering')
+        return values
+    except (ValueError, KeyError, TypeError) as e:
+        if isinstance(e, InvalidCursor):
+            raise
+        raise InvalidCursor('Malformed cursor')
+
+
+def _after(keys, values):
+    """Rows strictly after `values` in the ordering given by keys=[(field, descending), ...]"""
+    # Redundant bound on the leading key: an index on the keys can start its range
+    # scan at the cursor instead of filtering every earlier row
+    first_field, first_descending = keys[0]
+    bound = Q(**{f"{first_field}__{'lte' if first_descending else 'gte'}": values[0]})
+    condition = Q()
+    for i, (field, descending) in enumerate(keys):
+        step = Q(**{f"{field}__{'lt' if descending else 'gt'}": values[i]})
+        for j in range(i):
+            step &= Q(**{keys[j][0]: values[j]})
+        condition |= step
+    return bound & condition
+
+
+def _key_value(obj, field):
+    for part in field.split('__'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def keyset_page(queryset, keys, cursor=None, page_size=20, ordering_key='default'):
+    """Fetch one page ordered by `keys` plus the cursor for the next page (or None).
+
+    The last key must be unique (typically the primary key) so the ordering is
+    total and no row is skipped or repeated between pages.
+    """
+    ordered = queryset.order_by(*[f"{'-' if descending else ''}{field}" for field, descending in keys])
+    if cursor:
+        values = decode_cursor(cursor, ordering_key)
+        if len(values) != len(keys):
+            raise InvalidCursor('Cursor does not match the requested ordering')
+        ordered = ordered.filter(_after(keys, values))
+
+    rows = list(ordered[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(ordering_key, [_key_value(rows[-1], field) for field, _ in keys])
+    return rows, next_cursor
+
+
+def page_size_from(request, default=20, maximum=50):
+    try:
+        size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return min(max(size, 1), maximum)
@@ -0,0 +1,78 @@
+"""Per-day overlap detection for a doctor's schedules.
+
+DayIntervals keeps one day's schedules as sorted, disjoint blocks. Schedules
+that overlap each other (older data, or merge=True) share a block, so the
+blocks stay disjoint and a lookup is a bisect plus a walk over just the
+blocks it actually hits. Intervals are half-open: a schedule ending at 10:00
+does not conflict with one starting at 10:00.
+
+Lookups are O(log n + hits). Inserts find their place the same way but then
+splice a Python list, which is O(n). A day holds a few dozen schedules at
+most, so that memmove is cheaper than a balanced tree would be.
+"""
+from bisect import bisect_left
+
+from doctor.models import Schedules
+
+
+class DayIntervals:
+    def __init__(self, intervals=()):
+        # _blocks[i] = [start, end, [(start, end, key), ...]], sorted and disjoint
+        self._starts = []
+        self._blocks = []
+        for start, end, key in sorted(intervals, key=lambda item: (item[0], item[1])):
+            self.add(start, end, key, merge=True)
+
+    def __len__(self):
+        return sum(len(block[2]) for block in self._blocks)
+
+    def _hit_range(self, start, end):
+        """Block index range [low, high) overlapping start-end"""
+        high = bisect_left(self._starts, end)
+        low = high
+        while low > 0 and self._blocks[low - 1][1] > start:
+            low -= 1
+        return low, high
+
+    def conflicts(self, start, end):
+        """(start, end, key) of every stored interval overlapping start-end"""
+        low, high = self._hit_range(start, end)
+        return [
+            member
+            for block in self._blocks[low:high]
+            for member in block[2]
+            if member[0] < end and member[1] > start
+        ]
+
+    def add(self, start, end, key=None, merge=False):
+        """Insert an interval. Returns the conflicts; with merge=False nothing is stored if there are any.
+
+        Locating the blocks is a bisect; splicing the merged block into the
+        list is linear in the number of blocks.
+        """
+        low, high = self._hit_range(start, end)
+        hits = self._blocks[low:high]
+        conflicts = [
+            member for block in hits for member in block[2]
+            if member[0] < end and member[1] > start
+        ]
+        if conflicts and not merge:
+            return conflicts
+
+        block = [start, end, [(start, end, key)]]
+        for other in hits:
+            block[0] = min(block[0], other[0])
+            block[1] = max(block[1], other[1])
+            block[2].extend(other[2])
+        self._blocks[low:high] = [block]
+        self._starts[low:high] = [block[0]]
+        return conflicts
+
+
+def doctor_day_intervals(doctor, day, exclude_id=None):
+    """DayIntervals of the doctor's active schedules on one date, keyed by schedule id"""
+    schedules = Schedules.objects.filter(doctor=doctor, date=day, is_active=True)
+    if exclude_id:
+        schedules = schedules.exclude(id=exclude_id)
+    return DayIntervals(schedules.values_list('start_time', 'end_time', 'id'))
+
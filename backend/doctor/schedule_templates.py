@@ -0,0 +1,141 @@
+"""Expand weekly ScheduleTemplates into concrete Schedules in one batch.
+
+All checks run in memory against one query of the doctor's existing
+schedules for the affected months: overlap with existing (and earlier
+generated) schedules via DayIntervals, and the plan's daily/monthly
+schedule limits. Rows are then written with bulk_create, so Schedules.save()/full_clean() and their
+signals are skipped; the template's shape is validated once up front instead.
+"""
+import calendar
+import logging
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from doctor.availability import schedule_next_slot_refresh
+from doctor.models import Doctor, Schedules, ScheduleSlot
+from doctor.schedule_overlap import DayIntervals
+
+logger = logging.getLogger(__name__)
+
+MAX_RANGE_DAYS = 92
+
+
+class TemplateExpansionError(Exception):
+    def __init__(self, message, error_type='invalid'):
+        super().__init__(message)
+        self.message = message
+        self.error_type = error_type
+
+
+def _month_bounds(first, last):
+    month_end = calendar.monthrange(last.year, last.month)[1]
+    return first.replace(day=1), last.replace(day=month_end)
+
+
+def plan_expansion(template, start_date, end_date):
+    """Work out which dates can be generated. Returns (schedules_to_create, conflicts, over_limit)"""
+    if end_date < start_date or (end_date - start_date).days >= MAX_RANGE_DAYS:
+        raise TemplateExpansionError(f'Range must be ordered and at most {MAX_RANGE_DAYS} days.')
+
+    doctor = template.doctor
+    plan = doctor.get_current_plan()
+    if not plan:
+        raise TemplateExpansionError('Active subscription required to create schedules.', 'subscription_required')
+
+    shape = template.template()
+    if not shape.slots:
+        raise TemplateExpansionError('Template has no bookable slots.')
+
+    today = timezone.localdate()
+    dates = template.dates_between(max(start_date, today), end_date)
+    if not dates:
+        return [], [], []
+
+    # One query feeds both the overlap check and the quota counters
+    month_start, month_end = _month_bounds(dates[0], dates[-1])
+    existing = Schedules.objects.filter(
+        doctor=doctor,
+        is_active=True,
+        date__gte=month_start,
+        date__lte=month_end
+    ).values_list('date', 'start_time', 'end_time', 'id')
+
+    rows = defaultdict(list)
+    per_day = Counter()
+    per_month = Counter()
+    for day, start, end, schedule_id in existing:
+        rows[day].append((start, end, schedule_id))
+        per_day[day] += 1
+        per_month[(day.year, day.month)] += 1
+
+    intervals = defaultdict(DayIntervals, {day: DayIntervals(day_rows) for day, day_rows in rows.items()})
+
+    to_create, conflicts, over_limit = [], [], []
+    for day in dates:
+        if intervals[day].conflicts(template.start_time, template.end_time):
+            conflicts.append(day)
+            continue
+        month = (day.year, day.month)
+        if per_day[day] >= plan.max_schedules_per_day or per_month[month] >= plan.max_schedules_per_month:
+            over_limit.append(day)
+            continue
+
+        to_create.append(Schedules(
+            doctor=doctor,
+            service_id=template.service_id,
+            mode=template.mode,
+            date=day,
+            start_time=template.start_time,
+            end_time=template.end_time,
+            slot_duration=template.slot_duration,
+            break_start_time=template.break_start_time,
+            break_end_time=template.break_end_time,
+            total_slots=len(shape.slots),
+            max_patients_per_slot=template.max_patients_per_slot,
+        ))
+        intervals[day].add(template.start_time, template.end_time)
+        per_day[day] += 1
+        per_month[month] += 1
+
+    return to_create, conflicts, over_limit
+
+
+def expand_template(template, start_date, end_date, allow_partial=True):
+    """Create the template's schedules for a date range.
+
+    With allow_partial=False nothing is written if any date conflicts or is
+    over the plan limit. Returns (created_schedules, conflicts, over_limit).
+    """
+    with transaction.atomic():
+        # Serializes expansions per doctor so two batches cannot both pass the quota
+        Doctor.objects.select_for_update().filter(pk=template.doctor_id).first()
+        to_create, conflicts, over_limit = plan_expansion(template, start_date, end_date)
+        if not to_create or (not allow_partial and (conflicts or over_limit)):
+            return [], conflicts, over_limit
+
+        shape = template.template()
+        created = Schedules.objects.bulk_create(to_create)
+        ScheduleSlot.objects.bulk_create([
+            ScheduleSlot(
+                schedule=schedule,
+                doctor_id=schedule.doctor_id,
+                date=schedule.date,
+                start_time=slot.start,
+                end_time=slot.end,
+                capacity=schedule.max_patients_per_slot,
+            )
+            for schedule in created
+            for slot in shape.slots
+        ], batch_size=1000)
+
+        # What SchedulesSerializer.create() does per schedule, done once for the batch
+        mode_field = f'consultation_mode_{template.mode}'
+        if mode_field in ('consultation_mode_online', 'consultation_mode_offline'):
+            Doctor.objects.filter(pk=template.doctor_id).update(**{mode_field: True})
+        # bulk_create skips the Schedules signals, so refresh the next slot once here
+        schedule_next_slot_refresh(template.doctor_id)
+
+    logger.info(f"Template {template.id} generated {len(created)} schedules for doctor {template.doctor_id}")
+    return created, conflicts, over_limit
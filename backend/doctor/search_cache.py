@@ -0,0 +1,128 @@
+"""Redis-backed result cache for nearby-doctor searches.
+
+Entries are keyed by a ~1km grid cell of the patient location plus a radius
+bucket. Each entry holds the serialized doctors around the cell centre for the
+bucket radius padded by the cell's half-diagonal, so exact distances for the
+real patient point can be recomputed from it without touching Postgres.
+
+Only location writes and doctor availability/activation changes invalidate
+entries. Ratings and next-available slots in the cached rows go stale and are
+overlaid with current values by the caller on every hit.
+"""
+import logging
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from doctor.distance import haversine_from_origin_km
+from doctor.geo import nearby_locations
+
+logger = logging.getLogger(__name__)
+
+CELL_DEG = 0.01
+# Half-diagonal of a 0.01 degree cell is < 0.8km anywhere on the globe
+CELL_PAD_KM = 1.0
+RADIUS_BUCKETS_KM = [1, 2, 5, 10, 20, 50, 100]
+
+VERSION_KEY = 'nearby_search:version'
+HITS_KEY = 'nearby_search:hits'
+MISSES_KEY = 'nearby_search:misses'
+
+
+def radius_bucket(radius_km):
+    """Smallest bucket covering the radius; larger radii round up to the next 50km"""
+    for bucket in RADIUS_BUCKETS_KM:
+        if radius_km <= bucket:
+            return bucket
+    return int(math.ceil(radius_km / 50.0) * 50)
+
+
+def grid_cell(lat, lng):
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lng / CELL_DEG))
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key missing or evicted; add() keeps a concurrent first writer's value
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def invalidate_nearby_search_cache():
+    """Drop every cached search at once by bumping the key version"""
+    try:
+        _incr(VERSION_KEY)
+    except Exception as e:
+        logger.error(f"Failed to invalidate nearby search cache: {str(e)}")
+
+
+def schedule_nearby_search_invalidation():
+    """Invalidate once the surrounding transaction commits, so readers cannot re-cache pre-commit rows"""
+    transaction.on_commit(invalidate_nearby_search_cache)
+
+
+def nearby_search_cache_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = stats.get(HITS_KEY, 0)
+    misses = stats.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_nearby_search_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def _load_entry(lat, lng, bucket, serialize):
+    """Search around the cell centre and keep serialized rows with their coordinates"""
+    cell_lat, cell_lng = grid_cell(lat, lng)
+    centre_lat = (cell_lat + 0.5) * CELL_DEG
+    centre_lng = (cell_lng + 0.5) * CELL_DEG
+    locations = list(nearby_locations(centre_lat, centre_lng, bucket + CELL_PAD_KM))
+    return {
+        'rows': [dict(row) for row in serialize(locations)],
+        'lats': [float(location.latitude) for location in locations],
+        'lngs': [float(location.longitude) for location in locations],
+    }
+
+
+def cached_nearby_search(lat, lng, radius_km, serialize):
+    """Return (rows, cache_hit) for doctors within radius_km, nearest first.
+
+    `serialize` turns a list of DoctorLocation objects into dicts and is only
+    called on a miss.
+    """
+    bucket = radius_bucket(radius_km)
+    cell_lat, cell_lng = grid_cell(lat, lng)
+    key = f"nearby_search:v{_version()}:{cell_lat}:{cell_lng}:{bucket}"
+
+    entry = cache.get(key)
+    hit = entry is not None
+    if not hit:
+        entry = _load_entry(lat, lng, bucket, serialize)
+        cache.set(key, entry, timeout=getattr(settings, 'NEARBY_SEARCH_CACHE_TTL', 300))
+    _incr(HITS_KEY if hit else MISSES_KEY)
+
+    distances = haversine_from_origin_km(lat, lng, entry['lats'], entry['lngs'])
+    results = []
+    for row, distance in zip(entry['rows'], distances):
+        if distance <= radius_km:
+            results.append(dict(row, distance=round(float(distance), 2)))
+    results.sort(key=lambda row: row['distance'])
+    return results, hit
@@ -6,7 +6,7 @@ import hashlib
 from django.conf import settings
 from django.contrib.auth import authenticate
 from django.db import transaction
-from django.db.models import Sum, Avg, Count, Q
+from django.db.models import Sum, Avg, Count, Q, F, Min, Max
 from django.http import HttpResponse
 from django.utils import timezone
 from reportlab.lib.colors import HexColor, Color
@@ -25,6 +25,7 @@ from .models import (
     DoctorProof,
     Service,
     Schedules,
+    ScheduleTemplate,
     DoctorLocation,
     Appointment
 )
@@ -244,6 +245,7 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
     doctor_department = serializers.SerializerMethodField()
     doctor_gender = serializers.SerializerMethodField()
     doctor_date_of_birth = serializers.SerializerMethodField() 
+    next_available_slot = serializers.SerializerMethodField()
     
 
     class Meta:
@@ -267,7 +269,7 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
             'doctor_location', 'doctor_is_available', 'doctor_verification_status',
             'profile_picture_url', 'has_profile_picture', 'profile_completed',
             'doctor_specialization','doctor_gender',
-            'doctor_date_of_birth'
+            'doctor_date_of_birth', 'next_available_slot'
         ]
         read_only_fields = ['id', 'role', 'is_active']
 
@@ -333,6 +335,10 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
             return doctor.profile_picture.url
         return None
     
+    def get_next_available_slot(self, obj):
+        doctor = getattr(obj, "doctor_profile", None)
+        return doctor.next_available_slot if doctor else None
+    
     def get_doctor_date_of_birth(self, obj):
         """Return the date of birth from doctor profile"""
         dob = getattr(getattr(obj, "doctor_profile", None), "date_of_birth", None)
@@ -1552,6 +1558,30 @@ class SchedulesSerializer(serializers.ModelSerializer):
             'has_appointments', 'appointments_count', 'earliest_appointment', 'latest_appointment'
         ]
 
+    # Appointments that block time changes: pending/confirmed on the schedule's own date
+    PROTECTED_APPOINTMENTS = Q(
+        appointments__status__in=['confirmed', 'pending'],
+        appointments__appointment_date=F('date')
+    )
+
+    @classmethod
+    def annotate_queryset(cls, queryset):
+        """Schedules with everything a listing reads, so rows need no queries of their own"""
+        return queryset.select_related('doctor__user', 'service').annotate(
+            protected_count=Count('appointments', filter=cls.PROTECTED_APPOINTMENTS),
+            earliest_slot=Min('appointments__slot_time', filter=cls.PROTECTED_APPOINTMENTS),
+            latest_slot=Max('appointments__slot_time', filter=cls.PROTECTED_APPOINTMENTS),
+        )
+
+    @staticmethod
+    def services_payload(doctor_ids):
+        """{doctor_id: serialized active services}, pass as context['services_by_doctor']"""
+        payload = {doctor_id: [] for doctor_id in doctor_ids}
+        services = list(Service.objects.filter(doctor_id__in=payload.keys(), is_active=True))
+        for service, data in zip(services, ServiceSerializer(services, many=True).data):
+            payload[service.doctor_id].append(data)
+        return payload
+
     # Existing methods
     def get_doctor_name(self, obj):
         if obj.doctor and obj.doctor.user:
@@ -1559,6 +1589,9 @@ class SchedulesSerializer(serializers.ModelSerializer):
         return None
 
     def get_available_services(self, obj):
+        services_by_doctor = self.context.get('services_by_doctor')
+        if services_by_doctor is not None and obj.doctor_id in services_by_doctor:
+            return services_by_doctor[obj.doctor_id]
         if obj.doctor:
             services = obj.doctor.service_set.filter(is_active=True)
             return ServiceSerializer(services, many=True).data
@@ -1577,55 +1610,31 @@ class SchedulesSerializer(serializers.ModelSerializer):
         return obj.get_break_duration()
 
     # Appointment protection methods
+    def _protected_appointments(self, obj):
+        """(count, earliest slot, latest slot), from annotate_queryset or one aggregate query"""
+        if not hasattr(obj, 'protected_count'):
+            stats = Schedules.objects.filter(pk=obj.pk).aggregate(
+                protected_count=Count('appointments', filter=self.PROTECTED_APPOINTMENTS),
+                earliest_slot=Min('appointments__slot_time', filter=self.PROTECTED_APPOINTMENTS),
+                latest_slot=Max('appointments__slot_time', filter=self.PROTECTED_APPOINTMENTS),
+            )
+            for name, value in stats.items():
+                setattr(obj, name, value)
+        return obj.protected_count or 0, obj.earliest_slot, obj.latest_slot
+
     def get_has_appointments(self, obj):
-        try:
-            
-            return Appointment.objects.filter(
-                schedule=obj,
-                status__in=['confirmed', 'pending'],
-                appointment_date=obj.date
-            ).exists()
-        except:
-            return False
+        return self._protected_appointments(obj)[0] > 0
 
     def get_appointments_count(self, obj):
-        try:
-            
-            return Appointment.objects.filter(
-                schedule=obj,
-                status__in=['confirmed', 'pending'],
-                appointment_date=obj.date
-            ).count()
-        except:
-            return 0
+        return self._protected_appointments(obj)[0]
 
     def get_earliest_appointment(self, obj):
-        try:
-            
-            earliest = Appointment.objects.filter(
-                schedule=obj,
-                status__in=['confirmed', 'pending'],
-                appointment_date=obj.date
-            ).order_by('slot_time').first()
-            if earliest:
-                return earliest.slot_time.strftime('%H:%M')
-        except:
-            pass
-        return None
+        earliest = self._protected_appointments(obj)[1]
+        return earliest.strftime('%H:%M') if earliest else None
 
     def get_latest_appointment(self, obj):
-        try:
-            
-            latest = Appointment.objects.filter(
-                schedule=obj,
-                status__in=['confirmed', 'pending'],
-                appointment_date=obj.date
-            ).order_by('-slot_time').first()
-            if latest:
-                return latest.slot_time.strftime('%H:%M')
-        except:
-            pass
-        return None
+        latest = self._protected_appointments(obj)[2]
+        return latest.strftime('%H:%M') if latest else None
 
     def validate(self, data):
         """Enhanced cross-field validation with appointment protection"""
@@ -1749,6 +1758,76 @@ class SchedulesSerializer(serializers.ModelSerializer):
         return instance
     
     
+class ScheduleTemplateSerializer(serializers.ModelSerializer):
+    """Weekly recurring schedule template"""
+    
+    service_name = serializers.CharField(source='service.service_name', read_only=True)
+    total_slots = serializers.SerializerMethodField(read_only=True)
+    working_hours = serializers.SerializerMethodField(read_only=True)
+    
+    class Meta:
+        model = ScheduleTemplate
+        fields = [
+            'id', 'service', 'service_name', 'mode', 'weekdays', 'start_time', 'end_time',
+            'slot_duration', 'break_start_time', 'break_end_time', 'max_patients_per_slot',
+            'is_active', 'total_slots', 'working_hours', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'service_name', 'total_slots', 'working_hours', 'created_at', 'updated_at']
+    
+    def get_total_slots(self, obj):
+        return len(obj.template().slots)
+    
+    def get_working_hours(self, obj):
+        return obj.template().working_seconds / 3600
+    
+    def validate_weekdays(self, value):
+        if not value:
+            raise serializers.ValidationError("Select at least one weekday.")
+        if any(day < 0 or day > 6 for day in value):
+            raise serializers.ValidationError("Weekdays must be between 0 (Monday) and 6 (Sunday).")
+        return sorted(set(value))
+    
+    def validate(self, data):
+        """Same shape rules as a single schedule, checked once for every generated day"""
+        errors = {}
+        
+        def get(field):
+            # Partial updates fall back to the stored value
+            return data.get(field, getattr(self.instance, field, None))
+        
+        start_time, end_time = get('start_time'), get('end_time')
+        break_start_time, break_end_time = get('break_start_time'), get('break_end_time')
+        slot_duration = get('slot_duration')
+        
+        if start_time and end_time and start_time >= end_time:
+            errors['end_time'] = "End time must be after start time."
+        
+        if break_start_time and break_end_time:
+            if break_start_time >= break_end_time:
+                errors['break_end_time'] = "Break end time must be after break start time."
+            if start_time and break_start_time < start_time:
+                errors['break_start_time'] = "Break start time must be within schedule hours."
+            if end_time and break_end_time > end_time:
+                errors['break_end_time'] = "Break end time must be within schedule hours."
+        elif bool(break_start_time) != bool(break_end_time):
+            errors['break_start_time'] = "Break start and end time must be provided together."
+        
+        if slot_duration is not None and slot_duration <= timedelta(0):
+            errors['slot_duration'] = "Slot duration must be positive."
+        
+        if get('max_patients_per_slot') is not None and get('max_patients_per_slot') <= 0:
+            errors['max_patients_per_slot'] = "Maximum patients per slot must be at least 1."
+        
+        request = self.context.get('request')
+        service = data.get('service')
+        if service and request and service.doctor.user_id != request.user.id:
+            errors['service'] = "You can only use your own services."
+        
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
+
 class DoctorLocationSerializer(serializers.ModelSerializer):
     doctor_name = serializers.CharField(source='doctor.user.get_full_name', read_only=True)
     distance = serializers.FloatField(read_only=True)
@@ -2290,11 +2369,9 @@ class DashboardDataService:
         )
         
         # Rating & reviews
-        avg_rating = self.doctor.reviews.filter(
-            status='approved'
-        ).aggregate(avg=Avg('rating'))['avg'] or 0
-        
-        total_reviews = self.doctor.reviews.filter(status='approved').count()
+        rating_stats = self.doctor.rating_stats
+        avg_rating = rating_stats['average_rating']
+        total_reviews = rating_stats['total_reviews']
         
         # Completion rate
         completion_rate = (
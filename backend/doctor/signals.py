@@ -0,0 +1,140 @@
+from django.db import connection
+from django.db.models.signals import post_init, post_save, post_delete, pre_migrate
+from django.dispatch import receiver
+
+from doctor.availability import schedule_next_slot_refresh
+from doctor.directory_search import SEARCH_DOCTOR_FIELDS, SEARCH_USER_FIELDS, schedule_search_refresh
+from doctor.models import User, Doctor, DoctorLocation, Schedules, Appointment
+from doctor.search_cache import schedule_nearby_search_invalidation
+from doctor.spatial_index import sync_doctor_user_locations
+from doctor.suggest_index import (
+    sync_doctor_suggestions, sync_doctor_user_suggestions, drop_doctor_suggestions
+)
+
+SUGGESTION_USER_FIELDS = {'first_name', 'last_name', 'is_active', 'role'}
+
+
+_UNKNOWN = object()
+
+
+def _stash_loaded(instance, field):
+    """Remember the value `field` was loaded with so post_save can tell if it changed"""
+    # __dict__ so a deferred field is recorded as unknown instead of fetched
+    setattr(instance, f'_loaded_{field}', instance.__dict__.get(field, _UNKNOWN))
+
+
+def _field_changed(instance, field, created, update_fields):
+    if update_fields is not None and field not in update_fields:
+        return False
+    loaded = getattr(instance, f'_loaded_{field}', _UNKNOWN)
+    _stash_loaded(instance, field)
+    return created or loaded is _UNKNOWN or loaded != getattr(instance, field)
+
+
+@receiver(post_save, sender=DoctorLocation)
+@receiver(post_delete, sender=DoctorLocation)
+def invalidate_search_on_location_change(sender, instance, **kwargs):
+    """Any location write can move a doctor in or out of a cached search"""
+    schedule_nearby_search_invalidation()
+
+
+@receiver(post_init, sender=Doctor)
+def stash_doctor_availability(sender, instance, **kwargs):
+    _stash_loaded(instance, 'is_available')
+
+
+@receiver(post_save, sender=Doctor)
+def invalidate_search_on_availability_change(sender, instance, created, update_fields=None, **kwargs):
+    if _field_changed(instance, 'is_available', created, update_fields):
+        schedule_nearby_search_invalidation()
+
+
+@receiver(post_init, sender=User)
+def stash_doctor_user_active(sender, instance, **kwargs):
+    _stash_loaded(instance, 'is_active')
+
+
+@receiver(post_save, sender=User)
+def invalidate_search_on_doctor_activation(sender, instance, created, update_fields=None, **kwargs):
+    if instance.role != 'doctor' or created:
+        return
+    if _field_changed(instance, 'is_active', created, update_fields):
+        schedule_nearby_search_invalidation()
+        # Deactivated doctors leave the k-nearest index now, not at the next rebuild
+        sync_doctor_user_locations(instance)
+
+
+@receiver(pre_migrate)
+def ensure_trigram_extension(sender, **kwargs):
+    """The directory search index uses gin_trgm_ops, which needs pg_trgm"""
+    if sender.name != 'doctor' or connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+@receiver(post_save, sender=Schedules)
+@receiver(post_delete, sender=Schedules)
+def refresh_next_slot_on_schedule_change(sender, instance, update_fields=None, **kwargs):
+    # booked_slots-only saves follow an appointment change, which already refreshes
+    if update_fields is not None and set(update_fields) == {'booked_slots'}:
+        return
+    schedule_next_slot_refresh(instance.doctor_id)
+
+
+@receiver(post_save, sender=Doctor)
+def create_next_slot_on_profile_create(sender, instance, created, **kwargs):
+    """Every doctor gets a DoctorNextSlot row, which the directory's next_available order joins on"""
+    if created:
+        schedule_next_slot_refresh(instance.pk)
+
+
+@receiver(post_save, sender=Appointment)
+def refresh_next_slot_on_appointment_save(sender, instance, created, **kwargs):
+    """Bookings, cancellations and reschedules change which slot is the next free one.
+
+    Payment, notes and rating saves leave every slot column alone and are skipped.
+    """
+    if created or instance.slot_state_changed():
+        schedule_next_slot_refresh(instance.doctor_id)
+
+
+@receiver(post_delete, sender=Appointment)
+def refresh_next_slot_on_appointment_delete(sender, instance, **kwargs):
+    schedule_next_slot_refresh(instance.doctor_id)
+
+
+@receiver(post_save, sender=Doctor)
+def update_suggestions_on_profile_save(sender, instance, **kwargs):
+    sync_doctor_suggestions(instance)
+
+
+@receiver(post_delete, sender=Doctor)
+def update_suggestions_on_profile_delete(sender, instance, **kwargs):
+    drop_doctor_suggestions(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def update_suggestions_on_doctor_user_save(sender, instance, created, update_fields=None, **kwargs):
+    """Only name/activation changes can alter what the autocomplete shows"""
+    if instance.role != 'doctor' or created:
+        return
+    if update_fields is not None and not SUGGESTION_USER_FIELDS.intersection(update_fields):
+        return
+    sync_doctor_user_suggestions(instance)
+
+
+@receiver(post_save, sender=Doctor)
+def refresh_search_document_on_profile_save(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or SEARCH_DOCTOR_FIELDS.intersection(update_fields):
+        schedule_search_refresh(pk=instance.pk)
+
+
+@receiver(post_save, sender=User)
+def refresh_search_document_on_doctor_user_save(sender, instance, created, update_fields=None, **kwargs):
+    """Doctor names are part of the directory search document"""
+    if instance.role != 'doctor' or created:
+        return
+    if update_fields is not None and not SEARCH_USER_FIELDS.intersection(update_fields):
+        return
+    schedule_search_refresh(user_id=instance.pk)
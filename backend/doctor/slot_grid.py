@@ -0,0 +1,86 @@
+"""Slot grid arithmetic shared by schedules, slot materialization and availability.
+
+Doctors repeat the same (start, end, slot_duration, break) shape day after
+day, so the grid is computed once per shape and memoized as a SlotTemplate.
+Kept free of model imports so doctor.models can use it directly.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+# Any fixed day works: a shape's grid does not depend on the calendar date
+_REFERENCE_DAY = date(2000, 1, 3)
+
+SlotTemplate = namedtuple('SlotTemplate', ['slots', 'working_seconds'])
+TemplateSlot = namedtuple('TemplateSlot', ['start', 'end', 'start_label', 'end_label', 'label_24h'])
+
+_EMPTY = SlotTemplate(slots=(), working_seconds=0)
+
+
+@lru_cache(maxsize=2048)
+def slot_template(start_time, end_time, slot_duration, break_start=None, break_end=None):
+    """Precomputed slots and labels for one schedule shape.
+
+    Slots are whole slot_duration steps from start to end, minus any that
+    overlap the break. working_seconds is the span minus the break.
+    """
+    if not (start_time and end_time):
+        return _EMPTY
+    current = datetime.combine(_REFERENCE_DAY, start_time)
+    end = datetime.combine(_REFERENCE_DAY, end_time)
+    if end <= current:
+        return _EMPTY
+
+    has_break = bool(break_start and break_end)
+    working = end - current
+    if has_break:
+        break_start = datetime.combine(_REFERENCE_DAY, break_start)
+        break_end = datetime.combine(_REFERENCE_DAY, break_end)
+        working -= max(break_end - break_start, timedelta(0))
+    working_seconds = max(working.total_seconds(), 0)
+    if not slot_duration or slot_duration <= timedelta(0):
+        return SlotTemplate(slots=(), working_seconds=working_seconds)
+
+    slots = []
+    while current + slot_duration <= end:
+        slot_end = current + slot_duration
+        if not (has_break and current < break_end and slot_end > break_start):
+            slots.append(TemplateSlot(
+                start=current.time(),
+                end=slot_end.time(),
+                start_label=current.strftime('%I:%M %p'),
+                end_label=slot_end.strftime('%I:%M %p'),
+                label_24h=current.strftime('%H:%M'),
+            ))
+        current = slot_end
+    return SlotTemplate(slots=tuple(slots), working_seconds=working_seconds)
+
+
+def schedule_template(schedule):
+    return slot_template(
+        schedule.start_time, schedule.end_time, schedule.slot_duration,
+        schedule.break_start_time, schedule.break_end_time
+    )
+
+
+def slot_times(day, start_time, end_time, slot_duration, break_start=None, break_end=None):
+    """Start times of every whole slot between start and end, skipping any that overlap the break"""
+    if not day:
+        return []
+    return [slot.start for slot in slot_template(start_time, end_time, slot_duration, break_start, break_end).slots]
+
+
+def schedule_slot_times(schedule):
+    if not schedule.date:
+        return []
+    return [slot.start for slot in schedule_template(schedule).slots]
+
+
+def slot_end_time(day, start_time, slot_duration):
+    return (datetime.combine(day, start_time) + slot_duration).time()
+
+
+@lru_cache(maxsize=2048)
+def time_labels(value):
+    """('09:30 AM', '09:30') for a time, as shown in slot listings"""
+    return value.strftime('%I:%M %p'), value.strftime('%H:%M')
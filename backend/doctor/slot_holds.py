@@ -0,0 +1,125 @@
+"""Short-lived slot holds in Redis while a patient is checking out.
+
+Each schedule has one sorted set, slot_holds:<schedule_id>, with members
+"<HH:MM>|<patient_id>" scored by their expiry (epoch ms). Expired members
+are dropped on every write and ignored on every read, so an abandoned
+checkout stops counting against the slot after SLOT_HOLD_TTL seconds with
+no cleanup job. The take is one Lua script, so the count-then-add cannot
+race with another patient's take.
+
+Holds are advisory: if Redis is unreachable, takes succeed and reads see no
+holds, and booking falls back to the ScheduleSlot row lock alone.
+"""
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 600
+
+# KEYS[1] hold set; ARGV: now_ms, expires_ms, slot, member, available, ttl_ms
+# A patient holds at most one slot per schedule: taking another releases the old one.
+_TAKE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local prefix = ARGV[3] .. '|'
+local patient = string.sub(ARGV[4], #prefix)
+local held = 0
+for _, member in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    if member ~= ARGV[4] then
+        if string.sub(member, -#patient) == patient then
+            redis.call('ZREM', KEYS[1], member)
+        elseif string.sub(member, 1, #prefix) == prefix then
+            held = held + 1
+        end
+    end
+end
+if redis.call('ZSCORE', KEYS[1], ARGV[4]) == false and held >= tonumber(ARGV[5]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+redis.call('PEXPIRE', KEYS[1], ARGV[6])
+return 1
+"""
+
+
+def hold_ttl():
+    return getattr(settings, 'SLOT_HOLD_TTL', DEFAULT_TTL)
+
+
+def _key(schedule_id):
+    return f'slot_holds:{schedule_id}'
+
+
+def _member(slot_time, patient_id):
+    return f"{slot_time.strftime('%H:%M')}|{patient_id}"
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def take_hold(schedule_id, slot_time, patient_id, available):
+    """Hold slot_time for the patient if fewer than `available` other holds exist.
+
+    `available` is the slot's capacity minus committed bookings. Returns the
+    hold's expiry (aware datetime), or None when the slot is fully held.
+    """
+    ttl_ms = hold_ttl() * 1000
+    now_ms = int(time.time() * 1000)
+    expires_at = datetime.fromtimestamp((now_ms + ttl_ms) / 1000, tz=dt_timezone.utc)
+    try:
+        taken = _redis().eval(
+            _TAKE_SCRIPT, 1, _key(schedule_id),
+            now_ms, now_ms + ttl_ms, slot_time.strftime('%H:%M'),
+            _member(slot_time, patient_id), max(available, 0), ttl_ms
+        )
+    except Exception as e:
+        logger.warning(f"Slot hold unavailable for schedule {schedule_id}: {str(e)}")
+        return expires_at
+    return expires_at if taken else None
+
+
+def release_hold(schedule_id, slot_time, patient_id):
+    try:
+        _redis().zrem(_key(schedule_id), _member(slot_time, patient_id))
+    except Exception as e:
+        logger.warning(f"Could not release slot hold on schedule {schedule_id}: {str(e)}")
+
+
+def held_slot_counts(schedule_ids, exclude_patient=None):
+    """Live holds per (schedule_id, 'HH:MM'), one pipelined read for all schedules.
+
+    exclude_patient leaves out that patient's own hold, so the slot they are
+    checking out stays available to them.
+    """
+    counts = {}
+    schedule_ids = list(schedule_ids)
+    if not schedule_ids:
+        return counts
+    now_ms = int(time.time() * 1000)
+    suffix = f'|{exclude_patient}' if exclude_patient else None
+    try:
+        pipeline = _redis().pipeline(transaction=False)
+        for schedule_id in schedule_ids:
+            pipeline.zrangebyscore(_key(schedule_id), now_ms, '+inf')
+        results = pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Could not read slot holds: {str(e)}")
+        return counts
+
+    for schedule_id, members in zip(schedule_ids, results):
+        for member in members:
+            member = member.decode() if isinstance(member, bytes) else member
+            if suffix and member.endswith(suffix):
+                continue
+            key = (schedule_id, member.split('|', 1)[0])
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def held_count(counts, schedule_id, slot_time):
+    return counts.get((schedule_id, slot_time.strftime('%H:%M')), 0)
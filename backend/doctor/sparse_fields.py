@@ -0,0 +1,50 @@
+"""Sparse fieldsets: ?fields=a,b,c limits a serializer to the named fields.
+
+Unrequested fields are dropped before serialization, so their
+SerializerMethodFields are never computed, and FIELD_RELATIONS lets the
+view join only the relations the remaining fields read.
+"""
+
+
+def requested_fields(request):
+    """Field names from ?fields=, or None when the parameter is absent (all fields)"""
+    raw = request.GET.get('fields')
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(',') if name.strip()} or None
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin: with context['fields'] set, only those fields (and ALWAYS_INCLUDED) are built"""
+
+    ALWAYS_INCLUDED = ('id',)
+    # field name -> select_related paths the field reads
+    FIELD_RELATIONS = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if requested:
+            keep = set(requested).union(self.ALWAYS_INCLUDED)
+            for name in [name for name in fields if name not in keep]:
+                fields.pop(name)
+        return fields
+
+    @classmethod
+    def related_for(cls, fields=None):
+        """select_related paths needed to render `fields` (all fields when None)"""
+        names = cls.FIELD_RELATIONS if fields is None else fields
+        return sorted({path for name in names for path in cls.FIELD_RELATIONS.get(name, ())})
+
+    @classmethod
+    def with_related(cls, queryset, fields=None):
+        return queryset.select_related(*cls.related_for(fields))
+
+
+class SparseFieldsetViewMixin:
+    """Generic view mixin: passes ?fields= to the serializer context"""
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = requested_fields(self.request)
+        return context
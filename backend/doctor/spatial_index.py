@@ -0,0 +1,226 @@
+"""In-process k-nearest index over active doctor locations.
+
+Points live on the unit sphere so chord distance orders them like great-circle
+distance. Writes from the DoctorLocation views go to a pending buffer and a
+tombstone set until the next rebuild; each worker also rebuilds after
+SPATIAL_INDEX_MAX_AGE seconds to pick up writes made elsewhere.
+
+Rebuilds never run on a search: a stale or overloaded snapshot starts one
+background thread that loads the rows and swaps the new tree in, and searches
+keep using the old tree (plus buffers) meanwhile. Until the first tree exists
+nearest() returns None and callers fall back to PostGIS.
+"""
+import heapq
+import logging
+import threading
+import time
+from array import array
+from math import radians, cos, sin, asin
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from doctor.models import DoctorLocation
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371
+MIN_REBUILD_DELTA = 64
+REBUILD_FRACTION = 0.1
+
+
+def to_xyz(lat, lng):
+    """Project lat/lng degrees onto the unit sphere"""
+    lat, lng = radians(float(lat)), radians(float(lng))
+    return cos(lat) * cos(lng), cos(lat) * sin(lng), sin(lat)
+
+
+def chord_to_km(chord_sq):
+    """Convert a squared unit-sphere chord into great-circle kilometres"""
+    half_chord = min(chord_sq ** 0.5 / 2, 1.0)
+    return 2 * asin(half_chord) * EARTH_RADIUS_KM
+
+
+class KDTree:
+    """Static 3-d KD-tree stored as an implicit median-split array layout"""
+
+    def __init__(self, ids, xs, ys, zs):
+        self.ids = ids
+        self.coords = (xs, ys, zs)
+        self.order = list(range(len(ids)))
+        self._build(0, len(self.order), 0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _build(self, lo, hi, axis):
+        if hi - lo <= 1:
+            return
+        values = self.coords[axis]
+        self.order[lo:hi] = sorted(self.order[lo:hi], key=values.__getitem__)
+        mid = (lo + hi) // 2
+        next_axis = (axis + 1) % 3
+        self._build(lo, mid, next_axis)
+        self._build(mid + 1, hi, next_axis)
+
+    def nearest(self, point, k, skip):
+        """Return up to k (chord_sq, id) pairs, nearest first, ignoring ids in skip"""
+        heap = []  # max-heap of (-chord_sq, id)
+        self._search(0, len(self.order), 0, point, k, skip, heap)
+        return sorted((-neg, loc_id) for neg, loc_id in heap)
+
+    def _search(self, lo, hi, axis, point, k, skip, heap):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        node = self.order[mid]
+        xs, ys, zs = self.coords
+        loc_id = self.ids[node]
+
+        if loc_id not in skip:
+            dx = xs[node] - point[0]
+            dy = ys[node] - point[1]
+            dz = zs[node] - point[2]
+            dist_sq = dx * dx + dy * dy + dz * dz
+            if len(heap) < k:
+                heapq.heappush(heap, (-dist_sq, loc_id))
+            elif dist_sq < -heap[0][0]:
+                heapq.heapreplace(heap, (-dist_sq, loc_id))
+
+        diff = point[axis] - self.coords[axis][node]
+        next_axis = (axis + 1) % 3
+        if diff < 0:
+            near, far = (lo, mid), (mid + 1, hi)
+        else:
+            near, far = (mid + 1, hi), (lo, mid)
+
+        self._search(near[0], near[1], next_axis, point, k, skip, heap)
+        if len(heap) < k or diff * diff < -heap[0][0]:
+            self._search(far[0], far[1], next_axis, point, k, skip, heap)
+
+
+class DoctorLocationIndex:
+    """Thread-safe snapshot of active doctor locations with incremental updates"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tree = None
+        self._built_at = 0
+        self._rebuilding = False
+        # Every write gets a sequence number so a rebuild keeps writes made while it ran
+        self._seq = 0
+        self._pending = {}   # location_id -> (seq, xyz)
+        self._removed = {}   # location_id -> seq
+
+    def rebuild(self):
+        """Load every searchable location from Postgres into a new tree and swap it in"""
+        with self._lock:
+            started = self._seq
+        rows = DoctorLocation.objects.filter(
+            is_active=True,
+            doctor__user__is_active=True
+        ).values_list('id', 'latitude', 'longitude')
+
+        ids = []
+        xs, ys, zs = array('d'), array('d'), array('d')
+        for loc_id, lat, lng in rows.iterator(chunk_size=5000):
+            x, y, z = to_xyz(lat, lng)
+            ids.append(loc_id)
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+
+        tree = KDTree(ids, xs, ys, zs)
+        with self._lock:
+            self._tree = tree
+            self._built_at = time.monotonic()
+            # Writes that landed after the rows were read may be missing from the tree
+            self._pending = {loc_id: item for loc_id, item in self._pending.items() if item[0] > started}
+            self._removed = {loc_id: seq for loc_id, seq in self._removed.items() if seq > started}
+        logger.info(f"Doctor location index rebuilt with {len(ids)} locations")
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error(f"Doctor location index rebuild failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            close_old_connections()
+
+    def refresh(self):
+        """Start a background rebuild unless one is already running"""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(
+            target=self._rebuild_in_background, name='doctor-location-index', daemon=True
+        ).start()
+
+    def _is_stale(self):
+        max_age = getattr(settings, 'SPATIAL_INDEX_MAX_AGE', 300)
+        if self._tree is None or time.monotonic() - self._built_at > max_age:
+            return True
+        delta = len(self._pending) + len(self._removed)
+        return delta > max(MIN_REBUILD_DELTA, len(self._tree) * REBUILD_FRACTION)
+
+    def upsert(self, location):
+        """Track a created/updated location, or drop it if no longer searchable"""
+        searchable = location.is_active and location.doctor.user and location.doctor.user.is_active
+        if not searchable:
+            self.remove(location.id)
+            return
+        with self._lock:
+            # The snapshot copy (if any) is stale; the pending copy wins
+            self._seq += 1
+            self._removed[location.id] = self._seq
+            self._pending[location.id] = (self._seq, to_xyz(location.latitude, location.longitude))
+
+    def remove(self, location_id):
+        with self._lock:
+            self._seq += 1
+            self._removed[location_id] = self._seq
+            self._pending.pop(location_id, None)
+
+    def nearest(self, lat, lng, k):
+        """Return up to k (location_id, distance_km) pairs, nearest first.
+
+        Returns None while the first snapshot is still being built.
+        """
+        point = to_xyz(lat, lng)
+        with self._lock:
+            if self._is_stale():
+                self.refresh()
+            if self._tree is None:
+                return None
+            tree, pending, removed = self._tree, dict(self._pending), frozenset(self._removed)
+
+        candidates = tree.nearest(point, k, removed)
+        for loc_id, (_, (x, y, z)) in pending.items():
+            dx, dy, dz = x - point[0], y - point[1], z - point[2]
+            candidates.append((dx * dx + dy * dy + dz * dz, loc_id))
+        candidates.sort()
+        return [(loc_id, chord_to_km(chord_sq)) for chord_sq, loc_id in candidates[:k]]
+
+
+doctor_location_index = DoctorLocationIndex()
+
+
+def sync_location(location):
+    """Push a saved location into the index once the surrounding transaction commits"""
+    transaction.on_commit(lambda: doctor_location_index.upsert(location))
+
+
+def _sync_doctor_user_locations(user_id):
+    try:
+        for location in DoctorLocation.objects.filter(doctor__user_id=user_id).select_related('doctor__user'):
+            doctor_location_index.upsert(location)
+    except Exception as e:
+        logger.error(f"Failed to sync locations of doctor user {user_id}: {str(e)}")
+
+
+def sync_doctor_user_locations(user):
+    """Evict (or restore) a doctor's locations when their account is (re)activated"""
+    transaction.on_commit(lambda: _sync_doctor_user_locations(user.id))
@@ -0,0 +1,252 @@
+"""In-process prefix index for search-box autocomplete.
+
+Holds approved doctors' names, clinic names and the specialization labels as a
+sorted array of (token, entry) pairs, so a prefix lookup is one bisect plus a
+short forward scan. Every word of a label gets its own token ("smi" finds
+"John Smith"). Profile writes in this process update the array in place after
+commit; each worker also rebuilds after SUGGEST_INDEX_MAX_AGE seconds to pick
+up writes made elsewhere.
+
+Lookups never query the database: a stale index starts one background thread
+that reads the rows and swaps the new array in. Until a worker's first build
+finishes it only suggests specializations, which need no query.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from doctor.models import Doctor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+# Tokens scanned per lookup; bounds the cost of one-letter prefixes
+MAX_SCAN = 500
+KIND_ORDER = {'specialization': 0, 'doctor': 1, 'clinic': 2}
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def label_tokens(label):
+    """The normalized label from each word start: 'john smith' -> ['john smith', 'smith']"""
+    words = normalize(label).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def _is_listed(doctor):
+    user = doctor.user
+    return bool(
+        user and user.is_active and user.role == 'doctor'
+        and doctor.verification_status == 'approved'
+    )
+
+
+def _specialization_entries():
+    return {
+        ('specialization', value): {
+            'type': 'specialization',
+            'label': label,
+            'match': label,
+            'value': value,
+        }
+        for value, label in Doctor.SPECIALIZATION_CHOICES
+    }
+
+
+def _sorted_keys(entries):
+    return sorted((token, key) for key, entry in entries.items() for token in label_tokens(entry['match']))
+
+
+def _doctor_entries(doctor):
+    """Suggestion payloads for one doctor, keyed by (kind, user_id)"""
+    user = doctor.user
+    user_id = str(user.id)
+    entries = {}
+    name = f"{user.first_name or ''} {user.last_name or ''}".strip()
+    if name:
+        entries[('doctor', user_id)] = {
+            'type': 'doctor',
+            'label': f"Dr. {name}",
+            'match': name,
+            'doctor_id': user_id,
+            'specialization': doctor.specialization,
+        }
+    if doctor.clinic_name and doctor.clinic_name.strip():
+        entries[('clinic', user_id)] = {
+            'type': 'clinic',
+            'label': doctor.clinic_name.strip(),
+            'match': doctor.clinic_name,
+            'doctor_id': user_id,
+            'specialization': doctor.specialization,
+        }
+    return entries
+
+
+class DoctorSuggestIndex:
+    """Thread-safe sorted-array prefix index with in-place updates"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = _specialization_entries()
+        self._keys = _sorted_keys(self._entries)
+        self._built_at = None
+        self._rebuilding = False
+        # user_id -> sequence number of its last in-place update, replayed over a rebuild
+        self._seq = 0
+        self._touched = {}
+
+    def _add(self, key, entry):
+        self._entries[key] = entry
+        for token in label_tokens(entry['match']):
+            insort(self._keys, (token, key))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for token in label_tokens(entry['match']):
+            position = bisect_left(self._keys, (token, key))
+            if position < len(self._keys) and self._keys[position] == (token, key):
+                del self._keys[position]
+
+    def rebuild(self):
+        """Load every listed doctor from Postgres into a fresh array and swap it in"""
+        with self._lock:
+            started = self._seq
+        entries = _specialization_entries()
+
+        doctors = Doctor.objects.filter(
+            user__role='doctor',
+            user__is_active=True,
+            verification_status='approved'
+        ).select_related('user').only(
+            'specialization', 'clinic_name', 'verification_status',
+            'user__id', 'user__first_name', 'user__last_name', 'user__is_active', 'user__role'
+        )
+        for doctor in doctors.iterator(chunk_size=2000):
+            entries.update(_doctor_entries(doctor))
+
+        keys = _sorted_keys(entries)
+        with self._lock:
+            previous = self._entries
+            replay = [user_id for user_id, seq in self._touched.items() if seq > started]
+            self._entries = entries
+            self._keys = keys
+            # Profile writes applied while the rows were being read win over the snapshot
+            for user_id in replay:
+                for key in (('doctor', user_id), ('clinic', user_id)):
+                    self._discard(key)
+                    if key in previous:
+                        self._add(key, previous[key])
+            self._touched = {}
+            self._built_at = time.monotonic()
+        logger.info(f"Doctor suggestion index rebuilt with {len(entries)} entries")
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error(f"Doctor suggestion index rebuild failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            close_old_connections()
+
+    def refresh(self):
+        """Start a background rebuild unless one is already running"""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(
+            target=self._rebuild_in_background, name='doctor-suggest-index', daemon=True
+        ).start()
+
+    def _is_stale(self):
+        max_age = getattr(settings, 'SUGGEST_INDEX_MAX_AGE', 300)
+        return self._built_at is None or time.monotonic() - self._built_at > max_age
+
+    def upsert_doctor(self, doctor):
+        """Replace a doctor's name/clinic entries, or drop them if no longer listed"""
+        user_id = str(doctor.user_id) if doctor.user_id else None
+        if not user_id:
+            return
+        with self._lock:
+            self._seq += 1
+            self._touched[user_id] = self._seq
+            self._discard(('doctor', user_id))
+            self._discard(('clinic', user_id))
+            if _is_listed(doctor):
+                for key, entry in _doctor_entries(doctor).items():
+                    self._add(key, entry)
+
+    def remove_doctor(self, user_id):
+        with self._lock:
+            self._seq += 1
+            self._touched[str(user_id)] = self._seq
+            self._discard(('doctor', str(user_id)))
+            self._discard(('clinic', str(user_id)))
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        """Up to `limit` suggestion dicts whose label has a word starting with `prefix`"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            if self._is_stale():
+                self.refresh()
+            keys, entries = self._keys, self._entries
+            position = bisect_left(keys, (prefix,))
+            seen = {}
+            for token, key in keys[position:position + MAX_SCAN]:
+                if not token.startswith(prefix):
+                    break
+                # Whole-label matches rank ahead of later-word matches
+                whole = normalize(entries[key]['match']).startswith(prefix)
+                if key not in seen or whole:
+                    seen[key] = whole
+            matches = [(key, whole, entries[key]) for key, whole in seen.items()]
+
+        matches.sort(key=lambda item: (not item[1], KIND_ORDER[item[0][0]], item[2]['label'].lower()))
+        return [
+            {field: value for field, value in entry.items() if field != 'match'}
+            for _, _, entry in matches[:limit]
+        ]
+
+
+doctor_suggest_index = DoctorSuggestIndex()
+
+
+def _safe(action, *args):
+    try:
+        action(*args)
+    except Exception as e:
+        logger.error(f"Failed to update doctor suggestion index: {str(e)}")
+
+
+def sync_doctor_suggestions(doctor):
+    """Push a saved doctor profile into the index once the transaction commits"""
+    transaction.on_commit(lambda: _safe(doctor_suggest_index.upsert_doctor, doctor))
+
+
+def _upsert_for_user(user_id):
+    doctor = Doctor.objects.select_related('user').filter(user_id=user_id).first()
+    if doctor:
+        doctor_suggest_index.upsert_doctor(doctor)
+
+
+def sync_doctor_user_suggestions(user):
+    """Name or activation changes on a doctor's User row"""
+    transaction.on_commit(lambda: _safe(_upsert_for_user, user.id))
+
+
+def drop_doctor_suggestions(user_id):
+    if user_id:
+        transaction.on_commit(lambda: _safe(doctor_suggest_index.remove_doctor, user_id))
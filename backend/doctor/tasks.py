@@ -91,4 +91,37 @@ def send_general_email_task(subject, message, recipient_list, from_email=None):
             
     except Exception as e:
         logger.error(f"Failed to send email: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+@shared_task
+def refresh_next_slot(doctor_id):
+    """Recompute one doctor's next-available slot after a booking or schedule change"""
+    from doctor.availability import _safe_recompute
+
+    _safe_recompute(doctor_id)
+
+
+@shared_task
+def release_expired_bookings():
+    """Give back the places of pending requests whose slot hold has run out"""
+    from doctor.booking import release_expired_bookings as release
+
+    return release()
+
+
+@shared_task
+def refresh_stale_next_slots():
+    """Recompute next-available slots whose stored slot time has already passed,
+    and create the rows of doctors that have none yet"""
+    from doctor.availability import doctors_missing_next_slot, recompute_next_slot, stale_next_slots
+
+    refreshed = 0
+    for doctor_id in stale_next_slots().values_list('doctor_id', flat=True).iterator():
+        recompute_next_slot(doctor_id)
+        refreshed += 1
+    created = 0
+    for doctor_id in doctors_missing_next_slot().values_list('id', flat=True).iterator():
+        recompute_next_slot(doctor_id)
+        created += 1
+    logger.info(f"Refreshed {refreshed} stale and created {created} missing next-available slots")
+    return refreshed + created
@@ -0,0 +1,42 @@
+"""Model factories shared by the doctor and patients test suites."""
+import uuid
+from datetime import time, timedelta
+
+from django.utils import timezone
+
+from doctor.models import Appointment, Doctor, Schedules, Service, User
+
+
+def make_doctor():
+    user = User.objects.create(
+        email=f'doctor-{uuid.uuid4().hex[:8]}@example.com', first_name='Test', role='doctor', is_active=True
+    )
+    doctor = Doctor.objects.create(user=user, verification_status='approved', consultation_fee=100)
+    service = Service.objects.create(
+        doctor=doctor, service_name='basic', service_mode='online', service_fee=200, description='Consultation'
+    )
+    return doctor, service
+
+
+def make_patient():
+    user = User.objects.create(
+        email=f'patient-{uuid.uuid4().hex[:8]}@example.com', first_name='Test', role='patient', is_active=True
+    )
+    return user.patient_profile
+
+
+def make_schedule(doctor, service, days_ahead=1, start=time(9, 0), end=time(12, 0), **extra):
+    schedule = Schedules(
+        doctor=doctor, service=service, mode='online',
+        date=timezone.localdate() + timedelta(days=days_ahead),
+        start_time=start, end_time=end, slot_duration=timedelta(minutes=30), **extra
+    )
+    schedule.save()
+    return schedule
+
+
+def book(patient, schedule, slot_time, status='pending'):
+    return Appointment.objects.create(
+        patient=patient, doctor=schedule.doctor, schedule=schedule, service=schedule.service,
+        appointment_date=schedule.date, slot_time=slot_time, mode=schedule.mode, status=status
+    )
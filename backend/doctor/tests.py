@@ -1,3 +1,534 @@
-from django.test import TestCase
+import random
+import threading
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from doctor.models import (
+    Appointment, DoctorRatingSummary, DoctorReview, DoctorSubscription, Schedules, ScheduleSlot,
+    ScheduleTemplate, SlotUnavailable, SubscriptionPlan
+)
+from doctor.booking import book_appointment, hold_place_for_payment, release_expired_bookings
+from doctor.pagination import decode_cursor, encode_cursor
+from doctor.schedule_overlap import DayIntervals
+from doctor.schedule_templates import expand_template
+from doctor.test_utils import book, make_doctor, make_patient, make_schedule
+from doctor.views import BulkAppointmentStatusView, RescheduleAppointmentView, ScheduleView
+
+
+def brute_force_conflicts(stored, start, end):
+    return sorted(item for item in stored if item[0] < end and item[1] > start)
+
+
+class DayIntervalsTests(SimpleTestCase):
+    def test_touching_intervals_do_not_conflict(self):
+        intervals = DayIntervals([(9, 10, 'a')])
+        self.assertEqual(intervals.conflicts(10, 11), [])
+        self.assertEqual(intervals.conflicts(8, 9), [])
+        self.assertEqual(intervals.conflicts(9, 11), [(9, 10, 'a')])
+
+    def test_rejected_add_stores_nothing(self):
+        intervals = DayIntervals([(9, 12, 'a')])
+        self.assertEqual(intervals.add(11, 13, 'b'), [(9, 12, 'a')])
+        self.assertEqual(len(intervals), 1)
+        self.assertEqual(intervals.conflicts(12, 13), [])
+
+    def test_randomized_against_brute_force(self):
+        rng = random.Random(20240611)
+        for round_number in range(500):
+            stored = [
+                (start, start + rng.randint(1, 12), key)
+                for key, start in enumerate(rng.randint(0, 48) for _ in range(rng.randint(0, 20)))
+            ]
+            intervals = DayIntervals(stored)
+            for key in range(100, 110):
+                start = rng.randint(0, 52)
+                end = start + rng.randint(1, 12)
+                expected = brute_force_conflicts(stored, start, end)
+                merge = rng.random() < 0.3
+
+                with self.subTest(round=round_number, start=start, end=end, merge=merge):
+                    self.assertEqual(sorted(intervals.conflicts(start, end)), expected)
+                    self.assertEqual(sorted(intervals.add(start, end, key, merge=merge)), expected)
+                    if merge or not expected:
+                        stored.append((start, end, key))
+                    self.assertEqual(len(intervals), len(stored))
+
+
+class ScheduleListQueryTests(TestCase):
+    """ScheduleView.get: schedules with annotated appointment stats, then one services query"""
+
+    QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.service = make_doctor()
+        cls.patient = make_patient()
+
+    def list_schedules(self):
+        request = APIRequestFactory().get('/doctor/scheduleView/')
+        force_authenticate(request, user=self.doctor.user)
+        return ScheduleView.as_view()(request)
+
+    def test_single_schedule(self):
+        schedule = make_schedule(self.doctor, self.service)
+        book(self.patient, schedule, time(9, 0))
+
+        with self.assertNumQueries(self.QUERIES):
+            response = self.list_schedules()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_query_count_does_not_grow_with_schedules(self):
+        for days_ahead in range(1, 26):
+            schedule = make_schedule(self.doctor, self.service, days_ahead=days_ahead)
+            book(self.patient, schedule, time(9, 0))
+            book(self.patient, schedule, time(10, 0), status='confirmed')
+
+        with self.assertNumQueries(self.QUERIES):
+            response = self.list_schedules()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 25)
+
+
+class CursorTests(SimpleTestCase):
+    def test_cursor_keeps_microseconds(self):
+        created_at = datetime(2026, 3, 1, 9, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        token = encode_cursor('admin-appointments', [created_at, time(9, 0, 0, 250), 7])
+        created, slot, pk = decode_cursor(token, 'admin-appointments')
+        self.assertEqual(datetime.fromisoformat(created), created_at)
+        self.assertEqual(time.fromisoformat(slot), time(9, 0, 0, 250))
+        self.assertEqual(pk, 7)
+
+
+class BulkAppointmentStatusTests(TestCase):
+    """BulkAppointmentStatusView: per-item results and slot counters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.service = make_doctor()
+        cls.patients = [make_patient() for _ in range(3)]
+
+    def setUp(self):
+        self.schedule = make_schedule(self.doctor, self.service, max_patients_per_slot=2)
+
+    def post(self, appointment_ids, new_status):
+        request = APIRequestFactory().post(
+            '/doctor/appointments/bulk-status/', {'appointment_ids': appointment_ids, 'status': new_status}, format='json'
+        )
+        force_authenticate(request, user=self.doctor.user)
+        response = BulkAppointmentStatusView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return {str(item['id']): item for item in response.data['results']}
+
+    def slot_booked(self, slot_time):
+        return ScheduleSlot.containing(self.schedule.id, slot_time).get().booked
+
+    def test_confirm_reports_each_item(self):
+        first = book(self.patients[0], self.schedule, time(9, 0))
+        same_slot = book(self.patients[1], self.schedule, time(9, 0))
+        confirmed = book(self.patients[0], self.schedule, time(9, 30), status='confirmed')
+        behind_confirmed = book(self.patients[1], self.schedule, time(9, 30))
+
+        results = self.post([first.id, same_slot.id, confirmed.id, behind_confirmed.id, 999999], 'confirmed')
+
+        self.assertEqual(results[str(first.id)]['result'], 'updated')
+        self.assertEqual(results[str(same_slot.id)]['result'], 'conflict')
+        self.assertEqual(results[str(same_slot.id)]['conflicting_appointment'], first.id)
+        self.assertEqual(results[str(confirmed.id)]['result'], 'invalid_transition')
+        self.assertEqual(results[str(behind_confirmed.id)]['result'], 'conflict')
+        self.assertEqual(results[str(behind_confirmed.id)]['conflicting_appointment'], confirmed.id)
+        self.assertEqual(results['999999']['result'], 'not_found')
+        self.assertEqual(
+            dict(Appointment.objects.filter(schedule=self.schedule).values_list('id', 'status')),
+            {first.id: 'confirmed', same_slot.id: 'pending', confirmed.id: 'confirmed', behind_confirmed.id: 'pending'}
+        )
+
+    def test_confirm_reserves_expired_request(self):
+        expired = book(self.patients[0], self.schedule, time(10, 0))
+        Appointment.objects.filter(pk=expired.pk).update(slot_held_until=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(release_expired_bookings(), 1)
+        self.assertEqual(self.slot_booked(time(10, 0)), 0)
+
+        results = self.post([expired.id], 'confirmed')
+
+        self.assertEqual(results[str(expired.id)]['result'], 'updated')
+        confirmed = Appointment.objects.get(pk=expired.id)
+        self.assertTrue(confirmed.is_slot_booked)
+        self.assertIsNone(confirmed.slot_held_until)
+        self.assertEqual(self.slot_booked(time(10, 0)), 1)
+        self.assertEqual(Schedules.objects.get(pk=self.schedule.id).booked_slots, 1)
+
+    def test_cancel_releases_slot_counters(self):
+        appointments = [book(patient, self.schedule, time(11, 0)) for patient in self.patients[:2]]
+        self.assertEqual(self.slot_booked(time(11, 0)), 2)
+        self.assertEqual(Schedules.objects.get(pk=self.schedule.id).booked_slots, 2)
+
+        results = self.post([appointment.id for appointment in appointments], 'cancelled')
+
+        self.assertEqual({item['result'] for item in results.values()}, {'updated'})
+        self.assertEqual(self.slot_booked(time(11, 0)), 0)
+        self.assertEqual(Schedules.objects.get(pk=self.schedule.id).booked_slots, 0)
+        self.assertFalse(Appointment.objects.filter(schedule=self.schedule, is_slot_booked=True).exists())
+
+
+class RescheduleAppointmentTests(TestCase):
+    """RescheduleAppointmentView moves the booking, and its slot counters, to the target schedule"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.service = make_doctor()
+        cls.patients = [make_patient() for _ in range(2)]
+
+    def setUp(self):
+        self.source = make_schedule(self.doctor, self.service, days_ahead=1)
+        self.target = make_schedule(self.doctor, self.service, days_ahead=2)
+
+    def reschedule(self, appointment, schedule, slot_time):
+        request = APIRequestFactory().post(
+            f'/doctor/appointments/{appointment.id}/reschedule/',
+            {'appointment_date': schedule.date.isoformat(), 'slot_time': slot_time}, format='json'
+        )
+        force_authenticate(request, user=self.doctor.user)
+        return RescheduleAppointmentView.as_view()(request, appointment_id=appointment.id)
+
+    def slot_booked(self, schedule, slot_time):
+        return ScheduleSlot.containing(schedule.id, slot_time).get().booked
+
+    def test_moves_to_target_schedule(self):
+        appointment = book(self.patients[0], self.source, time(9, 0), status='confirmed')
+
+        response = self.reschedule(appointment, self.target, '10:00')
+
+        self.assertEqual(response.status_code, 200)
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        self.assertEqual((appointment.schedule_id, appointment.slot_time), (self.target.id, time(10, 0)))
+        self.assertEqual(self.slot_booked(self.source, time(9, 0)), 0)
+        self.assertEqual(self.slot_booked(self.target, time(10, 0)), 1)
+        self.assertEqual(Schedules.objects.get(pk=self.source.id).booked_slots, 0)
+        self.assertEqual(Schedules.objects.get(pk=self.target.id).booked_slots, 1)
+
+    def test_full_slot_is_a_conflict(self):
+        book(self.patients[1], self.target, time(10, 0), status='confirmed')
+        appointment = book(self.patients[0], self.source, time(9, 0), status='confirmed')
+
+        response = self.reschedule(appointment, self.target, '10:00')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Appointment.objects.get(pk=appointment.pk).schedule_id, self.source.id)
+        self.assertEqual(self.slot_booked(self.source, time(9, 0)), 1)
+
+    def test_shared_slot_has_room(self):
+        self.target.max_patients_per_slot = 2
+        self.target.save()
+        book(self.patients[1], self.target, time(10, 0), status='confirmed')
+        appointment = book(self.patients[0], self.source, time(9, 0), status='confirmed')
+
+        response = self.reschedule(appointment, self.target, '10:00')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.slot_booked(self.target, time(10, 0)), 2)
+
+    def test_time_outside_schedules_is_a_conflict(self):
+        appointment = book(self.patients[0], self.source, time(9, 0), status='confirmed')
+
+        response = self.reschedule(appointment, self.target, '15:00')
+
+        self.assertEqual(response.status_code, 409)
+
+
+class SlotHoldExpiryTests(TestCase):
+    """A pending request's place is given back only by release_expired_bookings, and only while unconfirmed and unpaid"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.service = make_doctor()
+        cls.patient = make_patient()
+
+    def setUp(self):
+        self.schedule = make_schedule(self.doctor, self.service)
+        self.appointment = book_appointment({
+            'patient': self.patient, 'doctor': self.doctor, 'schedule': self.schedule, 'service': self.service,
+            'appointment_date': self.schedule.date, 'slot_time': time(9, 0), 'mode': 'online',
+        })
+
+    def release_after_hold(self):
+        return release_expired_bookings(now=timezone.now() + timedelta(hours=1))
+
+    def slot_booked(self):
+        return ScheduleSlot.containing(self.schedule.id, time(9, 0)).get().booked
+
+    def test_expired_unpaid_hold_is_released(self):
+        self.assertIsNotNone(self.appointment.slot_held_until)
+
+        self.assertEqual(self.release_after_hold(), 1)
+
+        appointment = Appointment.objects.get(pk=self.appointment.pk)
+        self.assertFalse(appointment.is_slot_booked)
+        self.assertEqual(self.slot_booked(), 0)
+        # Editing the still-pending request does not take the place back
+        appointment.notes = 'Edited'
+        appointment.save()
+        self.assertEqual(self.slot_booked(), 0)
+
+    def test_confirmed_then_edited_keeps_slot(self):
+        self.appointment.status = 'confirmed'
+        self.appointment.save()
+        self.assertIsNone(Appointment.objects.get(pk=self.appointment.pk).slot_held_until)
+
+        # AppointmentSerializer.update puts every edited appointment back to pending
+        appointment = Appointment.objects.get(pk=self.appointment.pk)
+        appointment.status = 'pending'
+        appointment.notes = 'Edited'
+        appointment.save()
+
+        self.assertEqual(self.release_after_hold(), 0)
+        self.assertTrue(Appointment.objects.get(pk=self.appointment.pk).is_slot_booked)
+        self.assertEqual(self.slot_booked(), 1)
+
+    def test_paid_request_keeps_slot(self):
+        self.appointment.is_paid = True
+        self.appointment.save()
+
+        self.assertEqual(self.release_after_hold(), 0)
+        self.assertIsNone(Appointment.objects.get(pk=self.appointment.pk).slot_held_until)
+        self.assertEqual(self.slot_booked(), 1)
+
+    def test_payment_retakes_released_place(self):
+        self.release_after_hold()
+
+        appointment = hold_place_for_payment(self.appointment)
+
+        self.assertTrue(appointment.is_slot_booked)
+        self.assertGreater(appointment.slot_held_until, timezone.now())
+        self.assertEqual(self.slot_booked(), 1)
+        self.assertEqual(Schedules.objects.get(pk=self.schedule.id).booked_slots, 1)
+
+    def test_payment_rejected_once_place_is_resold(self):
+        self.release_after_hold()
+        book(make_patient(), self.schedule, time(9, 0))
+
+        with self.assertRaises(SlotUnavailable):
+            hold_place_for_payment(self.appointment)
+        self.assertFalse(Appointment.objects.get(pk=self.appointment.pk).is_slot_booked)
+        self.assertEqual(self.slot_booked(), 1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBookingTests(TransactionTestCase):
+    """book_appointment from many threads at once: the slot row lock keeps capacity exact"""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.doctor, self.service = make_doctor()
+        self.schedule = make_schedule(self.doctor, self.service, max_patients_per_slot=3)
+        self.slot_time = self.schedule.start_time
+
+    def book_concurrently(self, patients):
+        outcomes = Counter()
+        lock = threading.Lock()
+        start = threading.Barrier(len(patients))
+
+        def worker(patient):
+            try:
+                start.wait()
+                book_appointment({
+                    'patient': patient, 'doctor': self.doctor, 'schedule': self.schedule,
+                    'service': self.service, 'appointment_date': self.schedule.date,
+                    'slot_time': self.slot_time, 'mode': 'online',
+                })
+                outcome = 'booked'
+            except SlotUnavailable:
+                outcome = 'rejected'
+            except Exception as e:
+                outcome = f'error: {type(e).__name__}'
+            finally:
+                connection.close()
+            with lock:
+                outcomes[outcome] += 1
+
+        threads = [threading.Thread(target=worker, args=(patient,)) for patient in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def active_bookings(self):
+        return Appointment.objects.filter(schedule=self.schedule, slot_time=self.slot_time, is_slot_booked=True)
+
+    def test_capacity_is_never_exceeded(self):
+        outcomes = self.book_concurrently([make_patient() for _ in range(self.THREADS)])
+
+        self.assertEqual(outcomes, Counter(booked=3, rejected=self.THREADS - 3))
+        self.assertEqual(self.active_bookings().count(), 3)
+        self.assertEqual(ScheduleSlot.containing(self.schedule.id, self.slot_time).get().booked, 3)
+        self.assertEqual(Schedules.objects.get(pk=self.schedule.id).booked_slots, 3)
+
+    def test_patient_books_a_slot_once(self):
+        patient = make_patient()
+        outcomes = self.book_concurrently([patient] * self.THREADS)
+
+        self.assertEqual(outcomes, Counter(booked=1, rejected=self.THREADS - 1))
+        self.assertEqual(self.active_bookings().filter(patient=patient).count(), 1)
+        self.assertEqual(ScheduleSlot.containing(self.schedule.id, self.slot_time).get().booked, 1)
+
+
+class ExpandTemplateTests(TestCase):
+    """expand_template: overlap, plan quotas and all-or-nothing, checked without Schedules.save()"""
+
+    def setUp(self):
+        self.doctor, self.service = make_doctor()
+        today = timezone.localdate()
+        # A week inside one month, two months out, so monthly quotas see only these dates
+        self.first = (today.replace(day=1) + timedelta(days=62)).replace(day=1)
+        self.last = self.first + timedelta(days=6)
+
+    def subscribe(self, per_day=5, per_month=100):
+        plan = SubscriptionPlan.objects.create(
+            name='premium', price=100, max_schedules_per_day=per_day, max_schedules_per_month=per_month
+        )
+        DoctorSubscription.objects.create(
+            doctor=self.doctor, plan=plan, status='active', end_date=timezone.now() + timedelta(days=365)
+        )
+
+    def make_template(self):
+        return ScheduleTemplate.objects.create(
+            doctor=self.doctor, service=self.service, mode='online', weekdays=list(range(7)),
+            start_time=time(9, 0), end_time=time(10, 0), slot_duration=timedelta(minutes=30),
+            max_patients_per_slot=2
+        )
+
+    def existing(self, day, start, end):
+        days_ahead = (day - timezone.localdate()).days
+        return make_schedule(self.doctor, self.service, days_ahead=days_ahead, start=start, end=end)
+
+    def generated(self):
+        return Schedules.objects.filter(doctor=self.doctor, start_time=time(9, 0), end_time=time(10, 0))
+
+    def test_skips_dates_overlapping_existing_schedules(self):
+        self.subscribe()
+        clash = self.first + timedelta(days=1)
+        self.existing(clash, time(9, 30), time(12, 0))
+
+        created, conflicts, over_limit = expand_template(self.make_template(), self.first, self.last)
+
+        self.assertEqual(conflicts, [clash])
+        self.assertEqual(over_limit, [])
+        self.assertEqual(len(created), 6)
+        self.assertNotIn(clash, set(self.generated().values_list('date', flat=True)))
+
+    def test_daily_limit_counts_existing_schedules(self):
+        self.subscribe(per_day=1)
+        busy = self.first + timedelta(days=2)
+        self.existing(busy, time(14, 0), time(15, 0))
+
+        created, conflicts, over_limit = expand_template(self.make_template(), self.first, self.last)
+
+        self.assertEqual((conflicts, over_limit), ([], [busy]))
+        self.assertEqual(len(created), 6)
+
+    def test_monthly_limit_stops_generation(self):
+        self.subscribe(per_month=3)
+
+        created, conflicts, over_limit = expand_template(self.make_template(), self.first, self.last)
+
+        self.assertEqual([schedule.date for schedule in created], [self.first + timedelta(days=i) for i in range(3)])
+        self.assertEqual(over_limit, [self.first + timedelta(days=i) for i in range(3, 7)])
+        self.assertEqual(self.generated().count(), 3)
+
+    def test_all_or_nothing_writes_nothing(self):
+        self.subscribe()
+        self.existing(self.first + timedelta(days=3), time(9, 0), time(9, 30))
+
+        created, conflicts, over_limit = expand_template(
+            self.make_template(), self.first, self.last, allow_partial=False
+        )
+
+        self.assertEqual(created, [])
+        self.assertEqual(conflicts, [self.first + timedelta(days=3)])
+        self.assertFalse(self.generated().exists())
+        self.assertFalse(ScheduleSlot.objects.filter(schedule__in=self.generated()).exists())
+
+    def test_slot_rows_created_per_schedule(self):
+        self.subscribe()
+
+        created, _, _ = expand_template(self.make_template(), self.first, self.last)
+
+        self.assertEqual(len(created), 7)
+        for schedule in self.generated():
+            self.assertEqual(schedule.total_slots, 2)
+            self.assertEqual(
+                list(schedule.slots.values_list('start_time', 'end_time', 'capacity', 'booked')),
+                [(time(9, 0), time(9, 30), 2, 0), (time(9, 30), time(10, 0), 2, 0)]
+            )
+
+
+class DoctorRatingSummaryTests(TestCase):
+    """DoctorReview.save/delete keep DoctorRatingSummary equal to a recount"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, _ = make_doctor()
+        cls.patient = make_patient()
+
+    def review(self, rating=4, status='pending'):
+        return DoctorReview.objects.create(
+            patient=self.patient, doctor=self.doctor, rating=rating, description='Good', status=status
+        )
+
+    def summary(self):
+        return DoctorRatingSummary.objects.get(doctor=self.doctor)
+
+    def assertSummary(self, approved=0, total=0, pending=0, rejected=0, **stars):
+        summary = self.summary()
+        self.assertEqual(
+            (summary.approved_count, summary.rating_total, summary.pending_count, summary.rejected_count),
+            (approved, total, pending, rejected)
+        )
+        self.assertEqual(summary.histogram, {star: stars.get(f'star_{star}', 0) for star in range(1, 6)})
+
+    def test_approve_moves_pending_review(self):
+        review = self.review(rating=4)
+        self.assertSummary(pending=1)
+
+        review.status = 'approved'
+        review.save()
+        self.assertSummary(approved=1, total=4, star_4=1)
+        self.assertIsNotNone(DoctorReview.objects.get(pk=review.pk).reviewed_at)
+
+    def test_reject_after_approve(self):
+        review = self.review(rating=5, status='approved')
+        self.assertSummary(approved=1, total=5, star_5=1)
+
+        review.status = 'rejected'
+        review.save()
+        self.assertSummary(rejected=1)
+
+    def test_delete_uses_stored_state(self):
+        review = self.review(rating=3, status='approved')
+        # A stale instance must not decide which bucket the stored review leaves
+        stale = DoctorReview.objects.get(pk=review.pk)
+        review.status = 'rejected'
+        review.save()
+
+        stale.delete()
+        self.assertSummary()
+
+    def test_missing_summary_is_rebuilt_not_decremented(self):
+        reviews = [self.review(rating=2, status='approved'), self.review(rating=5)]
+        # Reviews written before the summary existed
+        DoctorRatingSummary.objects.filter(doctor=self.doctor).delete()
+
+        reviews[0].status = 'rejected'
+        reviews[0].save()
+        self.assertSummary(pending=1, rejected=1)
+
+        DoctorRatingSummary.objects.filter(doctor=self.doctor).delete()
+        reviews[1].delete()
+        self.assertSummary(rejected=1)
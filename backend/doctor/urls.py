@@ -23,6 +23,9 @@ urlpatterns = [
     path('service/',ServiceView.as_view(),name='doctor-service'),
     path('scheduleView/',ScheduleView.as_view(),name='doctor-scheduleView'),
     path('scheduleView/<int:schedule_id>/', ScheduleView.as_view(), name='doctor-scheduleView-detail'),
+    path('schedule-templates/', views.ScheduleTemplateView.as_view(), name='doctor-schedule-templates'),
+    path('schedule-templates/<int:template_id>/', views.ScheduleTemplateView.as_view(), name='doctor-schedule-template-detail'),
+    path('schedule-templates/<int:template_id>/expand/', views.ScheduleTemplateExpandView.as_view(), name='doctor-schedule-template-expand'),
     
     path('location/create/', views.DoctorLocationCreateView.as_view(), name='doctor-location-create'),
     path('location/list/', views.DoctorLocationListView.as_view(), name='doctor-location-list'),
@@ -35,6 +38,7 @@ urlpatterns = [
     path('appointments/pending/', views.PendingAppointmentsView.as_view(), name='pending_appointments'),
     path('appointments/today/', views.TodayAppointmentsView.as_view(), name='today_appointments'),
     path('appointments/upcoming/', views.UpcomingAppointmentsView.as_view(), name='upcoming_appointments'),
+    path('appointments/bulk-status/', views.BulkAppointmentStatusView.as_view(), name='bulk_appointment_status'),
     path('appointments/<int:appointment_id>/', views.AppointmentDetailView.as_view(), name='appointment_detail'),
     path('appointments/<int:appointment_id>/handle/', views.HandleAppointmentRequestView.as_view(), name='handle_appointment_request'),
     path('appointments/<int:appointment_id>/status/', views.UpdateAppointmentStatusView.as_view(), name='update_appointment_status'),
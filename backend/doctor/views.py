@@ -8,6 +8,7 @@ import hashlib
 from django.shortcuts import render, get_object_or_404
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
 from django.db import transaction
 from django.db.models import Q, Count, Sum, Avg
 from django.http import HttpResponse
@@ -41,7 +42,8 @@ from reportlab.lib.units import inch
 from .models import (
     Doctor, DoctorEducation, DoctorCertification, DoctorProof,
     Schedules, Service, DoctorLocation, Appointment,
-    SubscriptionPlan, SubscriptionUpgrade, DoctorSubscription
+    SubscriptionPlan, SubscriptionUpgrade, DoctorSubscription,
+    ScheduleTemplate, SlotUnavailable
 )
 from .serializers import (
     DoctorDashboardSerializer, DashboardDataService,
@@ -52,10 +54,16 @@ from .serializers import (
     DoctorLocationUpdateSerializer, SubscriptionActivationSerializer,
     SubscriptionUpdateSerializer, PaymentVerificationSerializer,
     CurrentSubscriptionSerializer, SubscriptionHistorySerializer,
-    DoctorReportPDFService
+    DoctorReportPDFService, ScheduleTemplateSerializer
 )
 from adminside.serializers import SubscriptionPlanSerializer
 from doctor.serializers import CustomDoctorTokenObtainPairSerializer
+from doctor.spatial_index import sync_location
+from doctor.schedule_templates import expand_template, TemplateExpansionError
+from doctor.schedule_overlap import doctor_day_intervals
+from doctor.sparse_fields import SparseFieldsetViewMixin, requested_fields
+from doctor.booking import reschedule_appointment
+from doctor.bulk_appointments import bulk_update_status, ALLOWED_TRANSITIONS, MAX_BULK_APPOINTMENTS
 from patients.serializers import AppointmentSerializer,DoctorReviewSerializer
 
 # Logger setup
@@ -1125,20 +1133,22 @@ class ScheduleView(APIView):
         """Get schedule list filtered by user role"""
         try:
             if hasattr(request.user, 'role') and request.user.role == 'doctor':
-                try:
-                    doctor = Doctor.objects.get(user=request.user)
-                    schedules = Schedules.objects.filter(doctor=doctor).select_related('doctor', 'service')
-                except Doctor.DoesNotExist:
-                    schedules = Schedules.objects.none()
+                schedules = Schedules.objects.filter(doctor__user=request.user)
             else:
-                schedules = Schedules.objects.select_related('doctor', 'service').all()
+                schedules = Schedules.objects.all()
 
-            schedules = schedules.order_by('date', 'start_time')
-            serializer = SchedulesSerializer(schedules, many=True)
+            # Constant query count: schedules with appointment stats annotated, then one services query
+            schedules = list(SchedulesSerializer.annotate_queryset(schedules.order_by('date', 'start_time')))
+            services_by_doctor = SchedulesSerializer.services_payload({schedule.doctor_id for schedule in schedules})
+            serializer = SchedulesSerializer(
+                schedules,
+                many=True,
+                context={'request': request, 'services_by_doctor': services_by_doctor}
+            )
             return Response({
                 'success': True,
                 'data': serializer.data,
-                'count': schedules.count()
+                'count': len(schedules)
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -1150,6 +1160,39 @@ class ScheduleView(APIView):
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def overlap_response(self, doctor, schedule_date, start_time, end_time, exclude_id=None):
+        """409 response if start-end overlaps another active schedule of the doctor that day, else None"""
+        try:
+            schedule_date = parse_date(str(schedule_date)) if schedule_date else None
+            start_time = parse_time(str(start_time)) if start_time else None
+            end_time = parse_time(str(end_time)) if end_time else None
+        except ValueError:
+            return None
+        if not (schedule_date and start_time and end_time):
+            return None  # left to serializer validation
+
+        conflicts = doctor_day_intervals(doctor, schedule_date, exclude_id).conflicts(start_time, end_time)
+        if not conflicts:
+            return None
+
+        overlapping_schedules = Schedules.objects.filter(
+            id__in=[schedule_id for _, _, schedule_id in conflicts]
+        ).select_related('service').order_by('start_time')
+        overlap_details = []
+        for sch in overlapping_schedules:
+            overlap_details.append({
+                'schedule_id': sch.id,
+                'service': sch.service.service_name,
+                'time': f"{sch.start_time.strftime('%H:%M')} - {sch.end_time.strftime('%H:%M')}"
+            })
+
+        return Response({
+            'success': False,
+            'message': 'Schedule time conflicts with existing schedules',
+            'conflicts': overlap_details,
+            'suggestion': 'Please choose a different time'
+        }, status=status.HTTP_409_CONFLICT)
+
     def post(self, request):
         """Create new schedule with overlap protection"""
         try:
@@ -1174,71 +1217,54 @@ class ScheduleView(APIView):
                         'message': 'You can only create schedules for your own services.'
                     }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Check for overlapping schedules
-            schedule_date = request.data.get('date')
-            start_time = request.data.get('start_time')
-            end_time = request.data.get('end_time')
-            
-            if schedule_date and start_time and end_time:
-                overlapping_schedules = Schedules.objects.filter(
-                    doctor=doctor,
-                    date=schedule_date,
-                    is_active=True
-                ).filter(
-                    models.Q(start_time__lt=end_time) & models.Q(end_time__gt=start_time)
+            with transaction.atomic():
+                # Serialize schedule writes per doctor so two requests cannot both pass the overlap check
+                Doctor.objects.select_for_update().filter(pk=doctor.pk).first()
+                # Check for overlapping schedules
+                conflict_response = self.overlap_response(
+                    doctor,
+                    request.data.get('date'),
+                    request.data.get('start_time'),
+                    request.data.get('end_time')
                 )
-                
-                if overlapping_schedules.exists():
-                    overlap_details = []
-                    for sch in overlapping_schedules:
-                        overlap_details.append({
-                            'schedule_id': sch.id,
-                            'service': sch.service.service_name,
-                            'time': f"{sch.start_time.strftime('%H:%M')} - {sch.end_time.strftime('%H:%M')}"
-                        })
-                    
-                    return Response({
-                        'success': False,
-                        'message': 'Schedule time conflicts with existing schedules',
-                        'conflicts': overlap_details,
-                        'suggestion': 'Please choose a different time'
-                    }, status=status.HTTP_409_CONFLICT)
+                if conflict_response:
+                    return conflict_response
 
-            # Subscription check
-            if not doctor.can_create_schedule():
-                plan = doctor.get_current_plan()
-                if not plan:
+                # Subscription check
+                if not doctor.can_create_schedule():
+                    plan = doctor.get_current_plan()
+                    if not plan:
+                        return Response({
+                            'success': False,
+                            'message': 'Active subscription required to create schedules.',
+                            'error_type': 'subscription_required',
+                            'redirect_to': '/subscription/plans/'
+                        }, status=status.HTTP_402_PAYMENT_REQUIRED)
+                    else:
+                        usage_stats = doctor.get_usage_stats()
+                        return Response({
+                            'success': False,
+                            'message': 'Schedule creation limit reached for your plan.',
+                            'error_type': 'limit_reached',
+                            'current_usage': usage_stats,
+                            'redirect_to': '/subscription/upgrade/'
+                        }, status=status.HTTP_403_FORBIDDEN)
+
+                # Create schedule
+                serializer = SchedulesSerializer(data=request.data, context={'request': request})
+                if serializer.is_valid():
+                    schedule = serializer.save(doctor=doctor)
+                    response_serializer = SchedulesSerializer(schedule)
                     return Response({
-                        'success': False,
-                        'message': 'Active subscription required to create schedules.',
-                        'error_type': 'subscription_required',
-                        'redirect_to': '/subscription/plans/'
-                    }, status=status.HTTP_402_PAYMENT_REQUIRED)
+                        'success': True,
+                        'message': 'Schedule created successfully',
+                        'data': response_serializer.data
+                    }, status=status.HTTP_201_CREATED)
                 else:
-                    usage_stats = doctor.get_usage_stats()
                     return Response({
                         'success': False,
-                        'message': 'Schedule creation limit reached for your plan.',
-                        'error_type': 'limit_reached',
-                        'current_usage': usage_stats,
-                        'redirect_to': '/subscription/upgrade/'
-                    }, status=status.HTTP_403_FORBIDDEN)
-
-            # Create schedule
-            serializer = SchedulesSerializer(data=request.data, context={'request': request})
-            if serializer.is_valid():
-                schedule = serializer.save(doctor=doctor)
-                response_serializer = SchedulesSerializer(schedule)
-                return Response({
-                    'success': True,
-                    'message': 'Schedule created successfully',
-                    'data': response_serializer.data
-                }, status=status.HTTP_201_CREATED)
-            else:
-                return Response({
-                    'success': False,
-                    'field_errors': serializer.errors
-                }, status=status.HTTP_400_BAD_REQUEST)
+                        'field_errors': serializer.errors
+                    }, status=status.HTTP_400_BAD_REQUEST)
 
         except Exception as e:
             import traceback
@@ -1320,27 +1346,44 @@ class ScheduleView(APIView):
                             'message': 'You can only assign your own services to schedules.'
                         }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Update schedule
-            serializer = SchedulesSerializer(
-                schedule,
-                data=request.data,
-                partial=True,
-                context={'request': request}
-            )
+            with transaction.atomic():
+                # Serialize schedule writes per doctor so two requests cannot both pass the overlap check
+                Doctor.objects.select_for_update().filter(pk=schedule.doctor_id).first()
+                # Re-check overlaps when the schedule moves or is reactivated
+                if any(field in request.data for field in ('date', 'start_time', 'end_time', 'is_active')):
+                    is_active = request.data.get('is_active', schedule.is_active)
+                    if str(is_active).lower() not in ['false', '0']:
+                        conflict_response = self.overlap_response(
+                            schedule.doctor,
+                            request.data.get('date') or schedule.date,
+                            request.data.get('start_time') or schedule.start_time,
+                            request.data.get('end_time') or schedule.end_time,
+                            exclude_id=schedule.id
+                        )
+                        if conflict_response:
+                            return conflict_response
+
+                # Update schedule
+                serializer = SchedulesSerializer(
+                    schedule,
+                    data=request.data,
+                    partial=True,
+                    context={'request': request}
+                )
             
-            if serializer.is_valid():
-                updated_schedule = serializer.save()
-                response_serializer = SchedulesSerializer(updated_schedule)
-                return Response({
-                    'success': True,
-                    'message': 'Schedule updated successfully',
-                    'data': response_serializer.data
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response({
-                    'success': False,
-                    'field_errors': serializer.errors
-                }, status=status.HTTP_400_BAD_REQUEST)
+                if serializer.is_valid():
+                    updated_schedule = serializer.save()
+                    response_serializer = SchedulesSerializer(updated_schedule)
+                    return Response({
+                        'success': True,
+                        'message': 'Schedule updated successfully',
+                        'data': response_serializer.data
+                    }, status=status.HTTP_200_OK)
+                else:
+                    return Response({
+                        'success': False,
+                        'field_errors': serializer.errors
+                    }, status=status.HTTP_400_BAD_REQUEST)
 
         except Exception as e:
             import traceback
@@ -1410,6 +1453,143 @@ class ScheduleView(APIView):
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class ScheduleTemplateView(APIView):
+    """Weekly recurring schedule templates for the logged-in doctor"""
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+
+    def get_doctor(self, request):
+        if getattr(request.user, 'role', None) != 'doctor':
+            return None
+        return Doctor.objects.filter(user=request.user).first()
+
+    def get(self, request):
+        doctor = self.get_doctor(request)
+        if not doctor:
+            return Response({
+                'success': False,
+                'message': 'Access denied. Only doctors can manage schedule templates.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        templates = ScheduleTemplate.objects.filter(doctor=doctor).select_related('service')
+        return Response({
+            'success': True,
+            'data': ScheduleTemplateSerializer(templates, many=True).data,
+            'count': len(templates)
+        }, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        doctor = self.get_doctor(request)
+        if not doctor:
+            return Response({
+                'success': False,
+                'message': 'Access denied. Only doctors can manage schedule templates.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            serializer = ScheduleTemplateSerializer(data=request.data, context={'request': request})
+            if not serializer.is_valid():
+                return Response({
+                    'success': False,
+                    'field_errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            template = serializer.save(doctor=doctor)
+            return Response({
+                'success': True,
+                'message': 'Schedule template created successfully',
+                'data': ScheduleTemplateSerializer(template).data
+            }, status=status.HTTP_201_CREATED)
+
+        except Exception as e:
+            logger.error(f"Error creating schedule template: {str(e)}", exc_info=True)
+            return Response({
+                'success': False,
+                'message': 'Failed to create schedule template',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def delete(self, request, template_id=None):
+        doctor = self.get_doctor(request)
+        template = get_object_or_404(ScheduleTemplate, id=template_id, doctor=doctor)
+        # Schedules already generated from it are left in place
+        template.delete()
+        return Response({
+            'success': True,
+            'message': 'Schedule template deleted successfully'
+        }, status=status.HTTP_200_OK)
+
+
+class ScheduleTemplateExpandView(APIView):
+    """Generate a template's schedules for a date range in one batch"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, template_id):
+        if getattr(request.user, 'role', None) != 'doctor':
+            return Response({
+                'success': False,
+                'message': 'Access denied. Only doctors can create schedules.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        template = get_object_or_404(
+            ScheduleTemplate.objects.select_related('doctor', 'service'),
+            id=template_id,
+            doctor__user=request.user,
+            is_active=True
+        )
+
+        try:
+            start_date = datetime.strptime(str(request.data.get('from', '')), '%Y-%m-%d').date()
+            end_date = datetime.strptime(str(request.data.get('to', '')), '%Y-%m-%d').date()
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'from and to are required as YYYY-MM-DD'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # all_or_nothing: refuse the whole batch if any day conflicts or is over the plan limit
+        allow_partial = str(request.data.get('all_or_nothing', 'false')).lower() not in ['true', '1']
+
+        try:
+            created, conflicts, over_limit = expand_template(template, start_date, end_date, allow_partial)
+        except TemplateExpansionError as e:
+            error_status = (
+                status.HTTP_402_PAYMENT_REQUIRED if e.error_type == 'subscription_required'
+                else status.HTTP_400_BAD_REQUEST
+            )
+            return Response({
+                'success': False,
+                'message': e.message,
+                'error_type': e.error_type
+            }, status=error_status)
+        except Exception as e:
+            logger.error(f"Error expanding schedule template {template_id}: {str(e)}", exc_info=True)
+            return Response({
+                'success': False,
+                'message': 'Failed to generate schedules',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        skipped = {
+            'conflicts': [day.isoformat() for day in conflicts],
+            'limit_reached': [day.isoformat() for day in over_limit]
+        }
+        if not created and (conflicts or over_limit):
+            return Response({
+                'success': False,
+                'message': 'No schedules were created',
+                'skipped': skipped
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            'success': True,
+            'message': f'{len(created)} schedules created',
+            'created_count': len(created),
+            'created_dates': [schedule.date.isoformat() for schedule in created],
+            'skipped': skipped
+        }, status=status.HTTP_201_CREATED)
+
+
 class DoctorLocationCreateView(generics.CreateAPIView):
     """Add new doctor location"""
     serializer_class = DoctorLocationSerializer
@@ -1476,6 +1656,7 @@ class DoctorLocationCreateView(generics.CreateAPIView):
                         logger.debug(f"Updated {field}: {old_value} -> {value}")
                     
                     existing_location.save()
+                    sync_location(existing_location)
                     logger.info(f"Successfully updated existing location {existing_location.id}")
                     return existing_location
                 else:
@@ -1491,6 +1672,7 @@ class DoctorLocationCreateView(generics.CreateAPIView):
                     
                     # Create new location
                     new_location = serializer.save(doctor=doctor)
+                    sync_location(new_location)
                     logger.info(f"Successfully created new location {new_location.id} for doctor {doctor.id}")
                     return new_location
                     
@@ -1613,7 +1795,8 @@ class DoctorLocationUpdateView(generics.UpdateAPIView):
                     ).exclude(id=current_location.id).update(is_current=False)
                     logger.debug(f"Set {updated_count} other locations as not current")
                 
-                serializer.save()
+                location = serializer.save()
+                sync_location(location)
                 logger.info(f"Successfully updated location {current_location.id}")
                 
         except Exception as e:
@@ -1685,6 +1868,7 @@ class DoctorLocationUpdateCurrentView(generics.CreateAPIView):
                     
                     existing_location.is_current = True
                     existing_location.save()
+                    sync_location(existing_location)
                     
                     logger.info(f"Successfully updated existing location {existing_location.id} as current")
                     
@@ -1709,6 +1893,7 @@ class DoctorLocationUpdateCurrentView(generics.CreateAPIView):
                         doctor=doctor,
                         **location_data
                     )
+                    sync_location(location)
                     
                     logger.info(f"Successfully created new current location {location.id}")
                     
@@ -1785,6 +1970,7 @@ class DoctorLocationDeleteView(generics.DestroyAPIView):
                 instance.is_active = False
                 instance.is_current = False
                 instance.save()
+                sync_location(instance)
                 
                 logger.info(f"Successfully soft deleted location {instance.id}")
                 
@@ -1921,6 +2107,32 @@ class DoctorAppointmentDashboardView(APIView):
     """
     permission_classes = [IsAuthenticated]
     
+    @staticmethod
+    def overview_counts(doctor, today):
+        """Every dashboard counter from one aggregate() (filtered COUNTs over a single scan)"""
+        tomorrow = today + timedelta(days=1)
+        week_end = today + timedelta(days=7)
+        week_ago = today - timedelta(days=7)
+        is_today = Q(appointment_date=today)
+        
+        return Appointment.objects.filter(doctor=doctor).aggregate(
+            total_appointments=Count('id'),
+            pending=Count('id', filter=Q(status='pending')),
+            confirmed=Count('id', filter=Q(status='confirmed')),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            online_appointments=Count('id', filter=Q(mode='online')),
+            offline_appointments=Count('id', filter=Q(mode='offline')),
+            today_total=Count('id', filter=is_today),
+            today_pending=Count('id', filter=is_today & Q(status='pending')),
+            today_confirmed=Count('id', filter=is_today & Q(status='confirmed')),
+            today_completed=Count('id', filter=is_today & Q(status='completed')),
+            # Upcoming: from tomorrow onwards, still pending/confirmed
+            upcoming=Count('id', filter=Q(appointment_date__gte=tomorrow, status__in=['pending', 'confirmed'])),
+            this_week=Count('id', filter=Q(appointment_date__gte=today, appointment_date__lt=week_end)),
+            last_week=Count('id', filter=Q(appointment_date__gte=week_ago, appointment_date__lt=today)),
+        )
+    
     def get(self, request):
         try:
             # Ensure user is a doctor
@@ -1939,73 +2151,30 @@ class DoctorAppointmentDashboardView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Get all appointments for statistics
-            all_appointments = Appointment.objects.filter(doctor=doctor)
-            
-            # Calculate statistics
-            today = date.today()
-            
-            # Total counts by status
-            total_appointments = all_appointments.count()
-            pending_count = all_appointments.filter(status='pending').count()
-            confirmed_count = all_appointments.filter(status='confirmed').count()
-            completed_count = all_appointments.filter(status='completed').count()
-            cancelled_count = all_appointments.filter(status='cancelled').count()
-            
-            # Today's appointments
-            today_appointments = all_appointments.filter(appointment_date=today)
-            today_total = today_appointments.count()
-            today_pending = today_appointments.filter(status='pending').count()
-            today_confirmed = today_appointments.filter(status='confirmed').count()
-            today_completed = today_appointments.filter(status='completed').count()
-            
-            # Upcoming appointments (from tomorrow onwards)
-            tomorrow = today + timedelta(days=1)
-            upcoming_appointments = all_appointments.filter(
-                appointment_date__gte=tomorrow,
-                status__in=['pending', 'confirmed']
-            ).count()
-            
-            # This week's appointments
-            week_end = today + timedelta(days=7)
-            this_week_appointments = all_appointments.filter(
-                appointment_date__gte=today,
-                appointment_date__lt=week_end
-            ).count()
-            
-            # Recent appointments (last 7 days)
-            week_ago = today - timedelta(days=7)
-            recent_appointments = all_appointments.filter(
-                appointment_date__gte=week_ago,
-                appointment_date__lt=today
-            ).count()
-            
-            # Mode-wise statistics
-            online_appointments = all_appointments.filter(mode='online').count()
-            offline_appointments = all_appointments.filter(mode='offline').count()
+            counts = self.overview_counts(doctor, date.today())
             
             dashboard_data = {
                 'overview': {
-                    'total_appointments': total_appointments,
-                    'pending': pending_count,
-                    'confirmed': confirmed_count,
-                    'completed': completed_count,
-                    'cancelled': cancelled_count,
-                    'online_appointments': online_appointments,
-                    'offline_appointments': offline_appointments,
+                    'total_appointments': counts['total_appointments'],
+                    'pending': counts['pending'],
+                    'confirmed': counts['confirmed'],
+                    'completed': counts['completed'],
+                    'cancelled': counts['cancelled'],
+                    'online_appointments': counts['online_appointments'],
+                    'offline_appointments': counts['offline_appointments'],
                 },
                 'today': {
-                    'total': today_total,
-                    'pending': today_pending,
-                    'confirmed': today_confirmed,
-                    'completed': today_completed,
+                    'total': counts['today_total'],
+                    'pending': counts['today_pending'],
+                    'confirmed': counts['today_confirmed'],
+                    'completed': counts['today_completed'],
                 },
                 'upcoming': {
-                    'total_upcoming': upcoming_appointments,
-                    'this_week': this_week_appointments,
+                    'total_upcoming': counts['upcoming'],
+                    'this_week': counts['this_week'],
                 },
                 'recent': {
-                    'last_week': recent_appointments,
+                    'last_week': counts['last_week'],
                 }
             }
             
@@ -2019,7 +2188,7 @@ class DoctorAppointmentDashboardView(APIView):
             )
 
 
-class DoctorAppointmentsListView(ListAPIView):
+class DoctorAppointmentsListView(SparseFieldsetViewMixin, ListAPIView):
     """
     List all appointments for the doctor with basic filtering
     """
@@ -2039,8 +2208,8 @@ class DoctorAppointmentsListView(ListAPIView):
                 return Appointment.objects.none()
             
             # Base queryset
-            queryset = Appointment.objects.filter(doctor=doctor).select_related(
-                'patient__user', 'doctor__user', 'service', 'schedule'
+            queryset = AppointmentSerializer.with_related(
+                Appointment.objects.filter(doctor=doctor), requested_fields(self.request)
             ).order_by('-appointment_date', '-slot_time')
             
             # Simple filters (let frontend handle complex filtering)
@@ -2059,7 +2228,7 @@ class DoctorAppointmentsListView(ListAPIView):
             return Appointment.objects.none()
 
 
-class PendingAppointmentsView(ListAPIView):
+class PendingAppointmentsView(SparseFieldsetViewMixin, ListAPIView):
     """
     List only pending appointments that need doctor's approval
     """
@@ -2079,19 +2248,17 @@ class PendingAppointmentsView(ListAPIView):
                 return Appointment.objects.none()
             
             # Only pending appointments
-            return Appointment.objects.filter(
+            return AppointmentSerializer.with_related(Appointment.objects.filter(
                 doctor=doctor,
                 status='pending'
-            ).select_related(
-                'patient__user', 'doctor__user', 'service', 'schedule'
-            ).order_by('appointment_date', 'slot_time')
+            ), requested_fields(self.request)).order_by('appointment_date', 'slot_time')
             
         except Exception as e:
             logger.error(f"Error in PendingAppointmentsView: {str(e)}", exc_info=True)
             return Appointment.objects.none()
 
 
-class TodayAppointmentsView(ListAPIView):
+class TodayAppointmentsView(SparseFieldsetViewMixin, ListAPIView):
     """
     Get today's appointments for the doctor
     """
@@ -2112,19 +2279,17 @@ class TodayAppointmentsView(ListAPIView):
             
             # Today's appointments
             today = date.today()
-            return Appointment.objects.filter(
+            return AppointmentSerializer.with_related(Appointment.objects.filter(
                 doctor=doctor,
                 appointment_date=today
-            ).select_related(
-                'patient__user', 'doctor__user', 'service', 'schedule'
-            ).order_by('slot_time')
+            ), requested_fields(self.request)).order_by('slot_time')
             
         except Exception as e:
             logger.error(f"Error in TodayAppointmentsView: {str(e)}", exc_info=True)
             return Appointment.objects.none()
 
 
-class UpcomingAppointmentsView(ListAPIView):
+class UpcomingAppointmentsView(SparseFieldsetViewMixin, ListAPIView):
     """
     Get upcoming appointments (from tomorrow onwards)
     """
@@ -2145,13 +2310,11 @@ class UpcomingAppointmentsView(ListAPIView):
             
             # Upcoming appointments
             tomorrow = date.today() + timedelta(days=1)
-            return Appointment.objects.filter(
+            return AppointmentSerializer.with_related(Appointment.objects.filter(
                 doctor=doctor,
                 appointment_date__gte=tomorrow,
                 status__in=['pending', 'confirmed']
-            ).select_related(
-                'patient__user', 'doctor__user', 'service', 'schedule'
-            ).order_by('appointment_date', 'slot_time')
+            ), requested_fields(self.request)).order_by('appointment_date', 'slot_time')
             
         except Exception as e:
             logger.error(f"Error in UpcomingAppointmentsView: {str(e)}", exc_info=True)
@@ -2293,6 +2456,16 @@ class HandleAppointmentRequestView(APIView):
                 'appointment': serializer.data
             })
             
+        except SlotUnavailable as e:
+            # The request's hold lapsed and its place has since been taken
+            return Response(
+                {
+                    'error': 'Time slot is no longer available',
+                    'message': 'This request waited too long and its slot has been booked by another patient.',
+                    'field_errors': e.message_dict
+                },
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             logger.error(f"Error in HandleAppointmentRequestView: {str(e)}", exc_info=True)
             return Response(
@@ -2344,14 +2517,9 @@ class UpdateAppointmentStatusView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Define allowed transitions
+            # Allowed transitions are shared with the bulk endpoint
             current_status = appointment.status
-            allowed_transitions = {
-                'pending': ['confirmed', 'cancelled'],
-                'confirmed': ['completed', 'cancelled'],
-                'cancelled': [],  # Cannot change from cancelled
-                'completed': []   # Cannot change from completed
-            }
+            allowed_transitions = ALLOWED_TRANSITIONS
             
             if new_status not in allowed_transitions.get(current_status, []):
                 return Response(
@@ -2380,6 +2548,15 @@ class UpdateAppointmentStatusView(APIView):
                 'appointment': serializer.data
             })
             
+        except SlotUnavailable as e:
+            return Response(
+                {
+                    'error': 'Time slot is no longer available',
+                    'message': 'This request waited too long and its slot has been booked by another patient.',
+                    'field_errors': e.message_dict
+                },
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             logger.error(f"Error in UpdateAppointmentStatusView: {str(e)}", exc_info=True)
             return Response(
@@ -2388,6 +2565,75 @@ class UpdateAppointmentStatusView(APIView):
             )
 
 
+class BulkAppointmentStatusView(APIView):
+    """
+    Move many appointments to one status (confirm or complete a whole session at once)
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        try:
+            # Ensure user is a doctor
+            if not hasattr(request.user, 'role') or request.user.role != 'doctor':
+                return Response(
+                    {'error': 'Only doctors can update appointment status'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            
+            # Get doctor instance
+            try:
+                doctor = request.user.doctor_profile
+            except AttributeError:
+                return Response(
+                    {'error': 'Doctor profile not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            
+            appointment_ids = request.data.get('appointment_ids')
+            new_status = request.data.get('status')
+            notes = request.data.get('notes', '')
+            
+            if not isinstance(appointment_ids, list) or not appointment_ids:
+                return Response(
+                    {'error': 'appointment_ids must be a non-empty list'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if len(appointment_ids) > MAX_BULK_APPOINTMENTS:
+                return Response(
+                    {'error': f'At most {MAX_BULK_APPOINTMENTS} appointments per request'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not all(str(appointment_id).isdigit() for appointment_id in appointment_ids):
+                return Response(
+                    {'error': 'appointment_ids must be appointment IDs'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            valid_statuses = ['confirmed', 'cancelled', 'completed']
+            if new_status not in valid_statuses:
+                return Response(
+                    {'error': f'Invalid status. Must be one of: {valid_statuses}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            results = bulk_update_status(doctor, appointment_ids, new_status, notes)
+            updated = sum(1 for item in results if item['result'] == 'updated')
+            
+            return Response({
+                'message': f'{updated} of {len(results)} appointments updated to {new_status}',
+                'updated': updated,
+                'failed': len(results) - updated,
+                'results': results
+            })
+            
+        except Exception as e:
+            logger.error(f"Error in BulkAppointmentStatusView: {str(e)}", exc_info=True)
+            return Response(
+                {'error': 'Unable to update appointment status'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class RescheduleAppointmentView(APIView):
     """
     Reschedule an appointment to a new date/time
@@ -2458,38 +2704,13 @@ class RescheduleAppointmentView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Check for conflicts
-            existing = Appointment.objects.filter(
-                doctor=doctor,
-                appointment_date=new_date,
-                slot_time=new_time,
-                status__in=['pending', 'confirmed']
-            ).exclude(id=appointment.id)
-            
-            if existing.exists():
-                return Response(
-                    {'error': 'The selected time slot is already booked'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Update appointment
-            old_date = appointment.appointment_date
-            old_time = appointment.slot_time
-            
-            appointment.appointment_date = new_date
-            appointment.slot_time = new_time
-            
             # Add reschedule note
-            reschedule_note = f"[{timezone.now().strftime('%Y-%m-%d %H:%M')}] Rescheduled from {old_date} {old_time} to {new_date} {new_time}"
+            reschedule_note = f"[{timezone.now().strftime('%Y-%m-%d %H:%M')}] Rescheduled from {appointment.appointment_date} {appointment.slot_time} to {new_date} {new_time}"
             if reason:
                 reschedule_note += f" - Reason: {reason}"
             
-            if appointment.notes:
-                appointment.notes += f"\n{reschedule_note}"
-            else:
-                appointment.notes = reschedule_note
-            
-            appointment.save()
+            # Capacity and the target schedule are checked under the slot lock
+            appointment = reschedule_appointment(appointment, new_date, new_time, note=reschedule_note)
             
             serializer = AppointmentSerializer(appointment)
             return Response({
@@ -2497,6 +2718,15 @@ class RescheduleAppointmentView(APIView):
                 'appointment': serializer.data
             })
             
+        except SlotUnavailable as e:
+            return Response(
+                {
+                    'error': 'Time slot is not available',
+                    'message': 'The selected time is outside your schedules or already fully booked.',
+                    'field_errors': e.message_dict
+                },
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             logger.error(f"Error in RescheduleAppointmentView: {str(e)}", exc_info=True)
             return Response(
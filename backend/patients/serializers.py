@@ -25,6 +25,11 @@ from rest_framework_simplejwt.exceptions import AuthenticationFailed
 
 from doctor.models import User, EmailOTP, Patient, Address, Medical_Record,Appointment,Schedules,Payment,Doctor,Service,Schedules,DoctorLocation,PatientLocation
 from doctor.serializers import ServiceSerializer
+from doctor.availability import booked_slot_counts
+from doctor.slot_holds import held_count
+from doctor.sparse_fields import SparseFieldsetMixin
+from doctor.slot_grid import schedule_template, time_labels
+from doctor.booking import book_appointment
 from patients.utils import send_otp_email
 
 logger = logging.getLogger(__name__)
@@ -776,8 +781,8 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
         return value
     
     
-class AppointmentSerializer(serializers.ModelSerializer):
-    """Comprehensive appointment serializer"""
+class AppointmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Comprehensive appointment serializer (supports ?fields= via context['fields'])"""
     # Read-only computed fields
     patient_name = serializers.SerializerMethodField()
     patient_age = serializers.SerializerMethodField()
@@ -815,6 +820,21 @@ class AppointmentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    # Relations each read-side field touches; all forward FKs, so one joined query
+    FIELD_RELATIONS = {
+        'patient_name': ('patient__user',),
+        'patient_email': ('patient__user',),
+        'patient_phone': ('patient__user',),
+        'patient_age': ('patient',),
+        'patient_gender': ('patient',),
+        'patient_profile_image': ('patient',),
+        'doctor_name': ('doctor__user',),
+        'doctor_id': ('doctor__user',),
+        'service_name': ('service',),
+        'service_id': ('service',),
+        'medical_record_details': ('medical_record',),
+    }
+
     def get_end_time(self, obj):
         start = datetime.combine(obj.appointment_date, obj.slot_time)
         end = start + obj.duration
@@ -1227,7 +1247,8 @@ class AppointmentSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Create appointment with proper handling"""
         address_data = validated_data.pop('address', None)
-        appointment = Appointment.objects.create(**validated_data)
+        # Check-and-insert under the slot's row lock; validate() above is only a fast pre-check
+        appointment = book_appointment(validated_data)
         
         if address_data:
             if isinstance(address_data, str):
@@ -1243,9 +1264,6 @@ class AppointmentSerializer(serializers.ModelSerializer):
             else:
                 appointment.address = address_data
             appointment.save()
-
-        if hasattr(appointment, 'schedule') and appointment.schedule:
-            appointment.schedule.update_booked_slots()
         
         return appointment
 
@@ -1294,11 +1312,55 @@ class AppointmentSerializer(serializers.ModelSerializer):
         instance.status = 'pending'
         instance.save()
 
-        if hasattr(instance, 'schedule') and instance.schedule:
-            instance.schedule.update_booked_slots()
-
         return instance
     
+class DoctorCardSerializer(serializers.ModelSerializer):
+    """Compact doctor summary for directory listings (no nested education/certifications)"""
+    
+    doctor_id = serializers.UUIDField(source='doctor_profile.id', read_only=True)
+    full_name = serializers.SerializerMethodField()
+    specialization = serializers.CharField(source='doctor_profile.specialization', read_only=True)
+    specialization_display = serializers.CharField(source='doctor_profile.get_specialization_display', read_only=True)
+    experience = serializers.IntegerField(source='doctor_profile.experience', read_only=True)
+    clinic_name = serializers.CharField(source='doctor_profile.clinic_name', read_only=True)
+    location = serializers.CharField(source='doctor_profile.location', read_only=True)
+    consultation_fee = serializers.DecimalField(source='doctor_profile.consultation_fee', max_digits=10, decimal_places=2, read_only=True)
+    consultation_mode_online = serializers.BooleanField(source='doctor_profile.consultation_mode_online', read_only=True)
+    consultation_mode_offline = serializers.BooleanField(source='doctor_profile.consultation_mode_offline', read_only=True)
+    is_available = serializers.BooleanField(source='doctor_profile.is_available', read_only=True)
+    profile_picture_url = serializers.SerializerMethodField()
+    average_rating = serializers.SerializerMethodField()
+    review_count = serializers.SerializerMethodField()
+    next_available_slot = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = User
+        fields = [
+            'id', 'doctor_id', 'full_name', 'specialization', 'specialization_display',
+            'experience', 'clinic_name', 'location', 'consultation_fee',
+            'consultation_mode_online', 'consultation_mode_offline', 'is_available',
+            'profile_picture_url', 'average_rating', 'review_count', 'next_available_slot'
+        ]
+    
+    def get_full_name(self, obj):
+        return f"DR.{obj.first_name or ''} {obj.last_name or ''}".strip()
+    
+    def get_profile_picture_url(self, obj):
+        doctor = getattr(obj, 'doctor_profile', None)
+        if doctor and doctor.profile_picture:
+            return doctor.profile_picture.url
+        return None
+    
+    def get_average_rating(self, obj):
+        return obj.doctor_profile.rating_stats['average_rating']
+    
+    def get_review_count(self, obj):
+        return obj.doctor_profile.rating_stats['total_reviews']
+    
+    def get_next_available_slot(self, obj):
+        return obj.doctor_profile.next_available_slot
+
+
 class BookingDoctorDetailSerializer(serializers.ModelSerializer):
     """Doctor details for booking page"""
     
@@ -1481,129 +1543,53 @@ class ScheduleDetailSerializer(serializers.ModelSerializer):
         ]
     
     def get_time_slots(self, obj):
-        """Generate individual time slots based on schedule"""
-        slots = []
-        
-        # Convert slot_duration to minutes
-        slot_duration_minutes = int(obj.slot_duration.total_seconds() / 60)
-        
-        # Create datetime objects for start and end times
-        start_datetime = datetime.combine(obj.date, obj.start_time)
-        end_datetime = datetime.combine(obj.date, obj.end_time)
-        
-        # Generate slots
-        current_slot_start = start_datetime
-        slot_id = 1
-        
-        while current_slot_start < end_datetime:
-            current_slot_end = current_slot_start + timedelta(minutes=slot_duration_minutes)
-            
-            # Don't create a slot if it would exceed the end time
-            if current_slot_end > end_datetime:
-                break
-            
-            # Check if this slot conflicts with break time
-            if obj.break_start_time and obj.break_end_time:
-                break_start = datetime.combine(obj.date, obj.break_start_time)
-                break_end = datetime.combine(obj.date, obj.break_end_time)
-                
-                # Skip slots that overlap with break time
-                if (current_slot_start < break_end and current_slot_end > break_start):
-                    current_slot_start = current_slot_end
-                    continue
-            
-            total_time_slots = len(self._get_all_slots(obj))
-            if total_time_slots > 0:
-                avg_booked_per_slot = obj.booked_slots / total_time_slots
-                remaining_slots = max(0, obj.max_patients_per_slot - int(avg_booked_per_slot))
-            else:
-                remaining_slots = obj.max_patients_per_slot
-            
-            slot_data = {
-                'id': f"{obj.id}_{slot_id}",
-                'startTime': current_slot_start.strftime('%I:%M %p'),
-                'endTime': current_slot_end.strftime('%I:%M %p'),
-                'remainingSlots': remaining_slots,
-                'maxSlots': obj.max_patients_per_slot,
-                'schedule_id': obj.id
-            }
-            
-            slots.append(slot_data)
-            
-            # Move to next slot
-            current_slot_start = current_slot_end
-            slot_id += 1
-        
-        return slots
-    
-    def get_time_slots(self, obj):
-        """Generate individual time slots with accurate booking status"""
-        slots = []
-        slot_duration_minutes = int(obj.slot_duration.total_seconds() / 60)
-        
-        # Get all booked appointments for this schedule date and doctor
-        booked_appointments = Appointment.objects.filter(
-            doctor=obj.doctor,
-            appointment_date=obj.date,
-            status__in=['pending', 'confirmed', 'completed'],
-            is_slot_booked=True
-        ).values_list('slot_time', flat=True)
-        
-        # Convert to set for faster lookup
-        booked_times = set(booked_appointments)
-        
-        start_datetime = datetime.combine(obj.date, obj.start_time)
-        end_datetime = datetime.combine(obj.date, obj.end_time)
-        
-        current_slot_start = start_datetime
-        slot_id = 1
-        
-        while current_slot_start < end_datetime:
-            current_slot_end = current_slot_start + timedelta(minutes=slot_duration_minutes)
-            
-            if current_slot_end > end_datetime:
-                break
-                
-            # Check break time conflict
-            if self._is_break_time(obj, current_slot_start, current_slot_end):
-                current_slot_start = current_slot_end
-                continue
-            
-            # Check if this specific slot time is booked
-            slot_time = current_slot_start.time()
-            is_booked = slot_time in booked_times
-            
-            # Calculate remaining slots for this specific time
-            booked_count = len([t for t in booked_times if t == slot_time])
-            remaining_slots = max(0, obj.max_patients_per_slot - booked_count)
-            
-            slot_data = {
-                'id': f"{obj.id}_{slot_id}",
-                'startTime': current_slot_start.strftime('%I:%M %p'),
-                'endTime': current_slot_end.strftime('%I:%M %p'),
-                'remainingSlots': remaining_slots,
-                'maxSlots': obj.max_patients_per_slot,
-                'schedule_id': obj.id,
-                'is_available': remaining_slots > 0 and obj.is_active,
-                'is_booked': is_booked,
-                'slot_time_24h': slot_time.strftime('%H:%M')  # For easy comparison
-            }
-            
-            slots.append(slot_data)
-            current_slot_start = current_slot_end
-            slot_id += 1
-            
-        return slots
+        """Time slots with their booking status.
+        
+        Reads the materialized ScheduleSlot rows when the view prefetched them
+        as `slot_rows`. Otherwise booked counts come from
+        context['booked_counts'] (a Counter keyed by (schedule_id, slot_time)) so a
+        list of schedules shares one grouped query, or are counted on the fly.
+        Checkout holds from context['held_counts'] (see doctor.slot_holds)
+        reduce the remaining places as well.
+        """
+        holds = self.context.get('held_counts') or {}
+        slot_rows = getattr(obj, 'slot_rows', None)
+        if slot_rows:
+            return [
+                self._slot_data(
+                    obj, slot_id, time_labels(row.start_time), time_labels(row.end_time)[0],
+                    row.capacity, row.booked, held_count(holds, obj.id, row.start_time)
+                )
+                for slot_id, row in enumerate(slot_rows, start=1)
+            ]
+        
+        booked_counts = self.context.get('booked_counts')
+        if booked_counts is None:
+            booked_counts = booked_slot_counts(obj.doctor_id, obj.date)
+        
+        # Grid and labels come precomputed from the memoized template for this shape
+        return [
+            self._slot_data(
+                obj, slot_id, (slot.start_label, slot.label_24h), slot.end_label,
+                obj.max_patients_per_slot, booked_counts[(obj.id, slot.start)],
+                held_count(holds, obj.id, slot.start)
+            )
+            for slot_id, slot in enumerate(schedule_template(obj).slots, start=1)
+        ]
     
-    def _is_break_time(self, obj, slot_start, slot_end):
-        """Check if slot conflicts with break time"""
-        if not (obj.break_start_time and obj.break_end_time):
-            return False
-            
-        break_start = datetime.combine(obj.date, obj.break_start_time)
-        break_end = datetime.combine(obj.date, obj.break_end_time)
-        
-        return slot_start < break_end and slot_end > break_start
+    def _slot_data(self, obj, slot_id, start_labels, end_label, capacity, booked_count, held=0):
+        remaining_slots = max(0, capacity - booked_count - held)
+        return {
+            'id': f"{obj.id}_{slot_id}",
+            'startTime': start_labels[0],
+            'endTime': end_label,
+            'remainingSlots': remaining_slots,
+            'maxSlots': capacity,
+            'schedule_id': obj.id,
+            'is_available': remaining_slots > 0 and obj.is_active,
+            'is_booked': booked_count > 0,
+            'slot_time_24h': start_labels[1]  # For easy comparison
+        }
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -1623,6 +1609,7 @@ class DoctorLocationSerializer(serializers.ModelSerializer):
     doctor_specialization = serializers.SerializerMethodField()
     doctor_experience = serializers.SerializerMethodField()
     doctor_rating = serializers.SerializerMethodField()
+    doctor_review_count = serializers.SerializerMethodField()
     doctor_consultation_fee = serializers.SerializerMethodField()
     doctor_image = serializers.SerializerMethodField()
     doctor_clinic_name = serializers.SerializerMethodField()
@@ -1630,6 +1617,7 @@ class DoctorLocationSerializer(serializers.ModelSerializer):
     doctor_is_available = serializers.SerializerMethodField()
     doctor_consultation_mode_online = serializers.SerializerMethodField()
     doctor_consultation_mode_offline = serializers.SerializerMethodField()
+    doctor_next_available_slot = serializers.SerializerMethodField()
     
     # Location information
     latitude = serializers.DecimalField(max_digits=10, decimal_places=8, read_only=True)
@@ -1643,9 +1631,10 @@ class DoctorLocationSerializer(serializers.ModelSerializer):
             'latitude', 'longitude', 'loc_name', 'distance',
             # Doctor fields  
             'doctor_id', 'doctor_name', 'doctor_specialization', 'doctor_experience',
-            'doctor_rating', 'doctor_consultation_fee', 'doctor_image', 
+            'doctor_rating', 'doctor_review_count', 'doctor_consultation_fee', 'doctor_image', 
             'doctor_clinic_name', 'doctor_location', 'doctor_is_available',
-            'doctor_consultation_mode_online', 'doctor_consultation_mode_offline'
+            'doctor_consultation_mode_online', 'doctor_consultation_mode_offline',
+            'doctor_next_available_slot'
         ]
     
     def get_doctor_id(self, obj):
@@ -1690,17 +1679,25 @@ class DoctorLocationSerializer(serializers.ModelSerializer):
             return 0
     
     def get_doctor_rating(self, obj):
-        """Get doctor's rating - implement actual rating calculation if needed"""
+        """Get doctor's average rating from the denormalized rating summary"""
         try:
             if obj.doctor:
-                # If you have a rating field or related model, use it here
-                # For now, return a default rating
-                return getattr(obj.doctor, 'rating', 4.5) or 4.5
+                return obj.doctor.rating_stats['average_rating']
             return 0
         except Exception as e:
             logger.error(f"Error getting doctor_rating: {str(e)}")
             return 0
     
+    def get_doctor_review_count(self, obj):
+        """Get number of approved reviews from the rating summary"""
+        try:
+            if obj.doctor:
+                return obj.doctor.rating_stats['total_reviews']
+            return 0
+        except Exception as e:
+            logger.error(f"Error getting doctor_review_count: {str(e)}")
+            return 0
+    
     def get_doctor_consultation_fee(self, obj):
         """Get doctor's consultation fee"""
         try:
@@ -1775,6 +1772,16 @@ class DoctorLocationSerializer(serializers.ModelSerializer):
             logger.error(f"Error getting doctor_consultation_mode_offline: {str(e)}")
             return True
     
+    def get_doctor_next_available_slot(self, obj):
+        """Get the doctor's precomputed next free slot"""
+        try:
+            if obj.doctor:
+                return obj.doctor.next_available_slot
+            return None
+        except Exception as e:
+            logger.error(f"Error getting doctor_next_available_slot: {str(e)}")
+            return None
+    
     def get_distance(self, obj):
         """Return the calculated distance if available"""
         try:
@@ -1,3 +1,57 @@
+from datetime import time, timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from doctor.models import Appointment, User
+from doctor.test_utils import make_doctor, make_patient, make_schedule
+from patients.views import AppointmentManagementView
+
+
+class AppointmentHistoryQueryTests(TestCase):
+    """AppointmentManagementView.get?tab=: patient profile lookup + one joined appointments query"""
+
+    QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.service = make_doctor()
+        cls.schedule = make_schedule(cls.doctor, cls.service)
+        cls.patient = make_patient()
+
+    def add_upcoming(self, count):
+        today = timezone.localdate()
+        # bulk_create skips Appointment.save(); is_slot_booked=False keeps the slot counters out of it
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=self.patient, doctor=self.doctor, schedule=self.schedule, service=self.service,
+                appointment_date=today + timedelta(days=1 + i % 300), slot_time=time(9 + i % 8, 0),
+                mode='online', status='pending' if i % 2 else 'confirmed', is_slot_booked=False
+            )
+            for i in range(count)
+        ])
+
+    def get_tab(self, tab, **params):
+        request = APIRequestFactory().get('/appointments/', {'tab': tab, **params})
+        # Fresh user so the patient_profile lookup is part of every request
+        force_authenticate(request, user=User.objects.get(pk=self.patient.user_id))
+        with self.assertNumQueries(self.QUERIES):
+            response = AppointmentManagementView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_single_appointment(self):
+        self.add_upcoming(1)
+        response = self.get_tab('upcoming')
+        self.assertEqual(response.data['count'], 1)
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_query_count_does_not_grow_with_history(self):
+        self.add_upcoming(1000)
+        response = self.get_tab('upcoming', page_size=50)
+        self.assertEqual(response.data['count'], 50)
+        self.assertIsNotNone(response.data['next_cursor'])
 
-# Create your tests here.
+        response = self.get_tab('upcoming', page_size=50, cursor=response.data['next_cursor'])
+        self.assertEqual(response.data['count'], 50)
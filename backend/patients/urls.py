@@ -17,6 +17,8 @@ from .views import (
 
     # Doctor & Patient
     PatientDoctorView,
+    DoctorDirectoryView,
+    DoctorSuggestionsView,
 
     # Medical Records & Appointments
     MedicalRecordManagementView,
@@ -26,6 +28,8 @@ from .views import (
     # Booking & Schedules
     DoctorBookingDetailView,
     DoctorSchedulesView,
+    SlotHoldView,
+    DoctorAvailabilityCalendarView,
 
     # Location & Nearby Search
     UpdatePatientLocationView,
@@ -74,6 +78,8 @@ urlpatterns = [
     # Patient-Doctor Relationship
     path('patientDoctor/', PatientDoctorView.as_view(), name='patient_doctor_list'),
     path('patientDoctor/<uuid:pk>/', PatientDoctorView.as_view(), name='patient_doctor_detail'),
+    path('patientDoctor/directory/', DoctorDirectoryView.as_view(), name='patient_doctor_directory'),
+    path('patientDoctor/suggestions/', DoctorSuggestionsView.as_view(), name='patient_doctor_suggestions'),
 
     # Medical Records
     path('medical_records/', MedicalRecordManagementView.as_view(), name='medical_records'),
@@ -86,6 +92,8 @@ urlpatterns = [
     # Booking & Doctor Schedules
     path('booking/doctor/<uuid:pk>/', DoctorBookingDetailView.as_view(), name='doctor-booking-detail'),
     path('booking/doctor/<uuid:doctor_id>/schedules/', DoctorSchedulesView.as_view(), name='doctor-schedules'),
+    path('booking/doctor/<uuid:doctor_id>/calendar/', DoctorAvailabilityCalendarView.as_view(), name='doctor-availability-calendar'),
+    path('booking/slot-holds/', SlotHoldView.as_view(), name='slot-hold'),
 
     # Patient Location
     path('patients/location/update/', UpdatePatientLocationView.as_view(), name='patient-location-update'),
@@ -100,7 +108,7 @@ urlpatterns = [
     path('appointments/<int:appointment_id>/payment/status/', PaymentStatusView.as_view(), name='payment-status'),
     path('reviews/doctor/<uuid:doctor_id>/', DoctorReviewsListView.as_view(), name='doctor-reviews-list'),
     path('reviews/create/', PatientReviewCreateView.as_view(), name='patient-review-create'),
-    path('reviews/delete/<int:pk>/', PatientReviewDeleteView.as_view(), name='patient-review-delete'),
+    path('reviews/delete/<int:review_id>/', PatientReviewDeleteView.as_view(), name='patient-review-delete'),
     
     path('wallet/', Wallet.as_view(), name='wallet'),
     path('transaction/', Transaction.as_view(), name='patient-transaction'),
@@ -1,12 +1,13 @@
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, date, time
 from io import BytesIO
+import json
 import logging
 import os
 import hmac
 import hashlib
 import traceback
+from collections import Counter
 from decimal import Decimal
-from math import radians, cos, sin, asin, sqrt, degrees
 
 from PIL import Image
 import razorpay
@@ -17,10 +18,13 @@ from cloudinary.exceptions import Error as CloudinaryError
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.http import Http404
+from django.utils.http import quote_etag, parse_etags
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.files.base import ContentFile
 from django.core.exceptions import ValidationError
 from django.db import transaction, models
-from django.db.models import Q
+from django.db.models import Q, F, Value, DecimalField, Prefetch, Count
+from django.db.models.functions import Coalesce, Cast
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
@@ -45,6 +49,19 @@ from google.auth.transport import requests
 from patients.utils import DoctorEarning, DoctorEarningsManager
 from .utils import handle_appointment_cancellation, PatientWalletManager
 from chat.utils import create_and_send_notification
+from doctor.geo import (
+    nearby_locations as nearby_doctor_locations, k_nearest_locations, ranked_nearby_locations, rank_weights
+)
+from doctor.spatial_index import doctor_location_index
+from doctor.search_cache import cached_nearby_search
+from doctor.directory_search import search_doctor_users
+from doctor.pagination import keyset_page, page_size_from, InvalidCursor
+from doctor.sparse_fields import requested_fields
+from doctor.booking import hold_place_for_payment
+from doctor.availability import upcoming_slot_filter, booked_slot_counts, schedule_next_slot_refresh
+from doctor.slot_grid import schedule_slot_times
+from doctor.slot_holds import take_hold, release_hold, held_count, held_slot_counts, hold_ttl
+from doctor.suggest_index import doctor_suggest_index, DEFAULT_LIMIT as SUGGEST_DEFAULT_LIMIT, MAX_LIMIT as SUGGEST_MAX_LIMIT
 
 # Models
 from doctor.models import (
@@ -62,6 +79,11 @@ from doctor.models import (
     PatientWallet,
     PatientTransaction,
     DoctorReview,
+    DoctorNextSlot,
+    ScheduleSlot,
+    SlotUnavailable,
+    NO_NEXT_SLOT_DATE,
+    NO_NEXT_SLOT_TIME,
 )
 
 # Serializers
@@ -71,6 +93,7 @@ from patients.serializers import (
     ProfilePictureSerializer,
     CustomTokenObtainPairSerializer,
     ScheduleDetailSerializer,
+    DoctorCardSerializer,
     AddressSerializer,
     AddressListSerializer,
     CustomUserCreateSerializer,
@@ -962,6 +985,45 @@ class PatientDoctorView(APIView):
         logger.debug(f"Patient fetching doctor object with ID: {pk}")
         return get_object_or_404(User, pk=pk, role='doctor', is_active=True, doctor_profile__verification_status='approved')
     
+    def get_filtered_queryset(self, request):
+        """Approved, active doctors narrowed by the specialization/location/search params"""
+        queryset = User.objects.filter(
+            role='doctor',
+            is_active=True,
+            doctor_profile__verification_status='approved'  # Added this crucial filter
+        ).select_related('doctor_profile', 'doctor_profile__rating_summary', 'doctor_profile__next_slot')
+        
+        # Next-available-slot filters read the precomputed DoctorNextSlot row
+        available_by = request.GET.get('available_by', '')
+        if available_by:
+            available_by = datetime.strptime(available_by, '%Y-%m-%d').date()
+            queryset = queryset.filter(
+                upcoming_slot_filter('doctor_profile__next_slot__'),
+                doctor_profile__next_slot__slot_date__lte=available_by
+            )
+        
+        available_mode = request.GET.get('available_mode', '')
+        if available_mode in ['online', 'offline']:
+            queryset = queryset.filter(
+                upcoming_slot_filter('doctor_profile__next_slot__'),
+                doctor_profile__next_slot__mode=available_mode
+            )
+        
+        specialization = request.GET.get('specialization', '')
+        if specialization:
+            queryset = queryset.filter(doctor_profile__specialization__icontains=specialization)
+        
+        location = request.GET.get('location', '')
+        if location:
+            queryset = queryset.filter(doctor_profile__location__icontains=location)
+        
+        search = request.GET.get('search', '').strip()
+        if search:
+            # Full-text + trigram match over name, clinic, specialization and location
+            queryset = search_doctor_users(queryset, search)
+        
+        return queryset
+    
     def get(self, request, pk=None):
         try:
             if pk:
@@ -972,41 +1034,25 @@ class PatientDoctorView(APIView):
             
             logger.info('Patient viewing all available doctors')
             
-            
-            queryset = User.objects.filter(
-                role='doctor',
-                is_active=True,
-                doctor_profile__verification_status='approved'  # Added this crucial filter
-            ).select_related('doctor_profile').prefetch_related(
+            queryset = self.get_filtered_queryset(request).prefetch_related(
                 'doctor_profile__educations',
                 'doctor_profile__certifications'
             )
             
-            
-            specialization = request.GET.get('specialization', '')
-            if specialization:
-                queryset = queryset.filter(doctor_profile__specialization__icontains=specialization)
-            
-            
-            location = request.GET.get('location', '')
-            if location:
-                queryset = queryset.filter(doctor_profile__location__icontains=location)
-            
-        
-            search = request.GET.get('search', '')
-            if search:
-                queryset = queryset.filter(
-                    Q(first_name__icontains=search) |
-                    Q(last_name__icontains=search) |
-                    Q(doctor_profile__clinic_name__icontains=search)
-                )
-            
-            
-            ordering = request.GET.get('ordering', 'first_name')
+            search = request.GET.get('search', '').strip()
+            # Relevance wins for searches unless the client asked for an explicit ordering
+            default_ordering = '-search_rank' if search else 'first_name'
+            ordering = request.GET.get('ordering', default_ordering)
             if ordering in ['first_name', 'last_name', 'doctor_profile__experience', '-doctor_profile__experience']:
                 queryset = queryset.order_by(ordering)
-            
-            logger.debug(f"Available approved doctors count: {queryset.count()}")
+            elif ordering == 'next_available':
+                queryset = queryset.order_by(
+                    F('doctor_profile__next_slot__slot_date').asc(nulls_last=True),
+                    F('doctor_profile__next_slot__slot_time').asc(nulls_last=True),
+                    'first_name'
+                )
+            elif search and ordering == '-search_rank':
+                queryset = queryset.order_by('-search_rank', 'first_name')
             
             # Serialize the queryset for all doctors
             serialized_data = self.serializer_class(queryset, many=True)
@@ -1027,6 +1073,125 @@ class PatientDoctorView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
 
+class DoctorDirectoryView(PatientDoctorView):
+    """Cursor-paginated doctor directory returning compact doctor cards"""
+    
+    serializer_class = DoctorCardSerializer
+    
+    # ordering param -> keyset columns; each ends in a unique id. Every ordering
+    # but relevance matches an index (User/Doctor/DoctorNextSlot Meta.indexes),
+    # so a page is an index range scan from the cursor instead of a full sort.
+    ORDERINGS = {
+        'name': [('sort_name', False), ('sort_last_name', False), ('id', False)],
+        'experience': [('sort_experience', False), ('sort_doctor_user', False)],
+        # Same index scanned backwards, so the tie-break descends too
+        '-experience': [('sort_experience', True), ('sort_doctor_user', True)],
+        'relevance': [('sort_rank', True), ('id', False)],
+        'next_available': [('sort_next_date', False), ('sort_next_time', False), ('sort_doctor', False)],
+    }
+    
+    def get(self, request):
+        try:
+            search = request.GET.get('search', '').strip()
+            ordering = request.GET.get('ordering', 'relevance' if search else 'name')
+            if ordering not in self.ORDERINGS or (ordering == 'relevance' and not search):
+                return Response({
+                    'error': 'Invalid ordering',
+                    'details': f"Use one of: {', '.join(self.ORDERINGS)} (relevance requires search)"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Keyset columns must be non-null, so nullable fields are coalesced
+            # exactly as in the matching index expressions
+            queryset = self.get_filtered_queryset(request)
+            if ordering == 'name':
+                queryset = queryset.annotate(
+                    sort_name=Coalesce('first_name', Value('')),
+                    sort_last_name=Coalesce('last_name', Value('')),
+                )
+            elif ordering in ('experience', '-experience'):
+                queryset = queryset.annotate(
+                    sort_experience=Coalesce('doctor_profile__experience', Value(0)),
+                    sort_doctor_user=F('doctor_profile__user_id'),
+                )
+            elif ordering == 'next_available':
+                # Inner join on the next-slot row so its index can drive the scan; every
+                # doctor has one (refresh_stale_next_slots creates missing rows) and
+                # doctors without a free slot sort last on the sentinel values
+                queryset = queryset.filter(doctor_profile__next_slot__isnull=False).annotate(
+                    sort_next_date=Coalesce('doctor_profile__next_slot__slot_date', Value(NO_NEXT_SLOT_DATE)),
+                    sort_next_time=Coalesce('doctor_profile__next_slot__slot_time', Value(NO_NEXT_SLOT_TIME)),
+                    sort_doctor=F('doctor_profile__id'),
+                )
+            if search:
+                # Exact numeric rank so cursor comparisons are stable across requests
+                queryset = queryset.annotate(
+                    sort_rank=Cast('search_rank', DecimalField(max_digits=12, decimal_places=8))
+                )
+            
+            doctors, next_cursor = keyset_page(
+                queryset,
+                self.ORDERINGS[ordering],
+                cursor=request.GET.get('cursor'),
+                page_size=page_size_from(request),
+                ordering_key=ordering
+            )
+            
+            return Response({
+                'results': self.serializer_class(doctors, many=True).data,
+                'next_cursor': next_cursor,
+                'ordering': ordering
+            }, status=status.HTTP_200_OK)
+        
+        except InvalidCursor as e:
+            return Response({
+                'error': 'Invalid cursor',
+                'details': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        except ValueError as e:
+            logger.warning(f"Invalid parameter value: {str(e)}")
+            return Response({
+                'error': 'Invalid parameter value',
+                'details': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        except Exception as e:
+            logger.error(f"Error fetching doctor directory: {str(e)}", exc_info=True)
+            return Response({
+                'error': 'An error occurred while fetching doctors',
+                'details': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class DoctorSuggestionsView(APIView):
+    """Search-box autocomplete served from the in-process prefix index (no DB query)"""
+    
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        try:
+            limit = int(request.GET.get('limit', SUGGEST_DEFAULT_LIMIT))
+        except (TypeError, ValueError):
+            limit = SUGGEST_DEFAULT_LIMIT
+        limit = min(max(limit, 1), SUGGEST_MAX_LIMIT)
+        
+        try:
+            suggestions = doctor_suggest_index.suggest(query, limit) if query else []
+            return Response({
+                'query': query,
+                'count': len(suggestions),
+                'results': suggestions
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            logger.error(f"Error building doctor suggestions: {str(e)}", exc_info=True)
+            return Response({
+                'error': 'An error occurred while fetching suggestions',
+                'details': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class MedicalRecordManagementView(APIView):
     """
     Medical record management for patient portal
@@ -1303,8 +1468,26 @@ class AppointmentManagementView(APIView):
         except Exception:
             return None
 
+    # Upcoming runs soonest first, past most recent first; id makes both orderings total
+    TAB_KEYS = {
+        'upcoming': [('appointment_date', False), ('slot_time', False), ('id', False)],
+        'past': [('appointment_date', True), ('slot_time', True), ('id', True)],
+    }
+
+    def upcoming_filter(self):
+        now = timezone.localtime()
+        return Q(status__in=['pending', 'confirmed']) & (
+            Q(appointment_date__gt=now.date()) |
+            Q(appointment_date=now.date(), slot_time__gte=now.time())
+        )
+
     def get(self, request):
-        """Get all appointments for the authenticated patient"""
+        """Get appointments for the authenticated patient.
+
+        With ?tab=upcoming|past the list is cursor-paginated (cursor, page_size);
+        without it every appointment is returned, newest booking first.
+        ?fields= limits the columns returned (and the relations joined).
+        """
         patient = self.get_patient_profile(request.user)
         if not patient:
             return Response({
@@ -1313,18 +1496,51 @@ class AppointmentManagementView(APIView):
             }, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            appointments = Appointment.objects.filter(
-                patient=patient
-            ).select_related('doctor__user', 'service', 'schedule').order_by('-created_at')
-            
-            serializer = AppointmentSerializer(appointments, many=True)
+            fields = requested_fields(request)
+            context = {'fields': fields}
+            appointments = AppointmentSerializer.with_related(Appointment.objects.filter(patient=patient), fields)
+
+            tab = request.GET.get('tab')
+            if tab:
+                if tab not in self.TAB_KEYS:
+                    return Response({
+                        'success': False,
+                        'message': f"tab must be one of: {', '.join(self.TAB_KEYS)}"
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                upcoming = self.upcoming_filter()
+                appointments = appointments.filter(upcoming if tab == 'upcoming' else ~upcoming)
+                page, next_cursor = keyset_page(
+                    appointments,
+                    self.TAB_KEYS[tab],
+                    cursor=request.GET.get('cursor'),
+                    page_size=page_size_from(request),
+                    ordering_key=f'appointments-{tab}'
+                )
+                return Response({
+                    'success': True,
+                    'data': AppointmentSerializer(page, many=True, context=context).data,
+                    'count': len(page),
+                    'tab': tab,
+                    'next_cursor': next_cursor
+                }, status=status.HTTP_200_OK)
+
+            appointments = list(appointments.order_by('-created_at'))
+            serializer = AppointmentSerializer(appointments, many=True, context=context)
             
             return Response({
                 'success': True,
                 'data': serializer.data,
-                'count': appointments.count()
+                'count': len(appointments)
             }, status=status.HTTP_200_OK)
 
+        except InvalidCursor as e:
+            return Response({
+                'success': False,
+                'message': 'Invalid cursor',
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         except Exception as e:
             logger.error(f"Error getting appointments for user {request.user.id}: {str(e)}")
             return Response({
@@ -1379,6 +1595,14 @@ class AppointmentManagementView(APIView):
                         'field_errors': serializer.errors
                     }, status=status.HTTP_400_BAD_REQUEST)
 
+        except SlotUnavailable as e:
+            logger.info(f"Slot full while booking for user {request.user.id}: {e.message_dict}")
+            return Response({
+                'success': False,
+                'message': 'This time slot was just booked. Please choose another slot.',
+                'field_errors': e.message_dict
+            }, status=status.HTTP_409_CONFLICT)
+
         except Exception as e:
             logger.error(f"Error creating appointment for user {request.user.id}: {str(e)}")
             return Response({
@@ -1472,6 +1696,13 @@ class AppointmentDetailView(APIView):
                         'field_errors': serializer.errors
                     }, status=status.HTTP_400_BAD_REQUEST)
 
+        except SlotUnavailable as e:
+            return Response({
+                'success': False,
+                'message': 'The selected time slot is fully booked.',
+                'field_errors': e.message_dict
+            }, status=status.HTTP_409_CONFLICT)
+
         except Exception as e:
             logger.error(f"Error updating appointment {appointment_id}: {str(e)}")
             return Response({
@@ -1603,9 +1834,24 @@ class DoctorSchedulesView(APIView):
             if service_id:
                 schedules_query = schedules_query.filter(service_id=service_id)
 
-            schedules = schedules_query.all()
+            # Materialized slot rows carry their own booked counters
+            schedules = list(schedules_query.prefetch_related(
+                Prefetch('slots', queryset=ScheduleSlot.objects.order_by('start_time'), to_attr='slot_rows')
+            ))
+
+            # Schedules without slot rows yet share one grouped count query
+            context = {}
+            if any(not schedule.slot_rows for schedule in schedules):
+                context['booked_counts'] = booked_slot_counts(doctor.id, date_obj)
+
+            # The viewer's own checkout hold keeps showing as available to them
+            patient = getattr(request.user, 'patient_profile', None)
+            context['held_counts'] = held_slot_counts(
+                [schedule.id for schedule in schedules],
+                exclude_patient=patient.id if patient else None
+            )
 
-            serializer = ScheduleDetailSerializer(schedules, many=True)
+            serializer = ScheduleDetailSerializer(schedules, many=True, context=context)
             return Response({
                 'schedules': serializer.data,
                 'date': date,
@@ -1624,6 +1870,223 @@ class DoctorSchedulesView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class SlotHoldView(APIView):
+    """Hold a slot for a few minutes while the patient completes checkout"""
+
+    permission_classes = [IsAuthenticated]
+
+    def get_slot(self, request):
+        """((patient, schedule, slot row), None) for the request's schedule_id/slot_time, or (None, 4xx Response)"""
+        patient = getattr(request.user, 'patient_profile', None)
+        if not patient:
+            return None, Response({
+                'success': False,
+                'message': 'Patient profile not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        schedule_id = str(request.data.get('schedule_id', ''))
+        try:
+            slot_time = datetime.strptime(str(request.data.get('slot_time', ''))[:5], '%H:%M').time()
+        except ValueError:
+            slot_time = None
+        if not (schedule_id.isdigit() and slot_time):
+            return None, Response({
+                'success': False,
+                'message': 'schedule_id and slot_time (HH:MM) are required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        schedule = get_object_or_404(
+            Schedules,
+            id=schedule_id,
+            is_active=True,
+            date__gte=timezone.localdate()
+        )
+        slot = ScheduleSlot.containing(schedule.id, slot_time).first()
+        if slot is None and not ScheduleSlot.objects.filter(schedule=schedule).exists():
+            ScheduleSlot.materialize(schedule)
+            slot = ScheduleSlot.containing(schedule.id, slot_time).first()
+        if slot is None:
+            return None, Response({
+                'success': False,
+                'message': 'Selected time is not a bookable slot.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return (patient, schedule, slot), None
+
+    def post(self, request):
+        try:
+            found, error = self.get_slot(request)
+            if error:
+                return error
+            patient, schedule, slot = found
+
+            expires_at = take_hold(schedule.id, slot.start_time, patient.id, slot.capacity - slot.booked)
+            if expires_at is None:
+                return Response({
+                    'success': False,
+                    'message': 'This time slot is fully booked or held by other patients.'
+                }, status=status.HTTP_409_CONFLICT)
+
+            # The stored next-free slot counts holds: refresh now and again once this one lapses
+            schedule_next_slot_refresh(schedule.doctor_id)
+            schedule_next_slot_refresh(schedule.doctor_id, countdown=hold_ttl() + 1)
+
+            return Response({
+                'success': True,
+                'message': 'Slot held',
+                'data': {
+                    'schedule_id': schedule.id,
+                    'slot_time': slot.start_time.strftime('%H:%M'),
+                    'expires_at': expires_at.isoformat(),
+                    'hold_seconds': hold_ttl()
+                }
+            }, status=status.HTTP_201_CREATED)
+
+        except Http404:
+            raise
+        except Exception as e:
+            logger.error(f"Error holding slot for user {request.user.id}: {str(e)}")
+            return Response({
+                'success': False,
+                'message': 'Failed to hold slot'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def delete(self, request):
+        found, error = self.get_slot(request)
+        if error:
+            return error
+        patient, schedule, slot = found
+        release_hold(schedule.id, slot.start_time, patient.id)
+        schedule_next_slot_refresh(schedule.doctor_id)
+        return Response({
+            'success': True,
+            'message': 'Slot hold released'
+        }, status=status.HTTP_200_OK)
+
+
+class DoctorAvailabilityCalendarView(APIView):
+    """Per-day availability summary for a date range (month calendar in one request)"""
+    
+    permission_classes = [IsAuthenticated]
+    MAX_RANGE_DAYS = 62
+    
+    def get(self, request, doctor_id):
+        try:
+            try:
+                start_date = datetime.strptime(request.GET.get('from', ''), '%Y-%m-%d').date()
+                end_date = datetime.strptime(request.GET.get('to', ''), '%Y-%m-%d').date()
+            except ValueError:
+                return Response({
+                    'error': 'from and to are required as YYYY-MM-DD'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            if end_date < start_date or (end_date - start_date).days >= self.MAX_RANGE_DAYS:
+                return Response({
+                    'error': f'to must be on or after from and the range at most {self.MAX_RANGE_DAYS} days'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            doctor = get_object_or_404(
+                Doctor,
+                user__id=doctor_id,
+                user__role='doctor',
+                user__is_active=True,
+                verification_status='approved'
+            )
+            
+            mode = request.GET.get('mode', '')
+            schedules = Schedules.objects.filter(
+                doctor=doctor,
+                date__gte=start_date,
+                date__lte=end_date,
+                is_active=True
+            ).only(
+                'id', 'date', 'mode', 'start_time', 'end_time', 'slot_duration',
+                'break_start_time', 'break_end_time', 'max_patients_per_slot'
+            )
+            if mode in ['online', 'offline']:
+                schedules = schedules.filter(mode=mode)
+            schedules = list(schedules)
+            
+            # One grouped query covers every schedule in the range
+            booked = Counter({
+                (row['schedule_id'], row['slot_time']): row['count']
+                for row in Appointment.objects.filter(
+                    schedule__in=[schedule.id for schedule in schedules],
+                    status__in=['pending', 'confirmed', 'completed'],
+                    is_slot_booked=True
+                ).values('schedule_id', 'slot_time').annotate(count=Count('id'))
+            }) if schedules else Counter()
+            
+            # Other patients' checkout holds count as taken, as they do when booking
+            patient = getattr(request.user, 'patient_profile', None)
+            holds = held_slot_counts(
+                [schedule.id for schedule in schedules],
+                exclude_patient=patient.id if patient else None
+            )
+            
+            days = self.summarize(schedules, booked, start_date, end_date, holds)
+            payload = {
+                'doctor_id': str(doctor_id),
+                'from': start_date.isoformat(),
+                'to': end_date.isoformat(),
+                'mode': mode or None,
+                'days': days
+            }
+            
+            # Conditional GET: the tag covers the computed summary, so any booking change alters it
+            etag = quote_etag(hashlib.md5(
+                json.dumps(payload, sort_keys=True, cls=DjangoJSONEncoder).encode()
+            ).hexdigest())
+            if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = Response(payload, status=status.HTTP_200_OK)
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        except Http404:
+            raise
+        except Exception as e:
+            logger.error(f"Error building availability calendar for doctor {doctor_id}: {str(e)}", exc_info=True)
+            return Response({
+                'error': 'Failed to fetch availability',
+                'details': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def summarize(self, schedules, booked, start_date, end_date, holds=None):
+        holds = holds or {}
+        now = timezone.localtime()
+        by_date = {}
+        for schedule in schedules:
+            by_date.setdefault(schedule.date, []).append(schedule)
+        
+        days = []
+        current = start_date
+        while current <= end_date:
+            total_slots = free_slots = 0
+            first_free = None
+            for schedule in by_date.get(current, []):
+                for slot_time in schedule_slot_times(schedule):
+                    if current < now.date() or (current == now.date() and slot_time <= now.time()):
+                        continue
+                    total_slots += 1
+                    taken = booked[(schedule.id, slot_time)] + held_count(holds, schedule.id, slot_time)
+                    if taken < schedule.max_patients_per_slot:
+                        free_slots += 1
+                        if first_free is None or slot_time < first_free:
+                            first_free = slot_time
+            days.append({
+                'date': current.isoformat(),
+                'schedules': len(by_date.get(current, [])),
+                'total_slots': total_slots,
+                'free_slots': free_slots,
+                'first_free_time': first_free.strftime('%H:%M') if first_free else None,
+                'is_available': free_slots > 0
+            })
+            current += timedelta(days=1)
+        return days
+
+
 class UpdatePatientLocationView(generics.CreateAPIView):
     """POST /patients/location/update/"""
     
@@ -1797,37 +2260,166 @@ class CurrentPatientLocationView(generics.RetrieveAPIView):
             
             
 class SearchNearbyDoctorsView(generics.ListAPIView):
-    """Find NearBy doctors using bounding box filtering +
-    Haversine distance calculation"""
+    """Find NearBy doctors with a single PostGIS radius query
+    (ST_DWithin + ST_Distance on the GiST-indexed geography point),
+    or the k closest via the in-memory KD-tree when ?k= is given.
+    Filters (specialization, mode, max_fee, is_available) or ordering=score
+    return one page ranked by a distance/rating/fee score computed in SQL;
+    combined with ?k= that page is the k best-ranked matches"""
     
     serializer_class = DoctorLocationSerializer
     permission_classes = [IsAuthenticated]
-
-    def get_bounding_box(self, lat, lng, radius_km):
-        """Calculate bounding box coordinates for initial filtering"""
-        R = 6371  # Earth radius in km
-        delta_lat = radius_km / R
-        delta_lng = radius_km / (R * cos(radians(lat)))
-        return {
-            'min_lat': lat - degrees(delta_lat),
-            'max_lat': lat + degrees(delta_lat),
-            'min_lng': lng - degrees(delta_lng),
-            'max_lng': lng + degrees(delta_lng)
+    MAX_K = 50
+    # Any of these switches radius mode to the ranked, paginated query
+    RANK_PARAMS = ('specialization', 'mode', 'max_fee', 'is_available')
+
+    def get_k_nearest(self, lat, lng, k, max_radius=None):
+        """Rank with the in-memory KD-tree, then hydrate the winners by primary key"""
+        matches = doctor_location_index.nearest(lat, lng, k)
+        if matches is None:
+            # This worker's index is still loading in the background
+            locations = list(k_nearest_locations(lat, lng, k, max_radius))
+            for location in locations:
+                location.distance = round(location.distance_m.km, 2)
+            return locations
+        if max_radius is not None:
+            matches = [(loc_id, distance) for loc_id, distance in matches if distance <= max_radius]
+
+        locations = DoctorLocation.objects.select_related(
+            'doctor', 'doctor__user', 'doctor__rating_summary', 'doctor__next_slot'
+        ).in_bulk(
+            [loc_id for loc_id, _ in matches]
+        )
+        results = []
+        for loc_id, distance in matches:
+            location = locations.get(loc_id)
+            if location is None:
+                continue
+            location.distance = round(distance, 2)
+            results.append(location)
+        return results
+
+    def refresh_live_fields(self, rows):
+        """Overlay current next-slot and rating values on cached rows with one indexed lookup.
+
+        Reviews and bookings change these far more often than locations do, so
+        the cache never invalidates on them and the cached copies are replaced here.
+        """
+        user_ids = [row['doctor_id'] for row in rows if row.get('doctor_id')]
+        if not user_ids:
+            return rows
+        doctors = {
+            str(doctor.user_id): doctor
+            for doctor in Doctor.objects.filter(user_id__in=user_ids).select_related('next_slot', 'rating_summary')
         }
+        for row in rows:
+            doctor = doctors.get(row.get('doctor_id'))
+            if doctor is None:
+                row['doctor_next_available_slot'] = None
+                continue
+            stats = doctor.rating_stats
+            row['doctor_next_available_slot'] = doctor.next_available_slot
+            row['doctor_rating'] = stats['average_rating']
+            row['doctor_review_count'] = stats['total_reviews']
+        return rows
+
+    def apply_availability_options(self, request, rows):
+        """available_by / available_mode filters and ordering=next_available on result rows"""
+        now = timezone.localtime()
+        today, now_time = now.strftime('%Y-%m-%d'), now.strftime('%H:%M')
+
+        def slot_key(row):
+            slot = row.get('doctor_next_available_slot')
+            if not slot or (slot['date'], slot['time']) <= (today, now_time):
+                return None
+            return slot['date'], slot['time']
+
+        available_by = request.GET.get('available_by', '')
+        if available_by:
+            limit = datetime.strptime(available_by, '%Y-%m-%d').strftime('%Y-%m-%d')
+            rows = [row for row in rows if slot_key(row) and slot_key(row)[0] <= limit]
+
+        available_mode = request.GET.get('available_mode', '')
+        if available_mode in ['online', 'offline']:
+            rows = [
+                row for row in rows
+                if slot_key(row) and row['doctor_next_available_slot']['mode'] == available_mode
+            ]
+
+        if request.GET.get('ordering') == 'next_available':
+            rows = sorted(rows, key=lambda row: (slot_key(row) is None, slot_key(row) or ('', ''), row.get('distance', 0)))
+        return rows
+
+    def wants_ranking(self, request):
+        return request.GET.get('ordering') == 'score' or any(
+            request.GET.get(param) for param in self.RANK_PARAMS
+        )
+
+    def get_rank_conditions(self, request):
+        """Translate the filter params into one Q applied inside the ranked query"""
+        conditions = Q()
+        
+        specialization = request.GET.get('specialization', '')
+        if specialization:
+            conditions &= Q(doctor__specialization=specialization)
+        
+        mode = request.GET.get('mode', '')
+        if mode == 'online':
+            conditions &= Q(doctor__consultation_mode_online=True)
+        elif mode == 'offline':
+            conditions &= Q(doctor__consultation_mode_offline=True)
+        
+        max_fee = request.GET.get('max_fee', '')
+        if max_fee:
+            conditions &= Q(doctor__consultation_fee__lte=float(max_fee))
+        
+        is_available = request.GET.get('is_available', '').lower()
+        if is_available in ['true', '1']:
+            conditions &= Q(doctor__is_available=True)
+        elif is_available in ['false', '0']:
+            conditions &= Q(doctor__is_available=False)
+        
+        available_by = request.GET.get('available_by', '')
+        if available_by:
+            available_by = datetime.strptime(available_by, '%Y-%m-%d').date()
+            conditions &= upcoming_slot_filter('doctor__next_slot__') & Q(
+                doctor__next_slot__slot_date__lte=available_by
+            )
+        
+        available_mode = request.GET.get('available_mode', '')
+        if available_mode in ['online', 'offline']:
+            conditions &= upcoming_slot_filter('doctor__next_slot__') & Q(
+                doctor__next_slot__mode=available_mode
+            )
+        return conditions
+
+    def get_ranked_page(self, request, lat, lng, radius, k=0):
+        """One bounded page of filtered locations ordered by the composite rank score.
 
-    def calculate_distance(self, lat1, lng1, lat2, lng2):
-        """Calculate distance between two coordinates using Haversine formula"""
+        With k the page is just the top k, since the KD-tree can't apply filters.
+        """
         try:
-            lat1, lng1, lat2, lng2 = map(radians, [float(lat1), float(lng1), float(lat2), float(lng2)])
-            dlng = lng2 - lng1
-            dlat = lat2 - lat1
-            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlng/2)**2
-            c = 2 * asin(sqrt(a))
-            r = 6371  
-            return c * r
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error in distance calculation: {str(e)}")
-            return float('inf')
+            page = max(int(request.GET.get('page', 1)), 1)
+        except (TypeError, ValueError):
+            page = 1
+        page_size = page_size_from(request)
+        if k:
+            page, page_size = 1, k
+        offset = (page - 1) * page_size
+        
+        queryset = ranked_nearby_locations(lat, lng, radius, self.get_rank_conditions(request))
+        locations = list(queryset[offset:offset + page_size + 1])
+        has_more = len(locations) > page_size
+        locations = locations[:page_size]
+        
+        for location in locations:
+            location.distance = round(location.distance_m / 1000, 2)
+        rows = self.get_serializer(locations, many=True).data
+        data = [
+            dict(row, rank_score=round(location.rank_score, 4))
+            for row, location in zip(rows, locations)
+        ]
+        return data, {'page': page, 'page_size': page_size, 'has_more': has_more}
 
     def list(self, request, *args, **kwargs):
         logger.debug("SearchNearbyDoctorsView.list() called")
@@ -1874,81 +2466,88 @@ class SearchNearbyDoctorsView(generics.ListAPIView):
             except (ValueError, TypeError):
                 radius = 10
 
-            logger.debug(f"Searching within {radius}km radius")
-
-            # Calculate bounding box for initial filtering
-            bounding_box = self.get_bounding_box(patient_lat, patient_lng, radius)
-            logger.debug(f"Bounding box: {bounding_box}")
-
+            # Optional k-nearest mode; radius only caps it when given explicitly
             try:
-                doctor_locations = DoctorLocation.objects.filter(
-                    doctor__user__is_active=True,  
-                    latitude__gte=bounding_box['min_lat'],
-                    latitude__lte=bounding_box['max_lat'],
-                    longitude__gte=bounding_box['min_lng'],
-                    longitude__lte=bounding_box['max_lng']
-                ).select_related('doctor', 'doctor__user')
-                
-                logger.debug(f"Bounding box pre-filtering found {doctor_locations.count()} potential doctors")
-                
-            except Exception as query_error:
-                logger.error(f"Error in doctor query: {str(query_error)}")
-                doctor_locations = DoctorLocation.objects.filter(
-                    doctor__user__is_active=True
-                ).select_related('doctor', 'doctor__user')
-
-            nearby_locations = []
-            distance_calculations = 0
-            
-            for location in doctor_locations:
+                k = int(request.GET.get('k', 0))
+            except (ValueError, TypeError):
+                k = 0
+            k = min(max(k, 0), self.MAX_K)
+
+            cache_hit = None
+            pagination = None
+            if k and not self.wants_ranking(request):
+                logger.debug(f"Searching for {k} nearest doctors")
+                max_radius = radius if 'radius' in request.GET else None
+                nearby_locations = self.get_k_nearest(patient_lat, patient_lng, k, max_radius)
+                data = self.get_serializer(nearby_locations, many=True).data
+                search_backend = 'kdtree'
+            elif self.wants_ranking(request):
+                logger.debug(f"Ranked search within {radius}km radius")
                 try:
-                    if not location.doctor or not location.doctor.user:
-                        continue
-
-                    if not location.doctor.user.is_active:
-                        continue
-
-                    distance = self.calculate_distance(
-                        patient_lat, patient_lng,
-                        location.latitude, location.longitude
+                    data, pagination = self.get_ranked_page(request, patient_lat, patient_lng, radius, k)
+                except ValueError as e:
+                    return Response({
+                        'message': 'Invalid filter value.',
+                        'data': [],
+                        'count': 0,
+                        'error': str(e)
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                search_backend = 'postgis_ranked'
+            else:
+                logger.debug(f"Searching within {radius}km radius")
+                try:
+                    data, cache_hit = cached_nearby_search(
+                        patient_lat, patient_lng, radius,
+                        lambda locations: self.get_serializer(locations, many=True).data
                     )
-                    distance_calculations += 1
-
-                    if distance <= radius:
-                        location.distance = round(distance, 2)
-                        nearby_locations.append(location)
-                        logger.debug(f"Doctor {location.doctor.user.username} - {distance:.2f}km away")
-                    else:
-                        logger.debug(f"Doctor {location.doctor.user.username} - {distance:.2f}km away (outside radius)")
-
-                except Exception as e:
-                    logger.error(f"Error calculating distance for doctor {location.id}: {str(e)}")
-                    continue
-
-            nearby_locations.sort(key=lambda x: getattr(x, 'distance', float('inf')))
-
-            logger.debug(f"Performed {distance_calculations} distance calculations")
-            logger.debug(f"Found {len(nearby_locations)} doctors within {radius}km")
+                except Exception as cache_error:
+                    logger.error(f"Nearby search cache unavailable, querying directly: {str(cache_error)}")
+                    nearby_locations = list(nearby_doctor_locations(patient_lat, patient_lng, radius))
+                    for location in nearby_locations:
+                        location.distance = round(location.distance_m.km, 2)
+                    data = self.get_serializer(nearby_locations, many=True).data
+                search_backend = 'postgis'
+
+            if cache_hit:
+                data = self.refresh_live_fields(data)
+            try:
+                # The ranked query already applied these filters in Postgres
+                if not pagination:
+                    data = self.apply_availability_options(request, list(data))
+            except ValueError:
+                return Response({
+                    'message': 'available_by must be a date in YYYY-MM-DD format.',
+                    'data': [],
+                    'count': 0
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if search_backend == 'kdtree':
+                message = f'Found {len(data)} nearest doctors to your location.'
+            else:
+                message = f'Found {len(data)} doctors within {radius}km of your location.'
 
-            serializer = self.get_serializer(nearby_locations, many=True)
+            logger.debug(f"Found {len(data)} doctors via {search_backend} (cache hit: {cache_hit})")
             
             response_data = {
-                'message': f'Found {len(nearby_locations)} doctors within {radius}km of your location.',
-                'count': len(nearby_locations),
+                'message': message,
+                'count': len(data),
                 'radius': radius,
+                'k': k or None,
                 'patient_location': {
                     'latitude': patient_lat,
                     'longitude': patient_lng
                 },
                 'performance_info': {
-                    'bounding_box_candidates': doctor_locations.count(),
-                    'distance_calculations_performed': distance_calculations,
-                    'final_results': len(nearby_locations)
+                    'search_backend': search_backend,
+                    'cache_hit': cache_hit,
+                    'final_results': len(data)
                 },
-                'data': serializer.data
+                'data': data
             }
+            if pagination:
+                response_data.update(pagination)
+                response_data['ranking_weights'] = rank_weights()
 
-            logger.debug(f"Success! Returning {len(nearby_locations)} nearby doctors")
+            logger.debug(f"Success! Returning {len(data)} nearby doctors")
             return Response(response_data, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -1987,6 +2586,16 @@ class PaymentInitiationView(APIView):
                     'message': 'Payment already completed for this appointment'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
+            # The place must be held before anything is charged
+            try:
+                appointment = hold_place_for_payment(appointment)
+            except SlotUnavailable as e:
+                return Response({
+                    'success': False,
+                    'message': 'This time slot is no longer available for this appointment',
+                    'field_errors': e.message_dict
+                }, status=status.HTTP_409_CONFLICT)
+
             serializer = PaymentInitiationSerializer(data=request.data)
             if not serializer.is_valid():
                 logger.error(f"Payment initiation validation failed: {serializer.errors}")
@@ -2235,6 +2844,21 @@ class PaymentVerificationView(APIView):
                     'message': 'Payment verification failed'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
+            # Razorpay has taken the money; the place must still be held before it is booked as paid
+            try:
+                appointment = hold_place_for_payment(appointment)
+            except SlotUnavailable as e:
+                payment.razorpay_payment_id = serializer.validated_data['razorpay_payment_id']
+                payment.status = 'failed'
+                payment.failure_reason = 'Slot no longer available when the payment completed; refund required'
+                payment.save()
+                logger.error(f"Payment {payment.id} captured for appointment {appointment_id} without a slot")
+                return Response({
+                    'success': False,
+                    'message': 'This time slot is no longer available. Your payment will be refunded.',
+                    'field_errors': e.message_dict
+                }, status=status.HTTP_409_CONFLICT)
+
             # Complete payment
             with transaction.atomic():
                 # Update payment record
@@ -2494,24 +3118,17 @@ class DoctorReviewsListView(APIView):
                 'patient__user', 'doctor__user', 'appointment', 'reviewed_by'
             ).order_by('-created_at')
             
-            logger.info(f"Found {queryset.count()} approved reviews for doctor {actual_doctor_id}")
-            
             serializer = DoctorReviewSerializer(queryset, many=True)
+            rating_stats = doctor.rating_stats
             
-            total_reviews = queryset.count()
-            if total_reviews > 0:
-                avg_rating = queryset.aggregate(
-                    avg_rating=models.Avg('rating')
-                )['avg_rating']
-                avg_rating = round(avg_rating, 1) if avg_rating else 0
-            else:
-                avg_rating = 0
+            logger.info(f"Found {rating_stats['total_reviews']} approved reviews for doctor {actual_doctor_id}")
             
             return Response({
                 'success': True,
                 'data': serializer.data,
-                'total_reviews': total_reviews,
-                'average_rating': avg_rating,
+                'total_reviews': rating_stats['total_reviews'],
+                'average_rating': round(rating_stats['average_rating'], 1),
+                'rating_distribution': rating_stats['rating_distribution'],
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -2530,7 +3147,7 @@ class PatientReviewDeleteView(APIView):
     permission_classes = [IsAuthenticated]
     
     def delete(self, request, review_id):
-        if not hasattr(request.user, 'patient'):
+        if not hasattr(request.user, 'patient_profile'):
             return Response({
                 'success': False,
                 'message': 'Only patients can delete reviews'
@@ -2539,7 +3156,7 @@ class PatientReviewDeleteView(APIView):
         try:
             review = DoctorReview.objects.get(
                 id=review_id,
-                patient=request.user.patient
+                patient=request.user.patient_profile
             )
             
             if review.status != 'pending':